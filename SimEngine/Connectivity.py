@@ -23,15 +23,15 @@ from builtins import zip
 from builtins import str
 from builtins import object
 from past.utils import old_div
-import copy
 import sys
-import random
 import math
 import gzip
 import datetime as dt
 import json
 import itertools
 
+import numpy
+
 from . import SimSettings
 from . import SimLog
 from .Mote.Mote import Mote
@@ -43,6 +43,12 @@ CONN_TYPE_TRACE         = u'trace'
 
 # =========================== helpers =========================================
 
+def _pow2(values):
+    return numpy.array([pow(value, 2) for value in values.tolist()])
+
+def _log10(values):
+    return numpy.array([math.log10(value) for value in values.tolist()])
+
 # =========================== classes =========================================
 
 class Connectivity(object):
@@ -75,6 +81,8 @@ class Connectivity(object):
 
         # short-hands and local variables
         self.num_channels = self.settings.phy_numChans
+        self.channels     = d.TSCH_HOPPING_SEQUENCE[:self.num_channels]
+        self.rng          = self.engine.get_random(u'connectivity')
 
         # instantiate a connectivity matrix
         conn_class_name = self.settings.conn_class
@@ -82,6 +90,14 @@ class Connectivity(object):
         matrix_class = getattr(sys.modules[__name__], matrix_class_name)
         self.matrix = matrix_class(self)
 
+        # channel-averaged link quality and neighbors, valid for
+        # _link_cache_version
+        self._mean_link_pdr      = {}
+        self._mean_link_rssi     = {}
+        self._neighbors          = {}
+        self._neighbor_sets      = {}
+        self._link_cache_version = None
+
         # schedule propagation task
         self._schedule_propagate()
 
@@ -93,17 +109,67 @@ class Connectivity(object):
     def get_pdr(self, src_id, dst_id, channel):
         assert isinstance(src_id, int)
         assert isinstance(dst_id, int)
-        assert channel in d.TSCH_HOPPING_SEQUENCE
 
+        # the matrix raises KeyError for a channel out of the hopping sequence
         return self.matrix.get_pdr(src_id, dst_id, channel)
 
     def get_rssi(self, src_id, dst_id, channel):
         assert isinstance(src_id, int)
         assert isinstance(dst_id, int)
-        assert channel in d.TSCH_HOPPING_SEQUENCE
 
+        # the matrix raises KeyError for a channel out of the hopping sequence
         return self.matrix.get_rssi(src_id, dst_id, channel)
 
+    @property
+    def version(self):
+        # incremented at every change of the connectivity matrix
+        return self.matrix.version
+
+    def get_mean_link_pdr(self, src_id, dst_id):
+        # mean PDR over all the channels and both of the directions
+        self._validate_link_cache()
+        key = (src_id, dst_id)
+        if key not in self._mean_link_pdr:
+            self._mean_link_pdr[key] = numpy.mean([
+                self.get_pdr(_src_id, _dst_id, channel)
+                for channel in self.channels
+                for _src_id, _dst_id in [(src_id, dst_id), (dst_id, src_id)]
+            ])
+        return self._mean_link_pdr[key]
+
+    def get_mean_link_rssi(self, src_id, dst_id):
+        # mean RSSI over all the channels
+        self._validate_link_cache()
+        key = (src_id, dst_id)
+        if key not in self._mean_link_rssi:
+            self._mean_link_rssi[key] = numpy.mean([
+                self.get_rssi(src_id, dst_id, channel)
+                for channel in self.channels
+            ])
+        return self._mean_link_rssi[key]
+
+    def neighbors_of(self, mote_id, min_pdr=None):
+        """Return the IDs of the motes which mote_id can hear
+
+        A neighbor has a non-zero PDR towards mote_id on at least one
+        channel; when min_pdr is given, that PDR should be min_pdr or
+        higher. The IDs are sorted in ascending order.
+        """
+        self._validate_link_cache()
+        if mote_id not in self._neighbors:
+            self._neighbors[mote_id] = tuple(
+                neighbor_id
+                for neighbor_id in self.matrix.get_neighbor_candidates(mote_id)
+                if self.matrix.get_max_pdr(neighbor_id, mote_id) > 0
+            )
+        if min_pdr is None:
+            return self._neighbors[mote_id]
+        else:
+            return tuple(
+                neighbor_id for neighbor_id in self._neighbors[mote_id]
+                if min_pdr <= self.matrix.get_max_pdr(neighbor_id, mote_id)
+            )
+
     def propagate(self):
         """ Simulate the propagation of frames in a slot. """
 
@@ -151,27 +217,35 @@ class Connectivity(object):
         # remove all motes that are listening to channels without any transmission
         for channel in set(receivers_by_channel.keys()) - set(transmissions_by_channel.keys()):
             assert channel not in transmissions_by_channel
-            assert channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]
+            assert channel in self.matrix.channel_index
 
             for listener_id in receivers_by_channel[channel]:
-                sentAck = self.engine.motes[listener_id].radio.rxDone(
-                    packet = None,
-                )
+                sentAck = self.engine.motes[listener_id].radio.idleListenDone()
                 assert sentAck is False
 
         # remove all transmissions that are sent on channels without any listeners
         for channel in set(transmissions_by_channel.keys()) - set(receivers_by_channel.keys()):
             assert channel not in receivers_by_channel
-            assert channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]
+            assert channel in self.matrix.channel_index
 
             for t in transmissions_by_channel[channel]:
                 self.engine.motes[t[u'tx_mote_id']].radio.txDone(False)
 
         # prosses packets sent on channels with listeners
         for channel in set(transmissions_by_channel.keys()) & set(receivers_by_channel.keys()):
-            assert channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]
+            assert channel in self.matrix.channel_index
 
             for listener_id in receivers_by_channel[channel]:
+                # transmissions which the listener may hear
+                if self.settings.conn_propagate_in_range_only:
+                    neighbors = self._get_neighbor_set(listener_id)
+                    audible_transmissions = [
+                        t for t in transmissions_by_channel[channel]
+                        if t[u'tx_mote_id'] in neighbors
+                    ]
+                else:
+                    audible_transmissions = transmissions_by_channel[channel]
+
                 # list the transmissions that listener can hear and lock to the earliest one
                 lockon_transmission = None
                 lockon_random_value = None
@@ -180,9 +254,9 @@ class Connectivity(object):
 
                 # deal with collisions
                 if len(transmissions_by_channel[channel]) > 1:
-                    for t in transmissions_by_channel[channel]:
+                    for t in audible_transmissions:
                         # random_value will be used for comparison against PDR
-                        random_value = random.random()
+                        random_value = self.rng.random()
 
                         peamble_pdr = self.get_pdr(
                             src_id=t[u'tx_mote_id'],
@@ -218,9 +292,7 @@ class Connectivity(object):
                     # check if it received anything
                     if lockon_transmission is None:
                         # nope, set the receiver to idle listen and cotinue to next one
-                        sentAck = self.engine.motes[listener_id].radio.rxDone(
-                            packet=None,
-                        )
+                        sentAck = self.engine.motes[listener_id].radio.idleListenDone()
                         continue
 
                     # something was received, continue execution
@@ -252,7 +324,7 @@ class Connectivity(object):
                     # there's no point in testing the preamble here, so we'll skip it
                     detected_transmissions = 1
 
-                    lockon_random_value = random.random()
+                    lockon_random_value = self.rng.random()
                     lockon_transmission = transmissions_by_channel[channel][0]
                     packet_pdr = self.get_pdr(
                         src_id  = lockon_transmission[u'tx_mote_id'],
@@ -287,7 +359,7 @@ class Connectivity(object):
                             dst_id=lockon_transmission[u'tx_mote_id'],
                             channel=channel
                         )
-                        receivedAck = random.random() < pdr_of_return_link
+                        receivedAck = self.rng.random() < pdr_of_return_link
 
                     if receivedAck:
                         # keep track of the number of ACKs received by
@@ -299,9 +371,7 @@ class Connectivity(object):
                 else:
                     # lockon_transmission NOT received correctly
                     # (interference)
-                    receivedAck = self.engine.motes[listener_id].radio.rxDone(
-                        packet=None,
-                    )
+                    receivedAck = self.engine.motes[listener_id].radio.idleListenDone()
                     self.log(
                         SimLog.LOG_PROP_DROP_LOCKON,
                         {
@@ -339,6 +409,20 @@ class Connectivity(object):
         # schedule next propagation
         self._schedule_propagate()
 
+    def _validate_link_cache(self):
+        if self._link_cache_version != self.matrix.version:
+            self._mean_link_pdr      = {}
+            self._mean_link_rssi     = {}
+            self._neighbors          = {}
+            self._neighbor_sets      = {}
+            self._link_cache_version = self.matrix.version
+
+    def _get_neighbor_set(self, mote_id):
+        self._validate_link_cache()
+        if mote_id not in self._neighbor_sets:
+            self._neighbor_sets[mote_id] = frozenset(self.neighbors_of(mote_id))
+        return self._neighbor_sets[mote_id]
+
     def _schedule_propagate(self):
         '''
         schedule a propagation task in the middle of the next slot.
@@ -493,6 +577,12 @@ class Connectivity(object):
 
 
 class ConnectivityMatrixBase(object):
+    """
+    PDR and RSSI values are stored in nested lists indexed by source mote ID,
+    destination mote ID and channel index, which is the position of a
+    channel in the hopping sequence (0..num_channels-1). The public methods
+    take a channel number, as the radio does.
+    """
     LINK_PERFECT = {u'pdr' : 1.00, u'rssi':  -10}
     LINK_NONE    = {u'pdr' :    0, u'rssi': -1000}
 
@@ -502,20 +592,35 @@ class ConnectivityMatrixBase(object):
         self.engine = connectivity.engine
         self.settings = connectivity.settings
         self.log = connectivity.log
-        self._matrix = {}
 
         # short hands
         self.num_channels = self.settings.phy_numChans
+        self.channels = connectivity.channels
+        self.channel_index = dict(
+            [(channel, index) for index, channel in enumerate(self.channels)]
+        )
+
+        # motes are identified by consecutive IDs starting from 0
+        assert self.mote_id_list == list(range(len(self.mote_id_list)))
+
+        # incremented at every change of the matrix
+        self.version = 0
 
         # at the beginning, connectivity matrix indicates no connectivity at all
-        for src_id in self.mote_id_list:
-            self._matrix[src_id] = {}
-            for dst_id in self.mote_id_list:
-                self._matrix[src_id][dst_id] = {}
-                for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
-                    self._matrix[src_id][dst_id][channel] = copy.copy(
-                        self.LINK_NONE
-                    )
+        self._pdr = [
+            [
+                [self.LINK_NONE[u'pdr']] * self.num_channels
+                for _ in self.mote_id_list
+            ]
+            for _ in self.mote_id_list
+        ]
+        self._rssi = [
+            [
+                [self.LINK_NONE[u'rssi']] * self.num_channels
+                for _ in self.mote_id_list
+            ]
+            for _ in self.mote_id_list
+        ]
 
         self._additional_initialization()
 
@@ -525,24 +630,50 @@ class ConnectivityMatrixBase(object):
         pass
 
     def set_pdr(self, src_id, dst_id, channel, pdr):
-        self._matrix[src_id][dst_id][channel][u'pdr'] = pdr
+        self._pdr[src_id][dst_id][self.channel_index[channel]] = pdr
+        self.version += 1
 
     def set_pdr_both_directions(self, mote_id_1, mote_id_2, channel, pdr):
-        self._matrix[mote_id_1][mote_id_2][channel][u'pdr'] = pdr
-        self._matrix[mote_id_2][mote_id_1][channel][u'pdr'] = pdr
+        channel_index = self.channel_index[channel]
+        self._pdr[mote_id_1][mote_id_2][channel_index] = pdr
+        self._pdr[mote_id_2][mote_id_1][channel_index] = pdr
+        self.version += 1
 
     def get_pdr(self, src_id, dst_id, channel):
-        return self._matrix[src_id][dst_id][channel][u'pdr']
+        return self._pdr[src_id][dst_id][self.channel_index[channel]]
 
     def set_rssi(self, src_id, dst_id, channel, rssi):
-        self._matrix[src_id][dst_id][channel][u'rssi'] = rssi
+        self._rssi[src_id][dst_id][self.channel_index[channel]] = rssi
+        self.version += 1
 
     def set_rssi_both_directions(self, mote_id_1, mote_id_2, channel, rssi):
-        self._matrix[mote_id_1][mote_id_2][channel][u'rssi'] = rssi
-        self._matrix[mote_id_2][mote_id_1][channel][u'rssi'] = rssi
+        channel_index = self.channel_index[channel]
+        self._rssi[mote_id_1][mote_id_2][channel_index] = rssi
+        self._rssi[mote_id_2][mote_id_1][channel_index] = rssi
+        self.version += 1
 
     def get_rssi(self, src_id, dst_id, channel):
-        return self._matrix[src_id][dst_id][channel][u'rssi']
+        return self._rssi[src_id][dst_id][self.channel_index[channel]]
+
+    def get_max_pdr(self, src_id, dst_id):
+        # the best PDR over all the channels
+        return max(self._pdr[src_id][dst_id])
+
+    def get_neighbor_candidates(self, mote_id):
+        # return the motes which may have a link towards mote_id; override
+        # this method if the matrix can rule out some of them cheaply
+        return [
+            neighbor_id for neighbor_id in self.mote_id_list
+            if neighbor_id != mote_id
+        ]
+
+    def set_link_both_directions(self, mote_id_1, mote_id_2, pdr, rssi):
+        # set the same PDR and RSSI values to all the channels
+        self._pdr[mote_id_1][mote_id_2]  = [pdr] * self.num_channels
+        self._pdr[mote_id_2][mote_id_1]  = [pdr] * self.num_channels
+        self._rssi[mote_id_1][mote_id_2] = [rssi] * self.num_channels
+        self._rssi[mote_id_2][mote_id_1] = [rssi] * self.num_channels
+        self.version += 1
 
     def dump(self):
         output = []
@@ -550,21 +681,21 @@ class ConnectivityMatrixBase(object):
 
         # header
         line = []
-        for src_id in self._matrix:
+        for src_id in self.mote_id_list:
             line += [str(src_id)]
         line = '\t|'.join(line)
         output  += [u'\t|'+line]
 
         # body
-        channel = d.TSCH_HOPPING_SEQUENCE[0]
-        for src_id in self._matrix:
+        channel = self.channels[0]
+        for src_id in self.mote_id_list:
             line = []
             line += [str(src_id)]
-            for dst_id in self._matrix[src_id]:
+            for dst_id in self.mote_id_list:
                 if src_id == dst_id:
                     line += [u'N/A']
                 else:
-                    line += [str(self._matrix[src_id][dst_id][channel][u'pdr'])]
+                    line += [str(self.get_pdr(src_id, dst_id, channel))]
             line = u'\t|'.join(line)
             output += [line]
 
@@ -581,7 +712,7 @@ class ConnectivityMatrixFullyMeshed(ConnectivityMatrixBase):
         perfect_rssi = self.LINK_PERFECT[u'rssi']
         for src_id in self.mote_id_list:
             for dst_id in self.mote_id_list:
-                for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
+                for channel in self.channels:
                     self.set_pdr(src_id, dst_id, channel, perfect_pdr)
                     self.set_rssi(src_id, dst_id, channel, perfect_rssi)
 
@@ -599,7 +730,7 @@ class ConnectivityMatrixLinear(ConnectivityMatrixBase):
         parent_id = None
         for child_id in self.mote_id_list:
             if parent_id is not None:
-                for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
+                for channel in self.channels:
                     self.set_pdr_both_directions(
                         child_id,
                         parent_id,
@@ -629,7 +760,7 @@ class ConnectivityMatrixK7(ConnectivityMatrixBase):
         """
 
         # additional local variables
-        self.trace = []
+        trace = []
         self.start_date = None
         # the offset at which we stopped reading the trace
         self.trace_position = 0
@@ -711,44 +842,105 @@ class ConnectivityMatrixK7(ConnectivityMatrixBase):
                         row[u'asn'] = 0
                         # add the link to the list
                         initialized_links.add(link)
-                self.trace.append(row)
+                trace.append(row)
 
-            # initialize the matrix with the first part of the trace
-            # file
-            self._update()
+        # group the trace into batches of updates
+        self._build_update_batches(trace)
 
-    # ======================= private =========================================
+        # initialize the matrix with the first part of the trace
+        # file
+        self._update()
 
-    def _update(self):
-        assert self.asn_of_next_update >= self.engine.getAsn()
-        # Read the connectivity trace and fill the connectivity
-        # matrix
-        assert self.trace_position < len(self.trace)
-        start_trace_position = self.trace_position
-        while True:
-            row = self.trace[self.trace_position]
-
-            # return next update ASN
+    # ======================= private =========================================
 
-            if row[u'asn'] > self.engine.asn:
-                asn_of_next_update = row[u'asn']
-                break
+    def _build_update_batches(self, trace):
+        """Group the rows of the trace into batches of updates
 
-            # update matrix value
+        A batch holds the rows applied at one update ASN. The rows are
+        expanded into (src_id, dst_id, channel_index, pdr, rssi) entries of
+        self.deltas; a batch applies a contiguous slice of them. The update
+        ASNs are rounded up to a multiple of conn_trace_update_granularity
+        (in slots), so that the changes in a period are applied at once.
+        """
+        granularity = self.settings.conn_trace_update_granularity
+        assert granularity >= 1
+
+        self.deltas  = []
+        self.batches = [] # (asn, start_delta, end_delta, end_trace_position)
+
+        trace_position = 0
+        asn = 0
+        while trace_position < len(trace):
+            # rows are applied at the first update at or after their ASN
+            start_delta = len(self.deltas)
+            while (
+                    (trace_position < len(trace))
+                    and
+                    (trace[trace_position][u'asn'] <= asn)
+                ):
+                row = trace[trace_position]
+                if row[u'channel'] is None:
+                    channel_indices = list(range(self.num_channels))
+                elif row[u'channel'] in self.channel_index:
+                    channel_indices = [self.channel_index[row[u'channel']]]
+                else:
+                    # this channel is not in use
+                    channel_indices = []
+                for channel_index in channel_indices:
+                    self.deltas.append(
+                        (
+                            row[u'src_id'],
+                            row[u'dst_id'],
+                            channel_index,
+                            row[u'pdr'],
+                            row[u'mean_rssi']
+                        )
+                    )
+                trace_position += 1
+            self.batches.append(
+                (asn, start_delta, len(self.deltas), trace_position)
+            )
 
-            self._set_connectivity(row)
+            if trace_position < len(trace):
+                asn = (
+                    int(
+                        math.ceil(
+                            old_div(
+                                float(trace[trace_position][u'asn']),
+                                granularity
+                            )
+                        )
+                    ) *
+                    granularity
+                )
 
-            # increment trace_position
-            self.trace_position += 1
+        # the next batch to apply
+        self.batch_index = 0
 
-            if self.trace_position == len(self.trace):
-                # we hit the bottom of the trace
-                asn_of_next_update = None
-                break
+    def _update(self):
+        assert self.asn_of_next_update >= self.engine.getAsn()
+        # apply the next batch of updates to the connectivity matrix
+        assert self.batch_index < len(self.batches)
+        _, start_delta, end_delta, end_trace_position = (
+            self.batches[self.batch_index]
+        )
+        for src_id, dst_id, channel_index, pdr, rssi in (
+                self.deltas[start_delta:end_delta]
+            ):
+            self._pdr[src_id][dst_id][channel_index]  = pdr
+            self._rssi[src_id][dst_id][channel_index] = rssi
+        if start_delta < end_delta:
+            self.version += 1
+        self.batch_index += 1
 
         # update 'asn_of_next_update' with a new ASN, which can be
-        # None
-        self.asn_of_next_update = asn_of_next_update
+        # None when we hit the bottom of the trace
+        start_trace_position = self.trace_position
+        self.trace_position = end_trace_position
+        if self.batch_index < len(self.batches):
+            self.asn_of_next_update = self.batches[self.batch_index][0]
+        else:
+            self.asn_of_next_update = None
         self.log(
             SimLog.LOG_CONN_MATRIX_K7_UPDATE,
             {
@@ -766,29 +958,6 @@ class ConnectivityMatrixK7(ConnectivityMatrixBase):
                 intraSlotOrder = d.INTRASLOTORDER_STARTSLOT
             )
 
-    def _set_connectivity(self, row):
-        """Modify the connectivity matrix.  If no channel is given
-        (i.e. channel is None), set all channels to the same value.
-        """
-        for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
-            if (
-                    (row[u'channel'] is None)
-                    or
-                    (row[u'channel'] == channel)
-                ):
-                self.set_pdr(
-                    row[u'src_id'],
-                    row[u'dst_id'],
-                    channel,
-                    row[u'pdr']
-                )
-                self.set_rssi(
-                    row[u'src_id'],
-                    row[u'dst_id'],
-                    channel,
-                    row[u'mean_rssi']
-                )
-
     def _parse_line(self, line):
 
         # === read and parse line
@@ -840,6 +1009,7 @@ class ConnectivityMatrixRandom(ConnectivityMatrixBase):
         # additional local variables
         self.coordinates = {}  # (x, y) indexed by mote_id
         self.pister_hack = PisterHackModel(self.engine)
+        self.rng         = self.engine.get_random(u'connectivity.random')
 
         # ConnectivityRandom doesn't need the connectivity matrix. Instead, it
         # initializes coordinates of the motes. Its algorithm is:
@@ -866,137 +1036,118 @@ class ConnectivityMatrixRandom(ConnectivityMatrixBase):
 
         assert init_min_neighbors <= self.settings.exec_numMotes
 
+        # coordinates and radio parameters of the deployed motes, in order
+        # of deployment, for vectorized computation
+        num_motes = len(self.mote_id_list)
+        deployed_mote_ids    = []
+        deployed_coordinates = numpy.zeros((num_motes, 2))
+        deployed_antenna_gains = numpy.zeros(num_motes)
+
         # determine coordinates of the motes
         for target_mote_id in self.mote_id_list:
-            mote_is_deployed = False
-            while mote_is_deployed is False:
+            target_mote = self.engine.motes[target_mote_id]
+            num_deployed = len(deployed_mote_ids)
+
+            while True:
 
                 # select a tentative coordinate
                 if target_mote_id == 0:
-                    self.coordinates[target_mote_id] = (0, 0)
-                    mote_is_deployed = True
-                    continue
+                    coordinate = (0, 0)
+                    break
 
                 coordinate = (
-                    square_side * random.random(),
-                    square_side * random.random()
+                    square_side * self.rng.random(),
+                    square_side * self.rng.random()
                 )
 
                 # count deployed motes who have enough PDR values to this
                 # mote
-                good_pdr_count = 0
-                base_channel = d.TSCH_HOPPING_SEQUENCE[0]
-                for deployed_mote_id in self.coordinates:
-                    rssi = self.pister_hack.compute_rssi(
-                        {
-                            u'mote'      : self._get_mote(target_mote_id),
-                            u'coordinate': coordinate
-                        },
-                        {
-                            u'mote'      : self._get_mote(deployed_mote_id),
-                            u'coordinate': self.coordinates[deployed_mote_id]
-                        }
-                    )
-                    pdr = self.pister_hack.convert_rssi_to_pdr(rssi)
-                    # memorize the rssi and pdr values at the base channel
-                    self.set_pdr_both_directions(
-                        target_mote_id,
-                        deployed_mote_id,
-                        base_channel,
-                        pdr
-                    )
-                    self.set_rssi_both_directions(
-                        target_mote_id,
-                        deployed_mote_id,
-                        base_channel,
-                        rssi
-                    )
-
-                    if init_min_pdr <= pdr:
-                        good_pdr_count += 1
+                rssi = self.pister_hack.compute_rssi_array(
+                    target_mote,
+                    coordinate,
+                    deployed_coordinates[:num_deployed],
+                    deployed_antenna_gains[:num_deployed]
+                )
+                pdr = self.pister_hack.convert_rssi_to_pdr_array(rssi)
+                good_pdr_count = int(numpy.count_nonzero(init_min_pdr <= pdr))
 
                 # determine whether we deploy this mote or not
                 if (
                         (
-                            (len(self.coordinates) <= init_min_neighbors)
+                            (num_deployed <= init_min_neighbors)
                             and
-                            (len(self.coordinates) == good_pdr_count)
+                            (num_deployed == good_pdr_count)
                         )
                         or
                         (
-                            (init_min_neighbors < len(self.coordinates))
+                            (init_min_neighbors < num_deployed)
                             and
                             (init_min_neighbors <= good_pdr_count)
                         )
                     ):
-                    # fix the coordinate of the mote
-                    self.coordinates[target_mote_id] = coordinate
-                    # copy the rssi and pdr values to other channels
-                    for deployed_mote_id in list(self.coordinates.keys()):
-                        rssi = self.get_rssi(
+                    # fix the coordinate of the mote; set the rssi and pdr
+                    # values to all the channels
+                    for deployed_mote_id, _pdr, _rssi in zip(
+                            deployed_mote_ids,
+                            pdr.tolist(),
+                            rssi.tolist()
+                        ):
+                        self.set_link_both_directions(
                             target_mote_id,
                             deployed_mote_id,
-                            base_channel
+                            _pdr,
+                            _rssi
                         )
-                        pdr  = self.get_pdr(
-                            target_mote_id,
-                            deployed_mote_id,
-                            base_channel
-                        )
-                        for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
-                            if channel == base_channel:
-                                # do nothing
-                                pass
-                            else:
-                                self.set_pdr_both_directions(
-                                    target_mote_id,
-                                    deployed_mote_id,
-                                    channel,
-                                    pdr
-                                )
-                                self.set_rssi_both_directions(
-                                    target_mote_id,
-                                    deployed_mote_id,
-                                    channel,
-                                    rssi
-                                )
-
-                    mote_is_deployed = True
+                    break
                 else:
-                    # remove memorized values at channel 0
-                    for deployed_mote_id in self.coordinates:
-                        self._clear_rssi(
-                            target_mote_id,
-                            deployed_mote_id,
-                            base_channel
-                        )
-                        self._clear_pdr(
-                            target_mote_id,
-                            deployed_mote_id,
-                            base_channel
-                        )
                     # try another random coordinate
                     continue
 
-    def _get_mote(self, mote_id):
-        # there must be a mote having mote_id. otherwise, the following line
-        # raises an exception.
-        return [mote for mote in self.engine.motes if mote.id == mote_id][0]
-
-    def _clear_rssi(self, mote_id_1, mote_id_2, channel):
-        self.set_rssi_both_directions(
-            mote_id_1,
-            mote_id_2,
-            channel,
-            self.LINK_NONE[u'rssi']
+            self.coordinates[target_mote_id] = coordinate
+            deployed_mote_ids.append(target_mote_id)
+            deployed_coordinates[num_deployed] = coordinate
+            deployed_antenna_gains[num_deployed] = target_mote.radio.antennaGain
+
+        # build a spatial index over the coordinates; the motes are put into
+        # square cells whose side is the maximum radio range, so that the
+        # neighbors of a mote are in its cell or in one of the adjacent cells
+        radios = [mote.radio for mote in self.engine.motes]
+        self.grid_cell_side = self.pister_hack.get_max_distance(
+            max([radio.txPower + radio.antennaGain for radio in radios]) +
+            max([radio.antennaGain for radio in radios])
         )
-
-    def _clear_pdr(self, mote_id_1, mote_id_2, channel):
-        self.set_rssi_both_directions(
-            mote_id_1,
-            mote_id_2,
-            channel,
-            self.LINK_NONE[u'pdr']
+        self.grid = {}
+        for mote_id in self.mote_id_list:
+            cell = self._get_grid_cell(self.coordinates[mote_id])
+            self.grid.setdefault(cell, []).append(mote_id)
+        # the index is valid as long as the matrix keeps the values computed
+        # above
+        self.grid_version = self.version
+
+    def get_neighbor_candidates(self, mote_id):
+        if self.version != self.grid_version:
+            # the matrix was modified after the initialization (by a test,
+            # typically); links may have nothing to do with the coordinates
+            return super(
+                ConnectivityMatrixRandom,
+                self
+            ).get_neighbor_candidates(mote_id)
+
+        x, y = self._get_grid_cell(self.coordinates[mote_id])
+        return sorted([
+            neighbor_id
+            for cell in itertools.product(
+                    [x - 1, x, x + 1],
+                    [y - 1, y, y + 1]
+                )
+            for neighbor_id in self.grid.get(cell, [])
+            if neighbor_id != mote_id
+        ])
+
+    def _get_grid_cell(self, coordinate):
+        return (
+            int(math.floor(old_div(coordinate[0], self.grid_cell_side))),
+            int(math.floor(old_div(coordinate[1], self.grid_cell_side)))
         )
 
 
@@ -1036,6 +1187,7 @@ class PisterHackModel(object):
 
         # singleton
         self.engine   = sim_engine
+        self.rng      = self.engine.get_random(u'connectivity.pister_hack')
 
         # remember what RSSI value is computed for a mote at an ASN; the same
         # RSSI value will be returned for the same motes and the ASN.
@@ -1080,7 +1232,7 @@ class PisterHackModel(object):
         # distributed between friis and (friis - 40)
         rssi = (
             mu +
-            random.uniform(
+            self.rng.uniform(
                 old_div(-self.PISTER_HACK_LOWER_SHIFT,2),
                 old_div(+self.PISTER_HACK_LOWER_SHIFT,2)
             )
@@ -1088,6 +1240,92 @@ class PisterHackModel(object):
 
         return rssi
 
+    def compute_rssi_array(
+            self,
+            src_mote,
+            src_coordinate,
+            dst_coordinates,
+            dst_antenna_gains
+        ):
+        """Vectorized version of compute_rssi() from one mote to many points
+
+        dst_coordinates is an (N, 2) array and dst_antenna_gains an array of
+        N values. One random value is drawn per destination in order, as
+        compute_rssi() would.
+        """
+        # pow() and log10() are applied element-wise with the math library,
+        # in Python loops, as compute_rssi() does; numpy.square() and
+        # numpy.log10() differ from them in the last bit for some values,
+        # which would change the resulting topology
+
+        # distance in meters
+        distance = 1000 * numpy.sqrt(
+            _pow2(dst_coordinates[:, 0] - src_coordinate[0]) +
+            _pow2(dst_coordinates[:, 1] - src_coordinate[1])
+        )
+
+        # sqrt and inverse of the free space path loss (fspl)
+        free_space_path_loss = (
+            self.SPEED_OF_LIGHT /
+            (4 * math.pi * distance * self.TWO_DOT_FOUR_GHZ)
+        )
+
+        # simple friis equation in Pr = Pt + Gt + Gr + 20log10(fspl)
+        pr = (
+            src_mote.radio.txPower     +
+            src_mote.radio.antennaGain +
+            dst_antenna_gains          +
+            (20 * _log10(free_space_path_loss))
+        )
+        mu = pr - old_div(self.PISTER_HACK_LOWER_SHIFT, 2)
+
+        # the receiver will receive the packet with an rssi uniformly
+        # distributed between friis and (friis - 40)
+        low  = old_div(-self.PISTER_HACK_LOWER_SHIFT,2)
+        high = old_div(+self.PISTER_HACK_LOWER_SHIFT,2)
+        uniform = self.rng.uniform
+        return mu + numpy.array([
+            uniform(low, high) for _ in range(len(dst_antenna_gains))
+        ])
+
+    def convert_rssi_to_pdr_array(self, rssi):
+        """Vectorized version of convert_rssi_to_pdr()"""
+        minRssi = min(self.RSSI_PDR_TABLE.keys())
+        maxRssi = max(self.RSSI_PDR_TABLE.keys())
+        pdr_table = numpy.array([
+            self.RSSI_PDR_TABLE[r] for r in range(minRssi, maxRssi + 1)
+        ])
+
+        # linear interpolation, for the values in the table range
+        floor_rssi = numpy.clip(numpy.floor(rssi), minRssi, maxRssi - 1)
+        index      = (floor_rssi - minRssi).astype(int)
+        pdr_low    = pdr_table[index]
+        pdr_high   = pdr_table[index + 1]
+        pdr = (pdr_high - pdr_low) * (rssi - floor_rssi) + pdr_low
+
+        pdr[rssi < minRssi] = 0.0
+        pdr[rssi > maxRssi] = 1.0
+        return pdr
+
+    def get_max_distance(self, max_gain):
+        """Return the distance in km beyond which the PDR is always zero
+
+        max_gain is the highest sum of the TX power and the antenna gains
+        of a transmitter and a receiver, in dB.
+        """
+        # the RSSI is never above the Friis value, that is the mean RSSI
+        # plus PISTER_HACK_LOWER_SHIFT/2; the PDR is zero at the lowest RSSI
+        # of RSSI_PDR_TABLE. A margin of 1% absorbs rounding errors.
+        min_rssi = min(self.RSSI_PDR_TABLE.keys())
+        max_distance = (
+            old_div(
+                self.SPEED_OF_LIGHT,
+                (4 * math.pi * self.TWO_DOT_FOUR_GHZ)
+            ) *
+            math.pow(10.0, old_div(max_gain - min_rssi, 20.0))
+        )
+        return 1.01 * max_distance / 1000
+
     def convert_rssi_to_pdr(self, rssi):
         minRssi = min(self.RSSI_PDR_TABLE.keys())
         maxRssi = max(self.RSSI_PDR_TABLE.keys())
@@ -100,6 +100,7 @@ TSCH_HOPPING_SEQUENCE                       = [16, 17, 23, 18, 26, 15, 25, 22, 1
 TSCH_MAX_EB_DELAY                           = 180
 TSCH_NUM_NEIGHBORS_TO_WAIT                  = 2
 TSCH_DESYNCHRONIZED_TIMEOUT_SLOTS           = 1750
+TSCH_MAX_SCHEDULE_TABLE_LENGTH              = 65536
 CELLOPTION_TX                               = u'TX'
 CELLOPTION_RX                               = u'RX'
 CELLOPTION_SHARED                           = u'SHARED'
@@ -8,7 +8,6 @@ from __future__ import absolute_import
 from builtins import range
 from builtins import object
 from abc import abstractmethod
-import random
 
 # Mote sub-modules
 
@@ -52,6 +51,7 @@ class AppBase(object):
 
         # local variables
         self.appcounter = 0
+        self.rng        = self.engine.get_random(u'app', self.mote.id)
 
     #======================== public ==========================================
 
@@ -199,12 +199,12 @@ class AppPeriodic(AppBase):
 
         if self.sending_first_packet:
             # compute initial time within the range of [next asn, next asn+pkPeriod]
-            delay = self.settings.tsch_slotDuration + (self.settings.app_pkPeriod * random.random())
+            delay = self.settings.tsch_slotDuration + (self.settings.app_pkPeriod * self.rng.random())
             self.sending_first_packet = False
         else:
             # compute random delay
             assert self.settings.app_pkPeriodVar < 1
-            delay = self.settings.app_pkPeriod * (1 + random.uniform(-self.settings.app_pkPeriodVar, self.settings.app_pkPeriodVar))
+            delay = self.settings.app_pkPeriod * (1 + self.rng.uniform(-self.settings.app_pkPeriodVar, self.settings.app_pkPeriodVar))
 
         # schedule
         self.engine.scheduleIn(
@@ -111,17 +111,41 @@ class Radio(object):
         self.state = d.RADIO_STATE_RX
         self.channel = channel
 
-    def rxDone(self, packet):
-        """end of RX radio activity"""
+    def idleListenDone(self):
+        """
+        end of RX radio activity without any frame received
+
+        This is a lighter version of rxDone(packet=None) for listeners of
+        channels without any transmission.
+        """
 
         # switch radio state
         self.state   = d.RADIO_STATE_OFF
 
         # log charge consumed
+        self._update_stats(u'idle_listen')
+
+        # inform upper layer (TSCH)
+        self.mote.tsch.idleListenDone()
+
+        # reset the channel
+        self.channel = None
+
+        # no ACK is sent for nothing
+        return False
+
+    def rxDone(self, packet):
+        """end of RX radio activity"""
+
         if not packet:
             # didn't receive any frame (idle listen)
-            self._update_stats(u'idle_listen')
-        elif (
+            return self.idleListenDone()
+
+        # switch radio state
+        self.state   = d.RADIO_STATE_OFF
+
+        # log charge consumed
+        if (
                 self.mote.tsch.getIsSync()
                 and
                 packet[u'mac'][u'dstMac'] == self.mote.get_mac_addr()
@@ -143,12 +167,29 @@ class Radio(object):
         return is_acked
 
     def _update_stats(self, stats_type):
-        self.stats[u'sleep'] += (
-            self.engine.getAsn() - self.stats[u'last_updated'] - 1
-        )
+        # sleep slots are not counted here; they are derived from the number
+        # of active slots when the stats are logged
         self.stats[stats_type] += 1
         self.stats[u'last_updated'] = self.engine.getAsn()
 
+    def _update_sleep_stats(self):
+        # the radio sleeps in every slot up to the last active one, except in
+        # the active slots themselves
+        self.stats[u'sleep'] = (
+            self.stats[u'last_updated'] -
+            sum(
+                [
+                    self.stats[stats_type] for stats_type in [
+                        u'idle_listen',
+                        u'tx_data_rx_ack',
+                        u'tx_data',
+                        u'rx_data_tx_ack',
+                        u'rx_data'
+                    ]
+                ]
+            )
+        )
+
     def _schedule_log_stats(self):
         next_log_asn = self.engine.getAsn() + self.log_stats_interval_asn
         self.engine.scheduleAtAsn(
@@ -159,6 +200,7 @@ class Radio(object):
         )
 
     def _log_stats(self):
+        self._update_sleep_stats()
         self.log(
             SimEngine.SimLog.LOG_RADIO_STATS,
             {
@@ -16,12 +16,10 @@ from __future__ import division
 from builtins import str
 from builtins import object
 from past.utils import old_div
-import random
 import math
 import sys
 
 import netaddr
-import numpy
 
 # Mote sub-modules
 
@@ -56,15 +54,20 @@ class Rpl(object):
         self.log                       = SimEngine.SimLog.SimLog().log
 
         # local variables
+        self.rng                       = self.engine.get_random(u'rpl', self.mote.id)
         self.dodagId                   = None
         self.of                        = RplOFNone(self)
         self.trickle_timer             = TrickleTimer(
-            i_min    = pow(2, self.DEFAULT_DIO_INTERVAL_MIN),
-            i_max    = self.DEFAULT_DIO_INTERVAL_DOUBLINGS,
-            k        = self.DEFAULT_DIO_REDUNDANCY_CONSTANT,
-            callback = self._send_DIO
+            i_min      = pow(2, self.DEFAULT_DIO_INTERVAL_MIN),
+            i_max      = self.DEFAULT_DIO_INTERVAL_DOUBLINGS,
+            k          = self.DEFAULT_DIO_REDUNDANCY_CONSTANT,
+            callback   = self._send_DIO,
+            rng        = self.engine.get_random(u'rpl.trickle_timer', self.mote.id),
+            aggregated = self.settings.rpl_trickle_timer_aggregated
         )
         self.parentChildfromDAOs       = {}      # dictionary containing parents of each node
+        self._childrenfromDAOs         = {}      # indexed by parent, reverse of parentChildfromDAOs
+        self._source_routes            = {}      # indexed by destination, None for no route
         self._tx_stat                  = {}      # indexed by mote_id
         self.dis_mode = self._get_dis_mode()
 
@@ -82,7 +85,19 @@ class Rpl(object):
             return int(old_div(self.of.rank, d.RPL_MINHOPRANKINCREASE))
 
     def addParentChildfromDAOs(self, parent_addr, child_addr):
+        old_parent_addr = self.parentChildfromDAOs.get(child_addr)
+        if old_parent_addr == parent_addr:
+            # nothing changed; the cached source routes are still valid
+            return
+
         self.parentChildfromDAOs[child_addr] = parent_addr
+        if old_parent_addr is not None:
+            self._childrenfromDAOs[old_parent_addr].discard(child_addr)
+        self._childrenfromDAOs.setdefault(parent_addr, set()).add(child_addr)
+
+        # the source routes to the child and its descendants go through
+        # the new parent from now on
+        self._invalidate_source_routes(child_addr)
 
     def getPreferredParent(self):
         # return the MAC address of the current preferred parent
@@ -381,7 +396,7 @@ class Rpl(object):
             asnDiff = 1
         else:
             asnDiff = int(math.ceil(
-                old_div(random.uniform(
+                old_div(self.rng.uniform(
                     0.8 * self.settings.rpl_daoPeriod,
                     1.2 * self.settings.rpl_daoPeriod
                 ), self.settings.tsch_slotDuration))
@@ -492,27 +507,61 @@ class Rpl(object):
 
     def computeSourceRoute(self, dst_addr):
         assert self.mote.dagRoot
-        try:
-            sourceRoute = []
-            cur_addr = dst_addr
-            while self.mote.is_my_ipv6_addr(cur_addr) is False:
-                sourceRoute += [cur_addr]
-                cur_addr     = self.parentChildfromDAOs[cur_addr]
-                if cur_addr in sourceRoute:
-                    # routing loop is detected; cannot return an effective
-                    # source-routing header
-                    returnVal = None
-                    break
-        except KeyError:
-            returnVal = None
+
+        # walk up until we reach ourselves or a destination whose route is
+        # already known
+        path = []
+        visited = set()
+        cur_addr = dst_addr
+        while (
+                (cur_addr not in self._source_routes)
+                and
+                (self.mote.is_my_ipv6_addr(cur_addr) is False)
+            ):
+            if cur_addr in visited:
+                # routing loop is detected; cannot return an effective
+                # source-routing header
+                route = None
+                break
+            path.append(cur_addr)
+            visited.add(cur_addr)
+            if cur_addr not in self.parentChildfromDAOs:
+                route = None
+                break
+            cur_addr = self.parentChildfromDAOs[cur_addr]
         else:
-            # reverse (so goes from source to destination)
-            sourceRoute.reverse()
+            if cur_addr in self._source_routes:
+                route = self._source_routes[cur_addr]
+            else:
+                route = ()
 
-            returnVal = sourceRoute
+        # cache the routes to all the destinations on the path; they share
+        # the result since they are on the same branch
+        for addr in reversed(path):
+            if route is not None:
+                route = route + (addr, )
+            self._source_routes[addr] = route
+
+        if route is None:
+            returnVal = None
+        else:
+            # the caller consumes the route; give it a copy
+            returnVal = list(route)
 
         return returnVal
 
+    def _invalidate_source_routes(self, addr):
+        # remove the cached routes to addr and all its descendants
+        stack = [addr]
+        visited = set()
+        while stack:
+            cur_addr = stack.pop()
+            if cur_addr in visited:
+                continue
+            visited.add(cur_addr)
+            self._source_routes.pop(cur_addr, None)
+            stack.extend(self._childrenfromDAOs.get(cur_addr, ()))
+
 
 class RplOFBase(object):
     def __init__(self, rpl):
@@ -858,53 +907,50 @@ class RplOFBestLinkPDR(RplOF0):
         u'mean_link_rssi': INVALID_RSSI_VALUE
     }
 
+    # incremented at every change of preferred parent of any mote, which
+    # invalidates the cached paths to the root
+    _dodag_version = 0
+
     def __init__(self, rpl):
         super(RplOFBestLinkPDR, self).__init__(rpl)
         self.preferred_parent = self.NONE_PREFERRED_PARENT
         self.neighbors = []
         self.path_pdr = 0
 
+        # IDs of the motes on our path to the root, None without a path to
+        # the root; computed for _ancestors_version
+        self._ancestors         = None
+        self._ancestors_version = None
+
+        # version of the connectivity matrix the link quality values of
+        # our neighbors are computed for
+        self._link_quality_version = None
+
         # short hand
         self.mote = self.rpl.mote
         self.engine = self.rpl.engine
         self.connectivity = self.engine.connectivity
 
+        # this OF replaces the one of Rpl (e.g. when RPL starts again after
+        # a desync); the paths to the root cached through the old
+        # preferred parent of this mote are no longer valid
+        self._invalidate_ancestors()
+
     @property
     def parents(self):
         # return neighbors which don't have us on their paths to the
         # root
-        ret_val = []
-        for neighbor in self.neighbors:
-            # parent should have better PDR than ACCEPTABLE_LOWEST_PDR
-            if neighbor[u'mean_link_pdr'] < self.ACCEPTABLE_LOWEST_PDR:
-                # this neighbor is not eligible to be a parent
-                continue
-            parent_mote = self.engine.motes[neighbor[u'mote_id']]
-            while parent_mote.dagRoot is False:
-                assert parent_mote.rpl.of.preferred_parent
-                parent_id = parent_mote.rpl.of.preferred_parent[u'mote_id']
-
-                if (
-                        (parent_id is None)
-                        or
-                        (parent_id == self.mote.id)
-                    ):
-                    # this mote doesn't have parent. OR we will make a
-                    # routing loop if we select this neighbor as our
-                    # preferred parent.
-                    parent_mote = None
-                    break
-
-                parent_mote = self.engine.motes[parent_id]
-
-            if parent_mote:
-                ret_val.append(neighbor)
-        return ret_val
+        return [
+            neighbor for neighbor in self.neighbors
+            if self._is_eligible_parent(neighbor)
+        ]
 
     def reset(self):
         super(RplOFBestLinkPDR, self).reset()
         self.preferred_parent = self.NONE_PREFERRED_PARENT
         self.neighbors = []
+        self._link_quality_version = None
+        self._invalidate_ancestors()
 
     def update(self, dio):
         # short-hand
@@ -929,6 +975,8 @@ class RplOFBestLinkPDR(RplOF0):
                     u'mean_link_pdr': 0
                 }
                 self.neighbors.append(neighbor)
+                self._update_mean_link_pdr(neighbor)
+                self._update_mean_link_rssi(neighbor)
 
             # update the advertised rank and path ETX
             neighbor[u'rank'] = dio[u'app'][u'rank']
@@ -991,22 +1039,23 @@ class RplOFBestLinkPDR(RplOF0):
         return ret_val
 
     def _find_mote_id(self, mac_addr):
-        mote_id = None
-        for mote in self.engine.motes:
-            if mote.is_my_mac_addr(mac_addr):
-                mote_id = mote.id
-                break
-        assert mote_id is not None
-        return mote_id
+        mote = self.engine.get_mote_by_mac_addr(mac_addr)
+        assert mote is not None
+        return mote.id
 
     def _update_link_quality_of_neighbors(self):
+        # the values are recomputed only when the connectivity matrix
+        # changes; a new neighbor gets its values when it's added
+        if self._link_quality_version == self.connectivity.version:
+            return
+        self._link_quality_version = self.connectivity.version
         for neighbor in self.neighbors:
             self._update_mean_link_pdr(neighbor)
             self._update_mean_link_rssi(neighbor)
 
     def _update_preferred_parent(self):
-        if self.parents:
-            new_preferred_parent = self._find_best_parent()
+        new_preferred_parent = self._find_best_parent()
+        if new_preferred_parent is not None:
             new_rank = self._calculate_rank(new_preferred_parent)
         else:
             new_preferred_parent = self.NONE_PREFERRED_PARENT
@@ -1038,6 +1087,7 @@ class RplOFBestLinkPDR(RplOF0):
                 old_preferred_parent = self.preferred_parent
                 self.preferred_parent = new_preferred_parent
                 self.rank = self._calculate_rank(new_preferred_parent)
+                self._invalidate_ancestors()
                 self.rpl.indicate_preferred_parent_change(
                     old_preferred_parent[u'mac_addr'],
                     new_preferred_parent[u'mac_addr']
@@ -1058,40 +1108,68 @@ class RplOFBestLinkPDR(RplOF0):
     def _update_mean_link_pdr(self, neighbor):
         # we will calculate the mean PDR value over all the available
         # channels and both of the directions
-        neighbor[u'mean_link_pdr'] = numpy.mean([
-            self.connectivity.get_pdr(src_id, dst_id, channel)
-            for channel in self.mote.tsch.hopping_sequence
-            for src_id, dst_id in [
-                (self.mote.id, neighbor[u'mote_id']),
-                (neighbor[u'mote_id'], self.mote.id)
-            ]
-        ])
+        neighbor[u'mean_link_pdr'] = self.connectivity.get_mean_link_pdr(
+            self.mote.id,
+            neighbor[u'mote_id']
+        )
 
     def _update_mean_link_rssi(self, neighbor):
         # we will calculate the mean RSSI value over all the available
         # channels.
-        neighbor[u'mean_link_rssi'] = numpy.mean([
-            self.connectivity.get_rssi(
-                src_id = self.mote.id,
-                dst_id = neighbor[u'mote_id'],
-                channel = channel
-            )
-            for channel in self.mote.tsch.hopping_sequence
-        ])
+        neighbor[u'mean_link_rssi'] = self.connectivity.get_mean_link_rssi(
+            self.mote.id,
+            neighbor[u'mote_id']
+        )
 
     def _find_best_parent(self):
         # find a parent which brings the best rank for us. use mote_id
-        # for a tie-breaker.
-
-        # sort the neighbors
-        self.neighbors = sorted(
-            self.neighbors,
-            key=lambda e: (
-                self._calculate_rank(e),
-                e[u'mean_link_rssi'],
-                e[u'mote_id']
+        # for a tie-breaker. return None when we have no parent.
+        best_parent = None
+        best_key = None
+        for neighbor in self.neighbors:
+            if not self._is_eligible_parent(neighbor):
+                continue
+            key = (
+                self._calculate_rank(neighbor),
+                neighbor[u'mean_link_rssi'],
+                neighbor[u'mote_id']
             )
-        )
+            if (best_key is None) or (key < best_key):
+                best_parent = neighbor
+                best_key = key
+        return best_parent
+
+    def _is_eligible_parent(self, neighbor):
+        # parent should have better PDR than ACCEPTABLE_LOWEST_PDR
+        if neighbor[u'mean_link_pdr'] < self.ACCEPTABLE_LOWEST_PDR:
+            return False
+
+        # the neighbor should have a path to the root, on which we are not
+        # (otherwise we will make a routing loop)
+        neighbor_mote = self.engine.motes[neighbor[u'mote_id']]
+        if neighbor_mote.dagRoot:
+            return True
+        ancestors = neighbor_mote.rpl.of._get_ancestors()
+        return (ancestors is not None) and (self.mote.id not in ancestors)
+
+    def _get_ancestors(self):
+        if self._ancestors_version != RplOFBestLinkPDR._dodag_version:
+            # mark the cache as computed first, so that a loop in the
+            # DODAG ends with None
+            self._ancestors         = None
+            self._ancestors_version = RplOFBestLinkPDR._dodag_version
+
+            assert self.preferred_parent
+            parent_id = self.preferred_parent[u'mote_id']
+            if parent_id is not None:
+                parent_mote = self.engine.motes[parent_id]
+                if parent_mote.dagRoot:
+                    self._ancestors = frozenset([parent_id])
+                else:
+                    parent_ancestors = parent_mote.rpl.of._get_ancestors()
+                    if parent_ancestors is not None:
+                        self._ancestors = parent_ancestors | set([parent_id])
+        return self._ancestors
 
-        # then return the first neighbor in "parents"
-        return self.parents[0]
+    def _invalidate_ancestors(self):
+        RplOFBestLinkPDR._dodag_version += 1
@@ -10,7 +10,6 @@ from builtins import str
 from builtins import object
 from past.utils import old_div
 import copy
-import random
 
 # Mote sub-modules
 from . import MoteDefines as d
@@ -44,6 +43,7 @@ class SecJoin(object):
         self.log                            = SimEngine.SimLog.SimLog().log
 
         # local variables
+        self.rng                            = self.engine.get_random(u'secjoin', self.mote.id)
         self._isJoined                      = False
         self._request_timeout               = None
         self._retransmission_count          = None
@@ -102,7 +102,7 @@ class SecJoin(object):
 
             # initialize request timeout; pick a number randomly between
             # TIMEOUT_BASE and (TIMEOUT_BASE * TIMEOUT_RANDOM_FACTOR)
-            self._request_timeout  = self.TIMEOUT_BASE * random.uniform(1, self.TIMEOUT_RANDOM_FACTOR)
+            self._request_timeout  = self.TIMEOUT_BASE * self.rng.uniform(1, self.TIMEOUT_RANDOM_FACTOR)
 
             self._send_join_request()
         else:
@@ -11,9 +11,9 @@ from builtins import range
 from past.utils import old_div
 from builtins import object
 from abc import abstractmethod
+import collections
 import copy
 import math
-import random
 
 import netaddr
 
@@ -393,17 +393,23 @@ class Fragmentation(object):
 
         # local variables
         self.mote                 = sixlowpan.mote
-        self.next_datagram_tag    = random.randint(0, 2**16-1)
+        self.rng                  = self.engine.get_random(u'fragmentation', self.mote.id)
+        self.next_datagram_tag    = self.rng.randint(0, 2**16-1)
         # "reassembly_buffers" has mote instances as keys. Each value is a list.
         # A list is indexed by incoming datagram_tags.
         #
-        # An element of the list a dictionary consisting of three key-values:
-        # "net", "expiration" and "fragments".
+        # An element of the list a dictionary consisting of four key-values:
+        # "net", "expiration", "received_offsets" and "received_length".
         #
         # - "net" has srcIp and dstIp of the packet
-        # - "fragments" holds received fragments, although only their
-        # datagram_offset and lengths are stored in the "fragments" list.
+        # - "received_offsets" holds datagram_offset of received fragments
+        # - "received_length" is the total length of received fragments
         self.reassembly_buffers   = {}
+        self.reassembly_buffers_num = 0
+        # (expiration, srcMac, datagram_tag) of reassembly buffers in order
+        # of creation; every buffer has the same lifetime, so that this is
+        # in order of expiration as well
+        self.reassembly_buffer_expirations = collections.deque()
 
     #======================== public ==========================================
 
@@ -481,20 +487,21 @@ class Fragmentation(object):
                     }
                 }
 
-                # put additional fields to the first and the last fragment
+                # put additional fields to the first and the last fragment;
+                # they refer to the headers of the original packet, which is
+                # not used any more once it's fragmented. Receivers copy what
+                # they keep or forward.
                 if   i == 0:
                     # first fragment
 
                     # copy 'net' header
                     for key, value in list(packet[u'net'].items()):
                         fragment[u'net'][key] = value
-                    if u'sourceRoute' in packet[u'net']:
-                        fragment[u'net'][u'sourceRoute']      = copy.deepcopy(packet[u'net'][u'sourceRoute'])
                 elif i == (number_of_fragments - 1):
                     # the last fragment
 
                     # add original_packet_type and 'app' field
-                    fragment[u'app']                         = copy.deepcopy(packet[u'app'])
+                    fragment[u'app']                         = packet[u'app']
                     fragment[u'net'][u'original_packet_type'] = packet[u'type']
 
                 # populate packet_length
@@ -510,8 +517,8 @@ class Fragmentation(object):
                 # update datagram_offset which will be used for the next fragment
                 datagram_offset += fragment[u'net'][u'packet_length']
 
-                # copy the MAC header
-                fragment[u'mac'] = copy.deepcopy(packet[u'mac'])
+                # copy the MAC header; TSCH writes per-frame fields into it
+                fragment[u'mac'] = dict(packet[u'mac'])
 
                 # add the fragment to a returning list
                 returnVal += [fragment]
@@ -552,10 +559,7 @@ class Fragmentation(object):
         if (srcMac not in self.reassembly_buffers) or (incoming_datagram_tag not in self.reassembly_buffers[srcMac]):
             # dagRoot has no memory limitation for reassembly buffer
             if not self.mote.dagRoot:
-                total_reassembly_buffers_num = 0
-                for i in self.reassembly_buffers:
-                    total_reassembly_buffers_num += len(self.reassembly_buffers[i])
-                if total_reassembly_buffers_num == self.settings.sixlowpan_reassembly_buffers_num:
+                if self.reassembly_buffers_num == self.settings.sixlowpan_reassembly_buffers_num:
                     # no room for a new entry
                     self.mote.drop_packet(
                         packet = fragment,
@@ -566,31 +570,36 @@ class Fragmentation(object):
             # create a new reassembly buffer
             if srcMac not in self.reassembly_buffers:
                 self.reassembly_buffers[srcMac] = {}
-            if incoming_datagram_tag not in self.reassembly_buffers[srcMac]:
-                self.reassembly_buffers[srcMac][incoming_datagram_tag] = {
-                    u'expiration': self.engine.getAsn() + buffer_lifetime,
-                    u'fragments': []
-                }
+            expiration = self.engine.getAsn() + buffer_lifetime
+            self.reassembly_buffers[srcMac][incoming_datagram_tag] = {
+                u'expiration':       expiration,
+                u'received_offsets': set(),
+                u'received_length':  0
+            }
+            self.reassembly_buffers_num += 1
+            self.reassembly_buffer_expirations.append(
+                (expiration, srcMac, incoming_datagram_tag)
+            )
 
-        if datagram_offset not in [x[u'datagram_offset'] for x in self.reassembly_buffers[srcMac][incoming_datagram_tag][u'fragments']]:
+        reassembly_buffer = self.reassembly_buffers[srcMac][incoming_datagram_tag]
+
+        if datagram_offset not in reassembly_buffer[u'received_offsets']:
 
             if fragment[u'net'][u'datagram_offset'] == 0:
                 # store srcIp and dstIp which only the first fragment has
-                self.reassembly_buffers[srcMac][incoming_datagram_tag][u'net'] = copy.deepcopy(fragment[u'net'])
-                del self.reassembly_buffers[srcMac][incoming_datagram_tag][u'net'][u'datagram_size']
-                del self.reassembly_buffers[srcMac][incoming_datagram_tag][u'net'][u'datagram_offset']
-                del self.reassembly_buffers[srcMac][incoming_datagram_tag][u'net'][u'datagram_tag']
-
-            self.reassembly_buffers[srcMac][incoming_datagram_tag][u'fragments'].append({
-                u'datagram_offset': datagram_offset,
-                u'fragment_length': fragment[u'net'][u'packet_length']
-            })
+                reassembly_buffer[u'net'] = copy.deepcopy(fragment[u'net'])
+                del reassembly_buffer[u'net'][u'datagram_size']
+                del reassembly_buffer[u'net'][u'datagram_offset']
+                del reassembly_buffer[u'net'][u'datagram_tag']
+
+            reassembly_buffer[u'received_offsets'].add(datagram_offset)
+            reassembly_buffer[u'received_length'] += fragment[u'net'][u'packet_length']
         else:
             # it's a duplicate fragment
             return
 
         # check whether we have a full packet in the reassembly buffer
-        total_fragment_length = sum([f[u'fragment_length'] for f in self.reassembly_buffers[srcMac][incoming_datagram_tag][u'fragments']])
+        total_fragment_length = reassembly_buffer[u'received_length']
         assert total_fragment_length <= datagram_size
         if total_fragment_length < datagram_size:
             # reassembly is not completed
@@ -599,13 +608,11 @@ class Fragmentation(object):
         # construct an original packet
         packet = copy.copy(fragment)
         packet[u'type'] = fragment[u'net'][u'original_packet_type']
-        packet[u'net'] = copy.deepcopy(self.reassembly_buffers[srcMac][incoming_datagram_tag][u'net'])
+        packet[u'net'] = copy.deepcopy(reassembly_buffer[u'net'])
         packet[u'net'][u'packet_length'] = datagram_size
 
         # reassembly is done, delete buffer
-        del self.reassembly_buffers[srcMac][incoming_datagram_tag]
-        if len(self.reassembly_buffers[srcMac]) == 0:
-            del self.reassembly_buffers[srcMac]
+        self._delete_reassembly_buffer(srcMac, incoming_datagram_tag)
 
         return packet
 
@@ -617,18 +624,35 @@ class Fragmentation(object):
         return ret
 
     def _delete_expired_reassembly_buffer(self):
-        if len(self.reassembly_buffers) == 0:
-            return
-
-        for srcMac in list(self.reassembly_buffers.keys()):
-            for incoming_datagram_tag in list(self.reassembly_buffers[srcMac].keys()):
-                # delete expired reassembly buffer
-                if self.reassembly_buffers[srcMac][incoming_datagram_tag][u'expiration'] < self.engine.getAsn():
-                    del self.reassembly_buffers[srcMac][incoming_datagram_tag]
+        asn = self.engine.getAsn()
+        while (
+                self.reassembly_buffer_expirations
+                and
+                (self.reassembly_buffer_expirations[0][0] < asn)
+            ):
+            (expiration, srcMac, incoming_datagram_tag) = (
+                self.reassembly_buffer_expirations.popleft()
+            )
+            # the buffer may have been completed, or replaced by a new one
+            # with the same key
+            if (
+                    (srcMac in self.reassembly_buffers)
+                    and
+                    (incoming_datagram_tag in self.reassembly_buffers[srcMac])
+                    and
+                    (
+                        self.reassembly_buffers[srcMac][incoming_datagram_tag][u'expiration']
+                        ==
+                        expiration
+                    )
+                ):
+                self._delete_reassembly_buffer(srcMac, incoming_datagram_tag)
 
-            # delete an reassembly buffer entry if it's empty
-            if len(self.reassembly_buffers[srcMac]) == 0:
-                del self.reassembly_buffers[srcMac]
+    def _delete_reassembly_buffer(self, srcMac, incoming_datagram_tag):
+        del self.reassembly_buffers[srcMac][incoming_datagram_tag]
+        if len(self.reassembly_buffers[srcMac]) == 0:
+            del self.reassembly_buffers[srcMac]
+        self.reassembly_buffers_num -= 1
 
 class PerHopReassembly(Fragmentation):
     """
@@ -650,6 +674,10 @@ class FragmentForwarding(Fragmentation):
     def __init__(self, sixlowpan):
         super(FragmentForwarding, self).__init__(sixlowpan)
         self.vrb_table       = {}
+        self.vrb_table_entry_num = 0
+        # (expiration, srcMac, datagram_tag) of VRB table entries in order
+        # of creation, which is in order of expiration as well
+        self.vrb_table_entry_expirations = collections.deque()
 
     #======================== public ==========================================
 
@@ -679,9 +707,8 @@ class FragmentForwarding(Fragmentation):
                 # dagRoot has no memory limitation for VRB Table
                 pass
             else:
-                total_vrb_table_entry_num = sum([len(e) for _, e in list(self.vrb_table.items())])
-                assert total_vrb_table_entry_num <= self.settings.fragmentation_ff_vrb_table_size
-                if total_vrb_table_entry_num == self.settings.fragmentation_ff_vrb_table_size:
+                assert self.vrb_table_entry_num <= self.settings.fragmentation_ff_vrb_table_size
+                if self.vrb_table_entry_num == self.settings.fragmentation_ff_vrb_table_size:
                     # no room for a new entry
                     self.mote.drop_packet(
                         packet = fragment,
@@ -704,6 +731,7 @@ class FragmentForwarding(Fragmentation):
                 return
             else:
                 self.vrb_table[srcMac][incoming_datagram_tag] = {}
+                self.vrb_table_entry_num += 1
 
             if self.mote.is_my_ipv6_addr(fragment[u'net'][u'dstIp']):
                 # this is a special entry for fragments destined to the mote
@@ -712,7 +740,11 @@ class FragmentForwarding(Fragmentation):
                 self.vrb_table[srcMac][incoming_datagram_tag][u'dstMac']                = dstMac
                 self.vrb_table[srcMac][incoming_datagram_tag][u'outgoing_datagram_tag'] = self._get_next_datagram_tag()
 
-            self.vrb_table[srcMac][incoming_datagram_tag][u'expiration'] = self.engine.getAsn() + entry_lifetime
+            expiration = self.engine.getAsn() + entry_lifetime
+            self.vrb_table[srcMac][incoming_datagram_tag][u'expiration'] = expiration
+            self.vrb_table_entry_expirations.append(
+                (expiration, srcMac, incoming_datagram_tag)
+            )
 
             if u'missing_fragment' in self.settings.fragmentation_ff_discard_vrb_entry_policy:
                 self.vrb_table[srcMac][incoming_datagram_tag][u'next_offset'] = 0
@@ -728,9 +760,7 @@ class FragmentForwarding(Fragmentation):
             if datagram_offset == self.vrb_table[srcMac][incoming_datagram_tag][u'next_offset']:
                 self.vrb_table[srcMac][incoming_datagram_tag][u'next_offset'] += packet_length
             else:
-                del self.vrb_table[srcMac][incoming_datagram_tag]
-                if len(self.vrb_table[srcMac]) == 0:
-                    del self.vrb_table[srcMac]
+                self._delete_vrb_table_entry(srcMac, incoming_datagram_tag)
 
         # find entry in VRB table and forward fragment
         if (srcMac in self.vrb_table) and (incoming_datagram_tag in self.vrb_table[srcMac]):
@@ -744,9 +774,10 @@ class FragmentForwarding(Fragmentation):
             else:
                 # need to create a new packet in order to distinguish between the
                 # received packet and a forwarding packet.
+                # forward() copies the headers again for the outgoing frame
                 fwdFragment = {
-                    u'type':       copy.deepcopy(fragment[u'type']),
-                    u'net':        copy.deepcopy(fragment[u'net']),
+                    u'type':       fragment[u'type'],
+                    u'net':        dict(fragment[u'net']),
                     u'mac': {
                         u'srcMac': self.mote.get_mac_addr(),
                         u'dstMac': self.vrb_table[srcMac][incoming_datagram_tag][u'dstMac']
@@ -758,7 +789,7 @@ class FragmentForwarding(Fragmentation):
 
                 # copy app field if necessary
                 if u'app' in fragment:
-                    fwdFragment[u'app'] = copy.deepcopy(fragment[u'app'])
+                    fwdFragment[u'app'] = fragment[u'app']
 
                 ret = fwdFragment
 
@@ -778,23 +809,39 @@ class FragmentForwarding(Fragmentation):
                 and
                 ((datagram_offset + packet_length) == datagram_size)
            ):
-            del self.vrb_table[srcMac][incoming_datagram_tag]
-            if len(self.vrb_table[srcMac]) == 0:
-                del self.vrb_table[srcMac]
+            self._delete_vrb_table_entry(srcMac, incoming_datagram_tag)
 
         return ret
 
     #======================== private ==========================================
 
     def _delete_expired_vrb_table_entry(self):
-        if len(self.vrb_table) == 0:
-            return
+        asn = self.engine.getAsn()
+        while (
+                self.vrb_table_entry_expirations
+                and
+                (self.vrb_table_entry_expirations[0][0] < asn)
+            ):
+            (expiration, srcMac, incoming_datagram_tag) = (
+                self.vrb_table_entry_expirations.popleft()
+            )
+            # the entry may have been discarded, or replaced by a new one
+            # with the same key
+            if (
+                    (srcMac in self.vrb_table)
+                    and
+                    (incoming_datagram_tag in self.vrb_table[srcMac])
+                    and
+                    (
+                        self.vrb_table[srcMac][incoming_datagram_tag][u'expiration']
+                        ==
+                        expiration
+                    )
+                ):
+                self._delete_vrb_table_entry(srcMac, incoming_datagram_tag)
 
-        for srcMac in list(self.vrb_table.keys()):
-            for incoming_datagram_tag in list(self.vrb_table[srcMac].keys()):
-                # too old
-                if self.vrb_table[srcMac][incoming_datagram_tag][u'expiration'] < self.engine.getAsn():
-                    del self.vrb_table[srcMac][incoming_datagram_tag]
-            # empty
-            if len(self.vrb_table[srcMac]) == 0:
-                del self.vrb_table[srcMac]
+    def _delete_vrb_table_entry(self, srcMac, incoming_datagram_tag):
+        del self.vrb_table[srcMac][incoming_datagram_tag]
+        if len(self.vrb_table[srcMac]) == 0:
+            del self.vrb_table[srcMac]
+        self.vrb_table_entry_num -= 1
@@ -11,7 +11,6 @@ from __future__ import absolute_import
 
 from builtins import range
 from builtins import object
-import copy
 import random
 
 # Mote sub-modules
@@ -27,6 +26,21 @@ class TransactionAdditionError(Exception):
 
 # =========================== helpers =========================================
 
+def copy_packet(packet):
+    """Return a copy of a 6P packet which is not affected by changes made on
+    the original one
+
+    TSCH modifies the MAC header while the packet is in the TX queue, and
+    Mote.drop_packet() clears the packet. Values in the 'app' field, such as
+    cell lists, are never modified once the packet is created; they are
+    shared with the original packet instead of being deep-copied.
+    """
+    returnVal = dict(packet)
+    for key in [u'mac', u'app']:
+        if key in packet:
+            returnVal[key] = dict(packet[key])
+    return returnVal
+
 # =========================== body ============================================
 
 class SixP(object):
@@ -43,13 +57,12 @@ class SixP(object):
 
         # local variables
         self.seqnum_table      = {} # indexed by neighbor_id
-        self.transaction_table = {} # indexed by [initiator, responder]
+        self.transaction_table = {} # indexed by (initiator, responder)
 
     # ======================= public ==========================================
 
     def clear_transaction_table(self):
-        for transaction in [self.transaction_table[key]
-                            for key in self.transaction_table]:
+        for transaction in list(self.transaction_table.values()):
             transaction.invalidate()
 
     def recv_packet(self, packet):
@@ -165,14 +178,15 @@ class SixP(object):
 
             # enqueue
             # the packet is saved for the callback, which is called
-            # when the packet fails to be enqueued
-            original_packet = copy.deepcopy(packet)
+            # when the packet fails to be enqueued; the transaction has a
+            # copy of the packet as it is before enqueued
+            original_packet = transaction.request
             self._tsch_enqueue(packet)
 
             if packet:
                 # update transaction using the packet that has a valid
                 # seqnum in the MAC header
-                transaction.request = copy.deepcopy(packet)
+                transaction.request = copy_packet(packet)
             elif callback:
                 # the packet could not be queued
                 callback(
@@ -221,7 +235,7 @@ class SixP(object):
         self._tsch_enqueue(packet)
         if transaction:
             # keep the response packet in case of abortion
-            transaction.response = copy.deepcopy(packet)
+            transaction.response = copy_packet(packet)
 
     def send_confirmation(
             self,
@@ -250,7 +264,7 @@ class SixP(object):
         self._tsch_enqueue(packet)
 
         # keep the confirmation packet
-        transaction.confirmation = copy.deepcopy(packet)
+        transaction.confirmation = copy_packet(packet)
 
     def add_transaction(self, transaction):
         if transaction.key in self.transaction_table:
@@ -268,14 +282,7 @@ class SixP(object):
 
     def abort_transaction(self, initiator_mac_addr, responder_mac_addr):
         # make sure we have a transaction to abort
-        dummy_packet = {
-            u'mac': {
-                u'srcMac': initiator_mac_addr,
-                u'dstMac': responder_mac_addr
-            },
-            u'app': {u'msgType': d.SIXP_MSG_TYPE_REQUEST}
-        }
-        transaction_key = SixPTransaction.get_transaction_key(dummy_packet)
+        transaction_key = (initiator_mac_addr, responder_mac_addr)
         transaction = self.transaction_table[transaction_key]
         assert transaction is not None
         transaction.invoke_callback(
@@ -413,7 +420,6 @@ class SixP(object):
                 transaction.timeout_handler()
 
     def _recv_response(self, response):
-        self.transaction_table
         transaction = self._find_transaction(response)
         if transaction is None:
             # Cannot find an corresponding transaction; ignore this packet
@@ -649,7 +655,7 @@ class SixPTransaction(object):
         self.log              = SimEngine.SimLog.SimLog().log
 
         # local variables
-        self.request          = copy.deepcopy(request)
+        self.request          = copy_packet(request)
         self.response         = None
         self.confirmation     = None
         self.callback         = None
@@ -666,11 +672,12 @@ class SixPTransaction(object):
             self.peerMac      = self.responder
         else:
             self.peerMac      = self.initiator
-        self.event_unique_tag = u'{0}-{1}-{2}-{3}'.format(
+        # the timeout event is re-armed with this tag by start()
+        self.event_unique_tag = (
             self.mote.id,
             self.initiator,
             self.responder,
-            '6P-transaction-timeout'
+            u'6P-transaction-timeout'
         )
 
         # register itself to sixp
@@ -695,7 +702,7 @@ class SixPTransaction(object):
             # shouldn't come here
             raise Exception()
 
-        return u'{0}-{1}'.format(initiator, responder)
+        return (initiator, responder)
 
     @property
     def last_packet(self):
@@ -4,11 +4,10 @@ Trickle Timer: IETF RFC 6206 (https://tools.ietf.org/html/rfc6206)
 from __future__ import absolute_import
 from __future__ import division
 
-from builtins import str
 from builtins import object
 from past.utils import old_div
+import itertools
 import math
-import random
 
 import SimEngine
 from . import MoteDefines as d
@@ -18,7 +17,10 @@ class TrickleTimer(object):
     STATE_STOPPED = u'stopped'
     STATE_RUNNING = u'running'
 
-    def __init__(self, i_min, i_max, k, callback):
+    # source of the integer handles identifying timer instances
+    _handles = itertools.count()
+
+    def __init__(self, i_min, i_max, k, callback, rng=None, aggregated=False):
         assert isinstance(i_min, (int, int))
         assert isinstance(i_max, (int, int))
         assert isinstance(k, (int, int))
@@ -28,6 +30,12 @@ class TrickleTimer(object):
         self.engine   = SimEngine.SimEngine.SimEngine()
         self.settings = SimEngine.SimSettings.SimSettings()
 
+        # random number generator; timers created without a dedicated stream
+        # share the one of the trickle_timer subsystem
+        if rng is None:
+            rng = self.engine.get_random(u'trickle_timer')
+        self.rng = rng
+
         # constants of this timer instance
         # min_interval is expected to given in milliseconds
         # max_interval is expected to be described as a number of doublings of the
@@ -35,7 +43,19 @@ class TrickleTimer(object):
         self.min_interval = i_min
         self.max_interval = self.min_interval * pow(2, i_max)
         self.redundancy_constant = k
-        self.unique_tag_base = str(id(self))
+        self.handle = next(self._handles)
+        self.unique_tag_at_t = (u'TrickleTimer', self.handle, u'at_t')
+        self.unique_tag_at_i = (u'TrickleTimer', self.handle, u'at_i')
+
+        # with aggregated, the events of the timer are kept in the heap of
+        # the engine shared by all the aggregated timers, instead of being
+        # scheduled individually. The events due at an ASN then run together
+        # at the place of the single engine event among the other stack
+        # tasks of that ASN. A DIO may thus be enqueued before a packet
+        # enqueued by another stack task of the same ASN instead of after it,
+        # and fixed-seed results may differ from the ones of individual
+        # events.
+        self.aggregated = aggregated
 
         # variables
         self.counter = 0
@@ -43,6 +63,18 @@ class TrickleTimer(object):
         self.user_callback = callback
         self.state = self.STATE_STOPPED
 
+        # handles and ASNs of the pending events in the heap of the engine;
+        # None when no event is pending. Replaced events stay in the heap
+        # until their ASN, at most Imax ahead, and are ignored then.
+        self.event_handle_at_t = None
+        self.event_handle_at_i = None
+        self.event_asn_at_t    = None
+        self.event_asn_at_i    = None
+
+        # handles of replaced events which fire all the same; see
+        # _drop_event()
+        self.due_event_handles = set()
+
     @property
     def is_running(self):
         return self.state == self.STATE_RUNNING
@@ -54,12 +86,19 @@ class TrickleTimer(object):
         #       Imin and less than or equal to Imax.  The algorithm then begins
         #       the first interval.
         self.state = self.STATE_RUNNING
-        self.interval = random.randint(self.min_interval, self.max_interval)
+        self.interval = self.rng.randint(self.min_interval, self.max_interval)
         self._start_next_interval()
 
     def stop(self):
-        self.engine.removeFutureEvent(self.unique_tag_base + u'_at_i')
-        self.engine.removeFutureEvent(self.unique_tag_base + u'_at_t')
+        if self.aggregated:
+            # pending events are ignored when they fire
+            self._drop_event(self.event_handle_at_t, self.event_asn_at_t)
+            self._drop_event(self.event_handle_at_i, self.event_asn_at_i)
+            self.event_handle_at_t = None
+            self.event_handle_at_i = None
+        else:
+            self.engine.removeFutureEvent(self.unique_tag_at_i)
+            self.engine.removeFutureEvent(self.unique_tag_at_t)
         self.state = self.STATE_STOPPED
 
     def reset(self):
@@ -110,48 +149,92 @@ class TrickleTimer(object):
         #       that is, values greater than or equal to I/2 and less than I.
         #       The interval ends at I.
         slot_len = self.settings.tsch_slotDuration * 1000 # convert to ms
-        t = old_div((1 + random.random()) * self.interval, 2)
+        t = old_div((1 + self.rng.random()) * self.interval, 2)
         asn = self.engine.getAsn() + int(math.ceil(old_div(t, slot_len)))
         if asn == self.engine.getAsn():
             # schedule the event at the next ASN since we cannot schedule it at
             # the current ASN
             asn = self.engine.getAsn() + 1
 
-        def _callback():
-            if self.counter < self.redundancy_constant:
-                #  Section 4.2:
-                #    4.  At time t, Trickle transmits if and only if the
-                #        counter c is less than the redundancy constant k.
-                self.user_callback()
-            else:
-                # do nothing
-                pass
-
-        self.engine.scheduleAtAsn(
-            asn            = asn,
-            cb             = _callback,
-            uniqueTag      = self.unique_tag_base + u'_at_t',
-            intraSlotOrder = d.INTRASLOTORDER_STACKTASKS)
+        if self.aggregated:
+            self._drop_event(self.event_handle_at_t, self.event_asn_at_t)
+            self.event_asn_at_t    = asn
+            self.event_handle_at_t = self.engine.schedule_trickle_timer_event(
+                asn      = asn,
+                callback = self._handle_event_at_t
+            )
+        else:
+            self.engine.scheduleAtAsn(
+                asn            = asn,
+                cb             = self._action_at_t,
+                uniqueTag      = self.unique_tag_at_t,
+                intraSlotOrder = d.INTRASLOTORDER_STACKTASKS)
 
     def _schedule_event_at_end_of_interval(self):
         slot_len = self.settings.tsch_slotDuration * 1000 # convert to ms
         asn = self.engine.getAsn() + int(math.ceil(old_div(self.interval, slot_len)))
 
-        def _callback():
-            # doubling the interval
-            #
-            # Section 4.2:
-            #   5.  When the interval I expires, Trickle doubles the interval
-            #       length.  If this new interval length would be longer than
-            #       the time specified by Imax, Trickle sets the interval
-            #       length I to be the time specified by Imax.
-            self.interval = self.interval * 2
-            if self.max_interval < self.interval:
-                self.interval = self.max_interval
-            self._start_next_interval()
+        if self.aggregated:
+            self._drop_event(self.event_handle_at_i, self.event_asn_at_i)
+            self.event_asn_at_i    = asn
+            self.event_handle_at_i = self.engine.schedule_trickle_timer_event(
+                asn      = asn,
+                callback = self._handle_event_at_end_of_interval
+            )
+        else:
+            self.engine.scheduleAtAsn(
+                asn            = asn,
+                cb             = self._action_at_end_of_interval,
+                uniqueTag      = self.unique_tag_at_i,
+                intraSlotOrder = d.INTRASLOTORDER_STACKTASKS)
+
+    def _drop_event(self, handle, asn):
+        # The engine runs all the events of an ASN once the ASN has started,
+        # even the ones removed by a previous event of the same ASN. Do the
+        # same: an event due at the current ASN fires even if reset() or
+        # stop() replaces it.
+        if (handle is not None) and (asn == self.engine.getAsn()):
+            self.due_event_handles.add(handle)
+
+    def _is_event_valid(self, handle, pending_handle):
+        # ignore an event replaced by a newer one or cancelled by stop() in
+        # a previous ASN
+        if handle in self.due_event_handles:
+            self.due_event_handles.remove(handle)
+            return True
+        return handle == pending_handle
+
+    def _handle_event_at_t(self, handle):
+        if self._is_event_valid(handle, self.event_handle_at_t):
+            if handle == self.event_handle_at_t:
+                self.event_handle_at_t = None
+            self._action_at_t()
+
+    def _handle_event_at_end_of_interval(self, handle):
+        if self._is_event_valid(handle, self.event_handle_at_i):
+            if handle == self.event_handle_at_i:
+                self.event_handle_at_i = None
+            self._action_at_end_of_interval()
+
+    def _action_at_t(self):
+        if self.counter < self.redundancy_constant:
+            #  Section 4.2:
+            #    4.  At time t, Trickle transmits if and only if the
+            #        counter c is less than the redundancy constant k.
+            self.user_callback()
+        else:
+            # do nothing
+            pass
 
-        self.engine.scheduleAtAsn(
-            asn            = asn,
-            cb             = _callback,
-            uniqueTag      = self.unique_tag_base + u'_at_i',
-            intraSlotOrder = d.INTRASLOTORDER_STACKTASKS)
+    def _action_at_end_of_interval(self):
+        # doubling the interval
+        #
+        # Section 4.2:
+        #   5.  When the interval I expires, Trickle doubles the interval
+        #       length.  If this new interval length would be longer than
+        #       the time specified by Imax, Trickle sets the interval
+        #       length I to be the time specified by Imax.
+        self.interval = self.interval * 2
+        if self.max_interval < self.interval:
+            self.interval = self.max_interval
+        self._start_next_interval()
@@ -10,9 +10,9 @@ from builtins import filter
 from builtins import range
 from builtins import object
 from past.utils import old_div
+import bisect
 import copy
 from itertools import chain
-import random
 
 import netaddr
 
@@ -27,6 +27,11 @@ import SimEngine
 
 # =========================== helpers =========================================
 
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
 # =========================== body ============================================
 
 class Tsch(object):
@@ -40,9 +45,11 @@ class Tsch(object):
         self.engine   = SimEngine.SimEngine.SimEngine()
         self.settings = SimEngine.SimSettings.SimSettings()
         self.log      = SimEngine.SimLog.SimLog().log
+        self.rng      = self.engine.get_random(u'tsch', self.mote.id)
 
         # local variables
         self.slotframes       = {}
+        self.schedule_table   = None # compiled schedule, see _get_schedule_table()
         self.txQueue          = []
         if self.settings.tsch_tx_queue_size >= 0:
             self.txQueueSize  = self.settings.tsch_tx_queue_size
@@ -85,6 +92,7 @@ class Tsch(object):
         self.hopping_sequence = (
             d.TSCH_HOPPING_SEQUENCE[:self.settings.phy_numChans]
         )
+        self.num_hopping_channels = len(self.hopping_sequence)
 
         # install the default slotframe
         self.add_slotframe(
@@ -124,9 +132,7 @@ class Tsch(object):
             self.mote.sf.start()
 
             # transition: listeningForEB->active
-            self.engine.removeFutureEvent(      # remove previously scheduled listeningForEB cells
-                uniqueTag=(self.mote.id, u'_action_listeningForEB_cell')
-            )
+            self.engine.stop_listening_for_EBs(self.mote)
         else:
             # log
             self.log(
@@ -235,6 +241,7 @@ class Tsch(object):
                 u'length'         : self.slotframes[slotframe_handle].length
             }
         )
+        self.slotframes[slotframe_handle].unindex_tx_cells()
         del self.slotframes[slotframe_handle]
 
     # EB / Enhanced Beacon
@@ -249,13 +256,22 @@ class Tsch(object):
 
         assert not self.getIsSync()
 
-        # schedule at next ASN
-        self.engine.scheduleAtAsn(
-            asn              = self.engine.getAsn()+1,
-            cb               = self._action_listeningForEB_cell,
-            uniqueTag        = (self.mote.id, u'_action_listeningForEB_cell'),
-            intraSlotOrder   = d.INTRASLOTORDER_STARTSLOT,
-        )
+        # listen from the next ASN on; the engine serves all the motes
+        # listening for EBs with a single event per slot
+        self.engine.start_listening_for_EBs(self.mote)
+
+    def listen_for_EB(self, channel):
+        """
+        active slot starts, while mote is listening for EBs
+        """
+
+        assert not self.getIsSync()
+
+        # start listening
+        self.mote.radio.startRx(channel)
+
+        # indicate that we're waiting for the RX operation to finish
+        self.waitingFor = d.WAITING_FOR_RX
 
     # minimal
 
@@ -696,8 +712,40 @@ class Tsch(object):
         self.waitingFor = None
         self.pktToSend  = None
 
+    def idleListenDone(self):
+        """
+        end of an RX slot in which nothing was received
+
+        Only the schedule bookkeeping of rxDone() is needed in this case.
+        """
+
+        # local variables
+        active_cell = self.active_cell
+
+        self.active_cell = None
+
+        # make sure I'm in the right state
+        assert self.waitingFor == d.WAITING_FOR_RX
+
+        # not waiting for anything anymore
+        self.waitingFor = None
+
+        # notify upper layers
+        if active_cell:
+            assert active_cell.is_rx_on()
+            self.mote.sf.indication_rx_cell_elapsed(
+                cell            = active_cell,
+                received_packet = None
+            )
+
+        return False # isACKed
+
     def rxDone(self, packet, channel):
 
+        if not packet:
+            # received nothing (idle listen)
+            return self.idleListenDone()
+
         # local variables
         asn         = self.engine.getAsn()
         active_cell = self.active_cell
@@ -836,27 +884,6 @@ class Tsch(object):
 
     #======================== private ==========================================
 
-    # listeningForEB
-
-    def _action_listeningForEB_cell(self):
-        """
-        active slot starts, while mote is listening for EBs
-        """
-
-        assert not self.getIsSync()
-
-        # choose random channel
-        channel = random.choice(self.hopping_sequence)
-
-        # start listening
-        self.mote.radio.startRx(channel)
-
-        # indicate that we're waiting for the RX operation to finish
-        self.waitingFor = d.WAITING_FOR_RX
-
-        # schedule next listeningForEB cell
-        self.schedule_next_listeningForEB_cell()
-
     def _perform_synchronization(self):
         if not self.received_eb_list:
             # this method call should be in a timer task and we should
@@ -986,19 +1013,29 @@ class Tsch(object):
             self.engine.removeFutureEvent(uniqueTag=(self.mote.id, u'_action_active_cell'))
             return
 
-        try:
-            tsDiffMin = min(
-                [
-                    slotframe.get_num_slots_to_next_active_cell(asn)
-                    for _, slotframe in list(self.slotframes.items()) if (
-                        len(slotframe.get_busy_slots()) > 0
-                    )
-                ]
-            )
-        except ValueError:
+        schedule_table = self._get_schedule_table()
+        if schedule_table is None:
+            try:
+                tsDiffMin = min(
+                    [
+                        slotframe.get_num_slots_to_next_active_cell(asn)
+                        for _, slotframe in list(self.slotframes.items()) if (
+                            len(slotframe.get_busy_slots()) > 0
+                        )
+                    ]
+                )
+            except ValueError:
+                # we don't have any cell; return without scheduling the next
+                # active slot
+                return
+        elif schedule_table[u'length'] == 0:
             # we don't have any cell; return without scheduling the next active
             # slot
             return
+        else:
+            tsDiffMin = schedule_table[u'num_slots_to_next_active_slot'][
+                asn % schedule_table[u'length']
+            ]
 
         # schedule at that ASN
         self.engine.scheduleAtAsn(
@@ -1026,11 +1063,21 @@ class Tsch(object):
         # macSlotframeHandle slotframes takes precedence over higher
         # macSlotframeHandle slotframes."
 
-        candidate_cells = []
-        for _, slotframe in list(self.slotframes.items()):
-            candidate_cells = slotframe.get_cells_at_asn(asn)
-            if len(candidate_cells) > 0:
-                break
+        schedule_table = self._get_schedule_table()
+        if schedule_table is None:
+            candidate_cells = []
+            for _, slotframe in list(self.slotframes.items()):
+                candidate_cells = slotframe.get_cells_at_asn(asn)
+                if len(candidate_cells) > 0:
+                    break
+        elif schedule_table[u'length'] == 0:
+            candidate_cells = []
+        else:
+            candidate_cells = (
+                schedule_table[u'candidate_cells'][
+                    asn % schedule_table[u'length']
+                ]
+            )
 
         if len(candidate_cells) == 0:
             # we don't have any cell at this asn. we may have used to have
@@ -1077,6 +1124,84 @@ class Tsch(object):
         # schedule the next active slot
         self._schedule_next_active_slot()
 
+    def _get_schedule_table(self):
+        """
+        Return the schedule compiled over all the slotframes, or None when it
+        would be too long to be worth it.
+
+        The table gives, for every slot of the least common multiple of the
+        slotframe lengths, the candidate cells and the number of slots to the
+        next active slot. It is compiled again only after the slotframes or
+        their cells change.
+        """
+        signature = [
+            (slotframe_handle, slotframe.length, slotframe.version)
+            for slotframe_handle, slotframe in list(self.slotframes.items())
+        ]
+        if (
+                (self.schedule_table is None)
+                or
+                (self.schedule_table[u'signature'] != signature)
+            ):
+            self.schedule_table = self._compile_schedule()
+            if self.schedule_table is not None:
+                self.schedule_table[u'signature'] = signature
+            else:
+                # remember the signature so as not to try compiling the
+                # same schedule again
+                self.schedule_table = {u'signature': signature}
+
+        if u'length' in self.schedule_table:
+            return self.schedule_table
+        else:
+            return None
+
+    def _compile_schedule(self):
+        slotframes = [
+            slotframe for _, slotframe in list(self.slotframes.items())
+            if slotframe.get_busy_slots()
+        ]
+        if not slotframes:
+            return {
+                u'length'                       : 0,
+                u'candidate_cells'              : [],
+                u'num_slots_to_next_active_slot': [],
+            }
+
+        # the schedule repeats every LCM of the slotframe lengths
+        length = 1
+        for slotframe in slotframes:
+            length = length * slotframe.length // _gcd(length, slotframe.length)
+            if length > d.TSCH_MAX_SCHEDULE_TABLE_LENGTH:
+                return None
+
+        # a lower slotframe handle takes precedence; see _action_active_cell()
+        candidate_cells = [[]] * length
+        for slot_offset in range(length):
+            for slotframe in slotframes:
+                cells = slotframe.get_cells_at_asn(slot_offset)
+                if cells:
+                    candidate_cells[slot_offset] = cells
+                    break
+
+        # walk the table backward twice so that the last slots see the
+        # active slots at the beginning of the next iteration
+        num_slots_to_next_active_slot = [None] * length
+        next_active_asn = None
+        for asn in reversed(range(2 * length)):
+            if next_active_asn is not None:
+                num_slots_to_next_active_slot[asn % length] = (
+                    next_active_asn - asn
+                )
+            if candidate_cells[asn % length]:
+                next_active_asn = asn
+
+        return {
+            u'length'                       : length,
+            u'candidate_cells'              : candidate_cells,
+            u'num_slots_to_next_active_slot': num_slots_to_next_active_slot,
+        }
+
     def _action_TX(self, pktToSend, channel):
         # set the pending bit field
         if (
@@ -1124,7 +1249,7 @@ class Tsch(object):
         # see section 6.2.6.3 of IEEE 802.15.4-2015
         return self.hopping_sequence[
             (self.engine.getAsn() + cell.channel_offset) %
-            len(self.hopping_sequence)
+            self.num_hopping_channels
         ]
 
     # EBs
@@ -1136,7 +1261,7 @@ class Tsch(object):
 
         # following the Bayesian broadcasting algorithm
         return (
-            (random.random() < (old_div(prob, n)))
+            (self.rng.random() < (old_div(prob, n)))
             and
             self.iAmSendingEBs
         )
@@ -1221,7 +1346,7 @@ class Tsch(object):
         # Section 6.2.5.3 of IEEE 802.15.4-2015: "The MAC sublayer shall delay
         # for a random number in the range 0 to (2**BE - 1) shared links (on
         # any slotframe) before attempting a retransmission on a shared link."
-        return random.randint(0, pow(2, self.backoff_exponent) - 1)
+        return self.rng.randint(0, pow(2, self.backoff_exponent) - 1)
 
     def _reset_backoff_state(self):
         old_be = self.backoff_exponent
@@ -1489,6 +1614,7 @@ class Clock(object):
 
         # local variables
         self.mote = mote
+        self.rng  = self.engine.get_random(u'tsch.clock', self.mote.id)
 
         # instance variables which can be accessed directly from outside
         self.source = None
@@ -1526,7 +1652,7 @@ class Clock(object):
             # from the clock source when 32.768 Hz oscillators are used on the
             # both sides. in addition, the clock source also off from a certain
             # amount of time from its source.
-            off_from_source = random.random() * self._clock_interval
+            off_from_source = self.rng.random() * self._clock_interval
             source_clock = self.get_clock_by_mac_addr(self.source)
             self._clock_off_on_sync = off_from_source + source_clock.get_drift()
 
@@ -1574,12 +1700,13 @@ class Clock(object):
         max_drift = (
             float(self.settings.tsch_clock_max_drift_ppm) / pow(10, 6)
         )
-        return random.uniform(-1 * max_drift * 2, max_drift * 2)
+        return self.rng.uniform(-1 * max_drift * 2, max_drift * 2)
 
 
 class SlotFrame(object):
     def __init__(self, mote_id, slotframe_handle, num_slots):
-        self.log = SimEngine.SimLog.SimLog().log
+        self.engine = SimEngine.SimEngine.SimEngine()
+        self.log    = SimEngine.SimLog.SimLog().log
 
         self.mote_id = mote_id
         self.slotframe_handle = slotframe_handle
@@ -1587,6 +1714,11 @@ class SlotFrame(object):
         self.slots  = {}
         # index by neighbor_mac_addr for quick access
         self.cells  = {}
+        # incremented at every change of the cells
+        self.version = 0
+        # sorted list of the slot offsets having no cell, maintained by add()
+        # and delete()
+        self.available_slots = list(range(num_slots))
 
     def __repr__(self):
         return u'slotframe(length: {0}, num_cells: {1})'.format(
@@ -1598,6 +1730,9 @@ class SlotFrame(object):
         assert cell.slot_offset < self.length
         if cell.slot_offset not in self.slots:
             self.slots[cell.slot_offset] = [cell]
+            index = bisect.bisect_left(self.available_slots, cell.slot_offset)
+            assert self.available_slots[index] == cell.slot_offset
+            del self.available_slots[index]
         else:
             self.slots[cell.slot_offset] += [cell]
 
@@ -1606,6 +1741,7 @@ class SlotFrame(object):
         else:
             self.cells[cell.mac_addr] += [cell]
         cell.slotframe = self
+        self.version += 1
 
         # log
         self.log(
@@ -1620,6 +1756,13 @@ class SlotFrame(object):
             }
         )
 
+        if (
+                (cell.options == [d.CELLOPTION_TX])
+                and
+                self.engine.tx_cell_index_enabled
+            ):
+            self._index_tx_cell(cell)
+
     def delete(self, cell):
         assert cell.slot_offset < self.length
         assert cell in self.slots[cell.slot_offset]
@@ -1630,6 +1773,14 @@ class SlotFrame(object):
             del self.cells[cell.mac_addr]
         if len(self.slots[cell.slot_offset]) == 0:
             del self.slots[cell.slot_offset]
+            bisect.insort(self.available_slots, cell.slot_offset)
+        self.version += 1
+        if (
+                (cell.options == [d.CELLOPTION_TX])
+                and
+                self.engine.tx_cell_index_enabled
+            ):
+            self.engine.unindex_tx_cell(cell)
 
         # log
         self.log(
@@ -1678,11 +1829,10 @@ class SlotFrame(object):
     def get_available_slots(self):
         """
         Get the list of slot offsets that are not being used (no cell attached)
-        :return: a list of slot offsets (int)
+        :return: a sorted list of slot offsets (int)
         :rtype: list
         """
-        all_slots = set(range(self.length))
-        return list(all_slots - set(self.get_busy_slots()))
+        return self.available_slots[:]
 
     def get_cells_filtered(self, mac_addr="", cell_options=None):
         """
@@ -1719,9 +1869,61 @@ class SlotFrame(object):
                     for cell in self.slots[slot_offset]:
                         self.delete(cell)
                 slot_offset += 1
+            del self.available_slots[
+                bisect.bisect_left(self.available_slots, new_length):
+            ]
+        else:
+            self.available_slots += [
+                slot_offset for slot_offset in range(self.length, new_length)
+            ]
 
-        # apply the new length
+        # apply the new length; TX cells are indexed with the length
+        self.unindex_tx_cells()
         self.length = new_length
+        if self.engine.tx_cell_index_enabled:
+            for cell in self.get_cells_filtered(cell_options=[d.CELLOPTION_TX]):
+                self.engine.index_tx_cell(cell)
+
+    def unindex_tx_cells(self):
+        if not self.engine.tx_cell_index_enabled:
+            return
+        for cell in self.get_cells_filtered(cell_options=[d.CELLOPTION_TX]):
+            self.engine.unindex_tx_cell(cell)
+
+    def _index_tx_cell(self, cell):
+        # a dedicated TX cell is added to the simulator-wide index, which
+        # tells whether it collides with TX cells of other motes
+        if self.engine.settings.tsch_detect_schedule_collisions:
+            rx_mote = self.engine.get_mote_by_mac_addr(cell.mac_addr)
+        else:
+            # the index is used only by the collision oracle of the SF
+            rx_mote = None
+        if (self.mote_id is None) or (rx_mote is None):
+            colliding_cells = []
+        else:
+            colliding_cells = self.engine.get_colliding_tx_cells(
+                tx_mote_id       = self.mote_id,
+                rx_mote_id       = rx_mote.id,
+                slotframe_length = self.length,
+                slot_offset      = cell.slot_offset,
+                channel_offset   = cell.channel_offset
+            )
+        self.engine.index_tx_cell(cell)
+
+        if colliding_cells:
+            self.log(
+                SimEngine.SimLog.LOG_TSCH_SCHEDULE_COLLISION,
+                {
+                    u'_mote_id':        self.mote_id,
+                    u'slotFrameHandle': self.slotframe_handle,
+                    u'slotOffset':      cell.slot_offset,
+                    u'channelOffset':   cell.channel_offset,
+                    u'neighbor':        cell.mac_addr,
+                    u'colliding_motes': [
+                        c.slotframe.mote_id for c in colliding_cells
+                    ]
+                }
+            )
 
 class Cell(object):
     def __init__(
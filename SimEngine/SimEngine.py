@@ -13,6 +13,7 @@ from builtins import range
 from past.utils import old_div
 from collections import OrderedDict
 import hashlib
+import heapq
 import platform
 import random
 import sys
@@ -68,6 +69,7 @@ class DiscreteEventEngine(threading.Thread):
             self.events                         = {}
             self.uniqueTagSchedule              = {}
             self.random_seed                    = None
+            self.random_streams                 = {}
             self._init_additional_local_variables()
 
             # initialize parent class
@@ -210,10 +212,34 @@ class DiscreteEventEngine(threading.Thread):
         return self.asn
 
     def get_mote_by_mac_addr(self, mac_addr):
-        for mote in self.motes:
-            if mote.is_my_mac_addr(mac_addr):
-                return mote
-        return None
+        # MAC addresses are indexed in the string form of
+        # Mote.get_mac_addr()
+        return self.motes_by_mac_addr.get(str(mac_addr))
+
+    #=== random
+
+    def get_random(self, subsystem, mote_id=None):
+        """
+        Return the random number generator dedicated to a subsystem (and to a
+        mote, if mote_id is given).
+
+        The seed of each stream is derived from the random seed of the run,
+        the subsystem name and the mote ID. A subsystem therefore draws the
+        same sequence of numbers for a given run seed, regardless of how
+        often the other subsystems consume random numbers.
+        """
+        key = (subsystem, mote_id)
+        if key not in self.random_streams:
+            md5 = hashlib.md5()
+            md5.update(
+                u'-'.join(
+                    [str(self.random_seed), subsystem, str(mote_id)]
+                ).encode('utf-8')
+            )
+            self.random_streams[key] = random.Random(
+                int(md5.hexdigest(), 16) % sys.maxsize
+            )
+        return self.random_streams[key]
 
     #=== scheduling
 
@@ -363,6 +389,8 @@ class DiscreteEventEngine(threading.Thread):
 class SimEngine(DiscreteEventEngine):
 
     DAGROOT_ID = 0
+    UNIQUE_TAG_LISTENING_FOR_EBS = (u'SimEngine', u'_action_listening_for_EBs')
+    UNIQUE_TAG_TRICKLE_TIMERS    = (u'SimEngine', u'_action_trickle_timers')
 
     def _init_additional_local_variables(self):
         self.settings                   = SimSettings.SimSettings()
@@ -383,7 +411,9 @@ class SimEngine(DiscreteEventEngine):
         else:
             assert isinstance(self.settings.exec_randomSeed, int)
             self.random_seed = self.settings.exec_randomSeed
-        # apply the random seed; log the seed after self.log is initialized
+        # apply the random seed; log the seed after self.log is initialized.
+        # subsystems draw random numbers from their own streams returned by
+        # get_random(), which are derived from this seed as well
         random.seed(a=self.random_seed)
 
         if self.settings.motes_eui64:
@@ -395,6 +425,26 @@ class SimEngine(DiscreteEventEngine):
         else:
             eui64_table = [None] * self.settings.exec_numMotes
 
+        # motes listening for EBs (not synchronized yet), indexed by mote ID
+        self.scanning_motes             = OrderedDict()
+
+        # dedicated TX cells of all the motes, indexed by (slotframe length,
+        # slot offset, channel offset); maintained only when schedule
+        # collisions are detected or avoided
+        self.tx_cells                   = {}
+        self.tx_cell_index_enabled      = (
+            self.settings.tsch_detect_schedule_collisions
+            or
+            self.settings.sf_collision_oracle
+        )
+
+        # events of aggregated trickle timers: a heap of (asn, handle,
+        # callback) and the ASN at which the engine event serving it is
+        # scheduled
+        self.trickle_timer_events       = []
+        self.trickle_timer_handle       = 0
+        self.trickle_timer_events_asn   = None
+
         self.motes = [
             Mote.Mote.Mote(id, eui64)
             for id, eui64 in zip(
@@ -403,9 +453,11 @@ class SimEngine(DiscreteEventEngine):
             )
         ]
 
-        eui64_list = set([mote.get_mac_addr() for mote in self.motes])
-        if len(eui64_list) != len(self.motes):
-            assert len(eui64_list) < len(self.motes)
+        self.motes_by_mac_addr = dict(
+            [(mote.get_mac_addr(), mote) for mote in self.motes]
+        )
+        if len(self.motes_by_mac_addr) != len(self.motes):
+            assert len(self.motes_by_mac_addr) < len(self.motes)
             raise ValueError(u'given motes_eui64 causes dulicates')
 
         self.connectivity               = Connectivity.Connectivity(self)
@@ -432,6 +484,168 @@ class SimEngine(DiscreteEventEngine):
         for i in range(len(self.motes)):
             self.motes[i].boot()
 
+    # === listening for EBs
+
+    def start_listening_for_EBs(self, mote):
+        """
+        Have a non-synchronized mote listen for EBs from the next slot on.
+
+        All the motes listening for EBs are served by a single event per slot
+        instead of one event per mote.
+        """
+        self.scanning_motes[mote.id] = mote
+        if not self.is_scheduled(self.UNIQUE_TAG_LISTENING_FOR_EBS):
+            self._schedule_listening_for_EBs()
+
+    def stop_listening_for_EBs(self, mote):
+        if mote.id in self.scanning_motes:
+            del self.scanning_motes[mote.id]
+        if (
+                (not self.scanning_motes)
+                and
+                self.is_scheduled(self.UNIQUE_TAG_LISTENING_FOR_EBS)
+            ):
+            self.removeFutureEvent(self.UNIQUE_TAG_LISTENING_FOR_EBS)
+
+    def _schedule_listening_for_EBs(self):
+        self.scheduleAtAsn(
+            asn              = self.asn + 1,
+            cb               = self._action_listening_for_EBs,
+            uniqueTag        = self.UNIQUE_TAG_LISTENING_FOR_EBS,
+            intraSlotOrder   = Mote.MoteDefines.INTRASLOTORDER_STARTSLOT,
+        )
+
+    def _action_listening_for_EBs(self):
+        # each mote draws its channel from its own stream, so that the order
+        # in which motes are served has no impact on the channels they get
+        for mote in list(self.scanning_motes.values()):
+            mote.tsch.listen_for_EB(
+                mote.tsch.rng.choice(mote.tsch.hopping_sequence)
+            )
+
+        # keep going while there are motes listening for EBs
+        if self.scanning_motes:
+            self._schedule_listening_for_EBs()
+
+    # === aggregated trickle timers
+
+    def schedule_trickle_timer_event(self, asn, callback):
+        """
+        Schedule callback(handle) at asn, and return the handle, an integer
+        identifying the event.
+
+        The events of all the aggregated trickle timers are kept in a single
+        heap, served by one engine event per ASN at which one of them fires.
+        An event cannot be removed; the timer ignores a call with a handle it
+        no longer waits for.
+        """
+        assert asn > self.asn
+        self.trickle_timer_handle += 1
+        handle = self.trickle_timer_handle
+        heapq.heappush(self.trickle_timer_events, (asn, handle, callback))
+        if (
+                (self.trickle_timer_events_asn is None)
+                or
+                (asn < self.trickle_timer_events_asn)
+            ):
+            self._schedule_trickle_timers(asn)
+        return handle
+
+    def _schedule_trickle_timers(self, asn):
+        self.trickle_timer_events_asn = asn
+        self.scheduleAtAsn(
+            asn              = asn,
+            cb               = self._action_trickle_timers,
+            uniqueTag        = self.UNIQUE_TAG_TRICKLE_TIMERS,
+            intraSlotOrder   = Mote.MoteDefines.INTRASLOTORDER_STACKTASKS,
+        )
+
+    def _action_trickle_timers(self):
+        # events are served in order of scheduling within an ASN; the
+        # callbacks may schedule new events, which are in the future. The
+        # next engine event is scheduled once all of them are served.
+        assert self.trickle_timer_events_asn == self.asn
+        while (
+                self.trickle_timer_events
+                and
+                (self.trickle_timer_events[0][0] <= self.asn)
+            ):
+            (_, handle, callback) = heapq.heappop(self.trickle_timer_events)
+            callback(handle)
+
+        self.trickle_timer_events_asn = None
+        if self.trickle_timer_events:
+            self._schedule_trickle_timers(self.trickle_timer_events[0][0])
+
+    # === schedule collisions
+
+    def index_tx_cell(self, cell):
+        """
+        Add a dedicated TX cell to the simulator-wide index of the (slot
+        offset, channel offset) allocations of the motes.
+        """
+        key = self._get_tx_cell_key(cell)
+        if key not in self.tx_cells:
+            self.tx_cells[key] = []
+        self.tx_cells[key].append(cell)
+
+    def unindex_tx_cell(self, cell):
+        key = self._get_tx_cell_key(cell)
+        # remove the cell by identity; Cell.__eq__ compares str(), which is
+        # the same for the cells of two motes to the same neighbor
+        cells = self.tx_cells[key]
+        del cells[next(i for (i, c) in enumerate(cells) if c is cell)]
+        if not self.tx_cells[key]:
+            del self.tx_cells[key]
+
+    def get_colliding_tx_cells(
+            self,
+            tx_mote_id,
+            rx_mote_id,
+            slotframe_length,
+            slot_offset,
+            channel_offset
+        ):
+        """
+        Return the dedicated TX cells of the other motes having the same slot
+        offset and channel offset as a link from tx_mote_id to rx_mote_id,
+        of which the transmissions interfere with that link.
+        """
+        colliding_cells = []
+        key = (slotframe_length, slot_offset, channel_offset)
+        for cell in self.tx_cells.get(key, []):
+            other_tx_mote_id = cell.slotframe.mote_id
+            if other_tx_mote_id in [tx_mote_id, None]:
+                continue
+            other_rx_mote = self.get_mote_by_mac_addr(cell.mac_addr)
+            if (
+                    self._is_in_interference_range(other_tx_mote_id, rx_mote_id)
+                    or
+                    (
+                        (other_rx_mote is not None)
+                        and
+                        self._is_in_interference_range(
+                            tx_mote_id,
+                            other_rx_mote.id
+                        )
+                    )
+                ):
+                colliding_cells.append(cell)
+        return colliding_cells
+
+    def _get_tx_cell_key(self, cell):
+        return (cell.slotframe.length, cell.slot_offset, cell.channel_offset)
+
+    def _is_in_interference_range(self, tx_mote_id, rx_mote_id):
+        # a transmission can be heard on any channel; the channel offset of
+        # a cell is mapped to all of them over time
+        if tx_mote_id == rx_mote_id:
+            return False
+        for channel in self.connectivity.channels:
+            if self.connectivity.get_pdr(tx_mote_id, rx_mote_id, channel) > 0:
+                return True
+        return False
+
     def _routine_thread_started(self):
         # log
         self.log(
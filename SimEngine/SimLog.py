@@ -21,6 +21,7 @@ import copy
 import json
 import traceback
 
+from . import SimLogFile
 from . import SimSettings
 
 # =========================== defines =========================================
@@ -96,6 +97,7 @@ LOG_TSCH_RXDONE                   = {u'type': u'tsch.rxdone',               u'ke
 LOG_TSCH_BACKOFF_EXPONENT_UPDATED = {u'type': u'tsch.be.updated',           u'keys': [u'_mote_id',u'old_be', u'new_be']}
 LOG_TSCH_ADD_SLOTFRAME            = {u'type': u'tsch.add_slotframe',        u'keys': [u'_mote_id',u'slotFrameHandle',u'length']}
 LOG_TSCH_DELETE_SLOTFRAME         = {u'type': u'tsch.delete_slotframe',     u'keys': [u'_mote_id',u'slotFrameHandle',u'length']}
+LOG_TSCH_SCHEDULE_COLLISION       = {u'type': u'tsch.schedule_collision',   u'keys': [u'_mote_id',u'slotFrameHandle',u'slotOffset',u'channelOffset',u'neighbor',u'colliding_motes']}
 
 # === mote info
 LOG_RADIO_STATS                   = {u'type': u'radio.stats',               u'keys': [u'_mote_id', u'idle_listen', u'tx_data_rx_ack', u'tx_data', u'rx_data_tx_ack', u'rx_data', u'sleep']}
@@ -144,8 +146,11 @@ class SimLog(object):
             # local variables
             self.log_filters = []
 
-            # open log file
-            self.log_output_file = open(self.settings.getOutputFile(), u'a')
+            # open log file; it is compressed according to log_compression
+            self.log_output_file = SimLogFile.open_output_file(
+                self.settings.getOutputFile(),
+                level = self.settings.log_compression_level
+            )
 
             # write config to log file; if a file with the same file name exists,
             # append logs to the file. this happens if you multiple runs on the
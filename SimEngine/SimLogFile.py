@@ -0,0 +1,415 @@
+"""
+\brief Reading and writing of log files, optionally compressed.
+
+A log file has one JSON object per line. Each run starts with its "config"
+line. A merged log file comes with an index file (".index"), which tells
+where each run starts in the log file, so that a run can be read without
+reading the runs before it. A compressed log file starts a new gzip member
+(or zstd frame) at the beginning of each run for this purpose.
+
+Compression is selected by file name extension: ".gz" for gzip, ".zst" for
+zstd. zstd requires the "zstandard" package.
+
+SimLog writes a compressed log file with CompressedOutputFile, which
+compresses on a background thread.
+"""
+from __future__ import absolute_import
+
+# =========================== imports =========================================
+
+from builtins import object
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# =========================== defines =========================================
+
+COMPRESSION_GZIP = u'gzip'
+COMPRESSION_ZSTD = u'zstd'
+
+FILE_EXTENSIONS = {
+    COMPRESSION_GZIP: u'.gz',
+    COMPRESSION_ZSTD: u'.zst',
+}
+INDEX_FILE_EXTENSION = u'.index'
+
+# size of the chunks read from an input file
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# CompressedOutputFile hands data to its compression thread by blocks of this
+# size; at most OUTPUT_QUEUE_SIZE blocks wait for the thread
+OUTPUT_BLOCK_SIZE = 1024 * 1024
+OUTPUT_QUEUE_SIZE = 16
+
+# a config line, which starts a run, is the only one having this string
+CONFIG_LINE_MARKER = b'"_type": "config"'
+
+# =========================== helpers =========================================
+
+def get_compression(file_path):
+    for compression, extension in FILE_EXTENSIONS.items():
+        if file_path.endswith(extension):
+            return compression
+    return None
+
+def get_file_path(file_path, compression):
+    """Return file_path with the extension of the compression"""
+    if compression is None:
+        return file_path
+    else:
+        _check_compression(compression)
+        return file_path + FILE_EXTENSIONS[compression]
+
+def get_uncompressed_file_path(file_path):
+    """Return file_path without the extension of its compression"""
+    compression = get_compression(file_path)
+    if compression is None:
+        return file_path
+    else:
+        return file_path[:-len(FILE_EXTENSIONS[compression])]
+
+def has_index(file_path):
+    return os.path.exists(file_path + INDEX_FILE_EXTENSION)
+
+def is_log_file(file_path, extension=u'.dat'):
+    return any(
+        [
+            file_path.endswith(extension + file_extension)
+            for file_extension in [u''] + list(FILE_EXTENSIONS.values())
+        ]
+    )
+
+def open_log_file(file_path):
+    """Open a log file, compressed or not, for reading in text mode"""
+    return io.TextIOWrapper(open_log_file_binary(file_path), encoding=u'utf-8')
+
+def open_log_file_binary(file_path):
+    """Open a log file, compressed or not, for reading decompressed bytes"""
+    compression = get_compression(file_path)
+    if compression is None:
+        return io.open(file_path, u'rb')
+    elif compression == COMPRESSION_GZIP:
+        return _get_buffered_reader(gzip.GzipFile(file_path, u'rb'))
+    else:
+        return _get_buffered_reader(
+            _get_zstd_decompressor().stream_reader(
+                io.open(file_path, u'rb'),
+                read_across_frames=True,
+                closefd=True
+            )
+        )
+
+def open_output_file(file_path, level=None):
+    """Open a log file, compressed or not, for appending in text mode"""
+    compression = get_compression(file_path)
+    if compression is None:
+        return open(file_path, u'a')
+    else:
+        return CompressedOutputFile(file_path, compression, level)
+
+def read_index(file_path):
+    with open(file_path + INDEX_FILE_EXTENSION, u'r') as f:
+        return json.load(f)
+
+def open_log_run(file_path, run_id):
+    """Return the lines of a run in a merged log file
+
+    The run is located with the index of the log file. If several runs
+    have the same run_id, the first one is returned.
+    """
+    index = read_index(file_path)
+    offsets = [run[u'offset'] for run in index[u'runs'] if run[u'_run_id'] == run_id]
+    if not offsets:
+        raise ValueError(
+            u'run_id {0} is not in {1}'.format(run_id, file_path)
+        )
+
+    with io.open(file_path, u'rb') as raw_file:
+        raw_file.seek(offsets[0])
+        compression = index[u'compression']
+        if compression is None:
+            binary_file = raw_file
+        elif compression == COMPRESSION_GZIP:
+            binary_file = _get_buffered_reader(
+                gzip.GzipFile(fileobj=raw_file, mode=u'rb')
+            )
+        else:
+            binary_file = _get_buffered_reader(
+                _get_zstd_decompressor().stream_reader(
+                    raw_file,
+                    read_across_frames=True
+                )
+            )
+        marker = CONFIG_LINE_MARKER.decode(u'utf-8')
+        with io.TextIOWrapper(binary_file, encoding=u'utf-8') as f:
+            for line_num, line in enumerate(f):
+                if (line_num > 0) and (marker in line):
+                    # the next run starts
+                    break
+                yield line
+
+def read_config_lines(file_path):
+    """Return the config lines of a log file, chunk by chunk"""
+    with open_log_file_binary(file_path) as input_file:
+        carry = b''
+        while True:
+            chunk = input_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            data  = carry + chunk
+            end   = data.rfind(b'\n') + 1
+            carry = data[end:]
+            for _, config in _find_config_lines(data[:end]):
+                yield config
+
+def copy_log_file(input_path, writer, transform=None):
+    """Append a log file to a LogFileWriter, chunk by chunk
+
+    transform, if given, is applied to blocks of complete lines. Return the
+    last line of the input file if it is incomplete (the run was
+    interrupted); this line is not copied.
+    """
+    with open_log_file_binary(input_path) as input_file:
+        carry = b''
+        while True:
+            chunk = input_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            data = carry + chunk
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                # no complete line yet
+                carry = data
+                continue
+            _write_lines(data[:end], writer, transform)
+            carry = data[end:]
+
+    if carry:
+        try:
+            json.loads(carry.decode(u'utf-8'))
+        except ValueError:
+            return carry
+        else:
+            # only the trailing newline is missing
+            _write_lines(carry + b'\n', writer, transform)
+    return None
+
+# =========================== classes =========================================
+
+class LogFileWriter(object):
+    """Write a log file, compressed or not, with the index of its runs
+
+    write() takes bytes. start_run() should be called right before the
+    config line of a run is written.
+    """
+
+    def __init__(self, file_path, compression=None, level=None):
+        _check_compression(compression)
+
+        self.file_path   = file_path
+        self.compression = compression
+        self.level       = level
+        self.file        = open(file_path, u'wb')
+        self.compressor  = None
+        self.runs        = []
+
+    def start_run(self, run_id, cpu_id):
+        # a compressed run starts in a new member/frame
+        self._finish_compressor()
+        self.runs.append(
+            {
+                u'_run_id': run_id,
+                u'cpuID':   cpu_id,
+                u'offset':  self.file.tell()
+            }
+        )
+
+    def write(self, data):
+        if not data:
+            return
+        if self.compression is None:
+            self.file.write(data)
+        else:
+            if self.compressor is None:
+                self.compressor = self._get_compressor()
+            self.file.write(self.compressor.compress(data))
+
+    def close(self):
+        self._finish_compressor()
+        self.file.close()
+        with open(self.file_path + INDEX_FILE_EXTENSION, u'w') as f:
+            json.dump(
+                {
+                    u'compression': self.compression,
+                    u'runs':        self.runs
+                },
+                f
+            )
+
+    # === private
+
+    def _get_compressor(self):
+        return _get_compressor(self.compression, self.level)
+
+    def _finish_compressor(self):
+        if self.compressor is not None:
+            self.file.write(self.compressor.flush())
+            self.compressor = None
+
+class CompressedOutputFile(object):
+    """Text file appending compressed data, which is compressed on a thread
+
+    Data written are compressed and written to the file by a background
+    thread, so that the caller doesn't wait for the compression nor for the
+    disk. flush() waits until all the data written are in the file and ends
+    the current gzip member (or zstd frame): the file can be read while it
+    is still open.
+    """
+
+    _FLUSH = u'flush'
+    _CLOSE = u'close'
+
+    def __init__(self, file_path, compression, level=None):
+        _check_compression(compression)
+        assert compression is not None
+
+        self.name        = file_path
+        self.compression = compression
+        self.level       = level
+        self.closed      = False
+        self.buffer      = []
+        self.buffer_size = 0
+        self.error       = None
+        self.queue       = queue.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+        self.file        = open(file_path, u'ab')
+        self.thread      = threading.Thread(
+            target = self._compress_and_write,
+            name   = u'compressor {0}'.format(os.path.basename(file_path))
+        )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, string):
+        self.buffer.append(string)
+        self.buffer_size += len(string)
+        if self.buffer_size >= OUTPUT_BLOCK_SIZE:
+            self._put(self._pop_buffer())
+
+    def flush(self):
+        self._put(self._pop_buffer())
+        self._put(self._FLUSH)
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._put(self._pop_buffer())
+        self._put(self._CLOSE)
+        self.thread.join()
+        self._raise_error()
+
+    # === private
+
+    def _pop_buffer(self):
+        data = u''.join(self.buffer).encode(u'utf-8')
+        self.buffer      = []
+        self.buffer_size = 0
+        return data
+
+    def _put(self, item):
+        self._raise_error()
+        if item:
+            self.queue.put(item)
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _compress_and_write(self):
+        compressor = None
+        while True:
+            item = self.queue.get()
+            try:
+                if self.error is not None:
+                    # drop data after an error
+                    pass
+                elif item in [self._FLUSH, self._CLOSE]:
+                    if compressor is not None:
+                        self.file.write(compressor.flush())
+                        compressor = None
+                    self.file.flush()
+                else:
+                    if compressor is None:
+                        compressor = _get_compressor(
+                            self.compression,
+                            self.level
+                        )
+                    self.file.write(compressor.compress(item))
+            except Exception as err:
+                self.error = err
+            finally:
+                self.queue.task_done()
+
+            if item == self._CLOSE:
+                self.file.close()
+                break
+
+# =========================== private =========================================
+
+def _check_compression(compression):
+    if compression not in [None, COMPRESSION_GZIP, COMPRESSION_ZSTD]:
+        raise ValueError(u'unknown compression: {0}'.format(compression))
+    if (compression == COMPRESSION_ZSTD) and (zstandard is None):
+        raise ValueError(u'zstd requires the "zstandard" package')
+
+def _get_compressor(compression, level):
+    if compression == COMPRESSION_GZIP:
+        level = 6 if level is None else level
+        # wbits=31 makes a gzip member
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    else:
+        level = 3 if level is None else level
+        return zstandard.ZstdCompressor(level=level).compressobj()
+
+def _get_zstd_decompressor():
+    _check_compression(COMPRESSION_ZSTD)
+    return zstandard.ZstdDecompressor()
+
+def _get_buffered_reader(binary_file):
+    # io.TextIOWrapper needs read1(), which the gzip and zstd readers of
+    # Python 2.7 don't have
+    return io.BufferedReader(binary_file)
+
+def _find_config_lines(data):
+    # data is made of complete lines; yield (line_start, config) of each
+    # config line
+    position = data.find(CONFIG_LINE_MARKER)
+    while position != -1:
+        line_start = data.rfind(b'\n', 0, position) + 1
+        line_end   = data.find(b'\n', position) + 1
+        yield line_start, json.loads(data[line_start:line_end].decode(u'utf-8'))
+        position = data.find(CONFIG_LINE_MARKER, line_end)
+
+def _write_lines(data, writer, transform):
+    # data is made of complete lines; a config line starts a new run
+    if transform is not None:
+        data = transform(data)
+
+    written = 0
+    for line_start, config in _find_config_lines(data):
+        writer.write(data[written:line_start])
+        writer.start_run(config[u'_run_id'], config.get(u'cpuID'))
+        written = line_start
+    writer.write(data[written:])
@@ -8,14 +8,18 @@
 \author Xavier Vilajosana <xvilajosana@eecs.berkeley.edu>
 """
 from __future__ import division
+from __future__ import absolute_import
 
 # =========================== imports =========================================
 
 from builtins import object
+import errno
 import math
 import os
 import re
 
+from . import SimLogFile
+
 # =========================== defines =========================================
 
 # =========================== body ============================================
@@ -122,9 +126,9 @@ class SimSettings(object):
             try:
                 os.makedirs(dirname)
             except OSError as e:
-                if e.errno == os.errno.EEXIST:
-                    # FIXME: handle this race condition properly
-                    # Another core/CPU has already made this directory
+                if e.errno == errno.EEXIST:
+                    # Another core/CPU or worker has already made this
+                    # directory
                     pass
                 else:
                     raise
@@ -136,7 +140,8 @@ class SimSettings(object):
             tempname = 'output_cpu{0}.dat'.format(self.cpuID)
         datafilename = os.path.join(dirname, tempname)
 
-        return datafilename
+        # the extension tells the compression of the file
+        return SimLogFile.get_file_path(datafilename, self.log_compression)
 
     def destroy(self):
         cls = type(self)
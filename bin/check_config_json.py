@@ -122,9 +122,10 @@ def collect_setting_keys_in_use():
                             # add the key referred from a core file
                             setting_keys.add(m.group(2))
 
-    # add exec_minutesPerRun which is found only in SimSettings, which
-    # is not processed in the loop above
+    # add exec_minutesPerRun and log_compression which are found only in
+    # SimSettings, which is not processed in the loop above
     setting_keys.add('exec_minutesPerRun')
+    setting_keys.add('log_compression')
     return setting_keys
 
 
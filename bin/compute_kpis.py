@@ -19,6 +19,7 @@ import glob
 import numpy as np
 
 from SimEngine import SimLog
+from SimEngine import SimLogFile
 import SimEngine.Mote.MoteDefines as d
 
 # =========================== defines =========================================
@@ -31,7 +32,8 @@ BATTERY_AA_CAPACITY_mAh = 2821.5
 
 def openfile(func):
     def inner(inputfile):
-        with open(inputfile, 'r') as f:
+        # the log file may be compressed
+        with SimLogFile.open_log_file(inputfile) as f:
             return func(f)
     return inner
 
@@ -64,6 +66,7 @@ def init_mote():
 def kpis_all(inputfile):
 
     allstats = {} # indexed by run_id, mote_id
+    schedule_collisions = {} # indexed by run_id
 
     file_settings = json.loads(inputfile.readline())  # first line contains settings
 
@@ -158,6 +161,12 @@ def kpis_all(inputfile):
             )
             allstats[run_id][mote_id]['upstream_pkts'][appcounter]['rx_asn'] = asn
 
+        elif logline['_type'] == SimLog.LOG_TSCH_SCHEDULE_COLLISION['type']:
+            # a dedicated TX cell collides with cells of other motes
+            if run_id not in schedule_collisions:
+                schedule_collisions[run_id] = 0
+            schedule_collisions[run_id] += 1
+
         elif logline['_type'] == SimLog.LOG_RADIO_STATS['type']:
             # shorthands
             mote_id    = logline['_mote_id']
@@ -383,6 +392,12 @@ def kpis_all(inputfile):
                     'name': 'Number of application packets lost',
                     'total': app_packets_lost
                 }
+            ],
+            'schedule-collisions': [
+                {
+                    'name': 'Number of schedule collisions',
+                    'total': schedule_collisions.get(run_id, 0)
+                }
             ]
         }
 
@@ -413,7 +428,9 @@ def main():
         [os.path.join('simData', x) for x in os.listdir('simData')]
     )
     subfolder = max(subfolders, key=os.path.getmtime)
-    for infile in glob.glob(os.path.join(subfolder, '*.dat')):
+    for infile in glob.glob(os.path.join(subfolder, '*.dat*')):
+        if not SimLogFile.is_log_file(infile):
+            continue
         print('generating KPIs for {0}'.format(infile))
 
         # gather the kpis
@@ -422,8 +439,9 @@ def main():
         # print on the terminal
         print(json.dumps(kpis, indent=4))
 
-        # add to the data folder
-        outfile = '{0}.kpi'.format(infile)
+        # add to the data folder; the name of a KPI file doesn't depend on
+        # the compression of its log file
+        outfile = '{0}.kpi'.format(SimLogFile.get_uncompressed_file_path(infile))
         with open(outfile, 'w') as f:
             f.write(json.dumps(kpis, indent=4))
         print('KPIs saved in {0}'.format(outfile))
@@ -11,6 +11,27 @@ if __name__ == '__main__':
     sys.path.insert(0, os.path.join(here, '..'))
 
 from SimEngine.SimConfig import SimConfig
+from SimEngine import SimLogFile
+
+
+def read_log_lines(log_file_path, run_id):
+    if (
+            SimLogFile.has_index(log_file_path)
+            and
+            (
+                run_id in [
+                    run['_run_id']
+                    for run in SimLogFile.read_index(log_file_path)['runs']
+                ]
+            )
+        ):
+        # go directly to the target run
+        for line in SimLogFile.open_log_run(log_file_path, run_id):
+            yield line
+    else:
+        with SimLogFile.open_log_file(log_file_path) as f:
+            for line in f:
+                yield line
 
 
 def main():
@@ -40,24 +61,23 @@ def main():
     # identify config_line and random_seed
     config_line = None
     random_seed = None
-    with open(args.log_file_path, 'r') as f:
-        for line in f:
-            log = json.loads(line)
-
-            if log['_run_id'] != args.target_run_id:
-                continue
-            else:
-                if log['_type'] == 'config':
-                    config_line = log
-                elif log['_type'] == 'simulator.random_seed':
-                    random_seed = log['value']
-
-                if (
-                        (config_line is not None)
-                        and
-                        (random_seed is not None)
-                    ):
-                    break
+    for line in read_log_lines(args.log_file_path, args.target_run_id):
+        log = json.loads(line)
+
+        if log['_run_id'] != args.target_run_id:
+            continue
+        else:
+            if log['_type'] == 'config':
+                config_line = log
+            elif log['_type'] == 'simulator.random_seed':
+                random_seed = log['value']
+
+            if (
+                    (config_line is not None)
+                    and
+                    (random_seed is not None)
+                ):
+                break
 
     if (
             (config_line is None)
@@ -1,6 +1,9 @@
 #!/usr/bin/python
 """
 This script merges log files under 'hostname' based log directory
+
+Log files are copied by large chunks, so that the memory usage doesn't depend
+on the size of the log files. Different log files are merged in parallel.
 """
 from __future__ import print_function
 
@@ -10,12 +13,24 @@ from builtins import input
 from builtins import range
 import argparse
 import filecmp
-import json
+import multiprocessing
 import os
 import re
 import shutil
+import sys
 import time
 
+if __name__ == '__main__':
+    here = sys.path[0]
+    sys.path.insert(0, os.path.join(here, '..'))
+
+from SimEngine import SimLogFile
+
+# =========================== defines =========================================
+
+RUN_ID_PATTERN = re.compile(br'("_run_id": )(\d+)')
+CPU_ID_PATTERN = re.compile(br'("cpuID": )(\d+)')
+
 # =========================== helpers =========================================
 
 
@@ -63,6 +78,37 @@ def parseCliParams():
         help            = 'Run without user input (confirmation)'
     )
 
+    parser.add_argument(
+        '-j', '--jobs',
+        dest            = 'numJobs',
+        action          = 'store',
+        type            = int,
+        default         = multiprocessing.cpu_count(),
+        help            = 'Number of log files merged in parallel'
+    )
+
+    parser.add_argument(
+        '-c', '--compression',
+        dest            = 'compression',
+        action          = 'store',
+        choices         = [
+            SimLogFile.COMPRESSION_GZIP,
+            SimLogFile.COMPRESSION_ZSTD
+        ],
+        default         = None,
+        help            = 'Compress the merged log files; by default, they are '
+                          'compressed as the source log files'
+    )
+
+    parser.add_argument(
+        '--level',
+        dest            = 'level',
+        action          = 'store',
+        type            = int,
+        default         = None,
+        help            = 'Compression level of the merged log files'
+    )
+
     cliparams      = parser.parse_args()
     return cliparams.__dict__
 
@@ -118,13 +164,22 @@ def getTargetSubDirs(logRootDir):
     return targetSubDirs
 
 
+def getTargetFileNames(targetDir):
+    # return *.dat files, compressed or not
+    return sorted(
+        [
+            fileName for fileName in os.listdir(targetDir)
+            if SimLogFile.is_log_file(fileName)
+        ]
+    )
+
+
 def getTotalTargetFileNum(targetSubDirs):
     returnVal = 0
 
     # count all .dat files
     for f in targetSubDirs:
-        data_files = [file for file in os.listdir(f) if re.match('^.+\.dat$', file) != None]
-        returnVal += len(data_files)
+        returnVal += len(getTargetFileNames(f))
 
     # add one for config.json
     returnVal +=1
@@ -132,7 +187,87 @@ def getTotalTargetFileNum(targetSubDirs):
     return returnVal
 
 
-def mergeLogFiles(logDir, targetSubDirs, dryRun):
+def getIdOffsets(targetSubDirs):
+    # cpuID and _run_id of a sub-directory are shifted by the numbers of
+    # distinct cpuIDs and _run_ids found in the sub-directories before it
+    cpu_id_offset = 0
+    run_id_offset = 0
+    returnVal     = []
+
+    for targetDir in targetSubDirs:
+        returnVal.append((cpu_id_offset, run_id_offset))
+
+        cpu_id_list = []
+        run_id_list = []
+        for fileName in getTargetFileNames(targetDir):
+            for config in SimLogFile.read_config_lines(
+                    os.path.join(targetDir, fileName)
+                ):
+                if not config['cpuID'] in cpu_id_list:
+                    cpu_id_list.append(config['cpuID'])
+
+                if not config['_run_id'] in run_id_list:
+                    run_id_list.append(config['_run_id'])
+
+        cpu_id_offset += len(cpu_id_list)
+        run_id_offset += len(run_id_list)
+
+    return returnVal
+
+
+def getIdTransform(cpu_id_offset, run_id_offset):
+    # return a function updating cpuID and _run_id fields of log lines
+    if (cpu_id_offset == 0) and (run_id_offset == 0):
+        return None
+
+    def _shift(offset):
+        return lambda m: (
+            m.group(1) + str(int(m.group(2)) + offset).encode('ascii')
+        )
+
+    def transform(data):
+        data = CPU_ID_PATTERN.sub(_shift(cpu_id_offset), data)
+        data = RUN_ID_PATTERN.sub(_shift(run_id_offset), data)
+        return data
+
+    return transform
+
+
+def mergeLogFile(params):
+    # merge the log files having the same name into a single log file; return
+    # incomplete lines which are not merged
+    skipped_lines = []
+
+    writer = SimLogFile.LogFileWriter(
+        file_path   = params['outfile_path'],
+        compression = params['compression'],
+        level       = params['level']
+    )
+    try:
+        for (infile_path, cpu_id_offset, run_id_offset) in params['infiles']:
+            incomplete_line = SimLogFile.copy_log_file(
+                infile_path,
+                writer,
+                transform = getIdTransform(cpu_id_offset, run_id_offset)
+            )
+            if incomplete_line is not None:
+                skipped_lines.append(
+                    (infile_path, incomplete_line.decode('utf-8', 'replace'))
+                )
+    finally:
+        writer.close()
+
+    return skipped_lines
+
+
+def mergeLogFiles(
+        logDir,
+        targetSubDirs,
+        dryRun,
+        numJobs     = 1,
+        compression = None,
+        level       = None
+    ):
 
     # get the total number of files to be processes
     total_target_file_num    = getTotalTargetFileNum(targetSubDirs)
@@ -143,9 +278,6 @@ def mergeLogFiles(logDir, targetSubDirs, dryRun):
     if not dryRun:
         os.mkdir(logDir)
 
-    cpu_id_offset = None
-    run_id_offset = None
-
     # copy config.json under logDir
     config_json_path = os.path.join(
         targetSubDirs[0],
@@ -159,27 +291,28 @@ def mergeLogFiles(logDir, targetSubDirs, dryRun):
         shutil.copy(config_json_path, logDir)
     total_processed_file_num += 1
 
-    cpu_id_offset = 0
-    run_id_offset = 0
-    cpu_id_list   = []
-    run_id_list   = []
-    skipped_lines = []
-
-    for targetDir in targetSubDirs:
-
-        cpu_id_offset += len(cpu_id_list)
-        run_id_offset += len(run_id_list)
-        cpu_id_list    = []
-        run_id_list    = []
-
-        for fileName in os.listdir(targetDir):
-            # merge only *.dat files
-            if re.match('^.+\.dat$', fileName) == None:
-                continue
-
-            # identify input file and output file
-            infile_path  = os.path.join(targetDir, fileName)
-            outfile_path = os.path.join(logDir, fileName)
+    # identify input files and output file of each log file
+    id_offsets   = getIdOffsets(targetSubDirs)
+    merge_params = []
+    for fileName in getTargetFileNames(targetSubDirs[0]):
+        if compression is None:
+            file_compression = SimLogFile.get_compression(fileName)
+        else:
+            file_compression = compression
+        outfile_path = SimLogFile.get_file_path(
+            os.path.join(
+                logDir,
+                SimLogFile.get_uncompressed_file_path(fileName)
+            ),
+            file_compression
+        )
+        infiles = []
+        for (targetDir, (cpu_id_offset, run_id_offset)) in zip(
+                targetSubDirs,
+                id_offsets
+            ):
+            infile_path = os.path.join(targetDir, fileName)
+            infiles.append((infile_path, cpu_id_offset, run_id_offset))
 
             # print progress
             print('[{0:3d}%] merging {1} to {2}'.format(
@@ -187,43 +320,33 @@ def mergeLogFiles(logDir, targetSubDirs, dryRun):
                 infile_path,
                 outfile_path
             ))
-
-            if not dryRun:
-                # actual merger happens here
-                with open(infile_path, 'r') as infile:
-                    with open(outfile_path, 'a') as outfile:
-
-                        for line in infile:
-                            # read a log line
-                            try:
-                                log = json.loads(line)
-                            except ValueError:
-                                # input line cannot be parsed as a json
-                                # string. it may be corrupted
-                                skipped_lines.append((infile_path, line))
-                                continue
-
-                            # collect cpuID and _runid that are used to compute
-                            # cpu_id_offset and run_id_offset
-                            if log['_type'] == 'config':
-                                if not log['cpuID'] in cpu_id_list:
-                                    cpu_id_list.append(log['cpuID'])
-
-                                if not log['_run_id'] in run_id_list:
-                                    run_id_list.append(log['_run_id'])
-
-                            # update cpuID and _run_id fields accordingly
-                            if 'cpuID' in log:
-                                log['cpuID'] += cpu_id_offset
-                            if '_run_id' in log:
-                                log['_run_id'] += run_id_offset
-
-                            # write the log line to outfile
-                            outfile.write(json.dumps(log) + "\n")
-
             total_processed_file_num += 1
 
+        merge_params.append(
+            {
+                'outfile_path': outfile_path,
+                'infiles':      infiles,
+                'compression':  file_compression,
+                'level':        level,
+            }
+        )
+
     assert total_processed_file_num == total_target_file_num
+
+    # actual merger happens here
+    skipped_lines = []
+    if not dryRun:
+        if (numJobs > 1) and (len(merge_params) > 1):
+            pool = multiprocessing.Pool(min(numJobs, len(merge_params)))
+            try:
+                results = pool.map(mergeLogFile, merge_params)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [mergeLogFile(params) for params in merge_params]
+        for result in results:
+            skipped_lines += result
     print('[100%] merger done')
 
     if len(skipped_lines) > 0:
@@ -233,7 +356,7 @@ def mergeLogFiles(logDir, targetSubDirs, dryRun):
         print('You can find them in {0}'.format(skipped_lines_file))
         with open(skipped_lines_file, 'w') as f:
             for (file_name, line) in skipped_lines:
-                f.write('{0}, {1}'.format(file_name, line))
+                f.write('{0}, {1}\n'.format(file_name, line))
 
 # =========================== main ============================================
 
@@ -280,7 +403,14 @@ def main():
 
     # create new log files under logDir which have all the log data under the
     # target sub-directories.
-    mergeLogFiles(logDir, targetSubDirs, cliparams['dryRun'])
+    mergeLogFiles(
+        logDir,
+        targetSubDirs,
+        cliparams['dryRun'],
+        numJobs     = cliparams['numJobs'],
+        compression = cliparams['compression'],
+        level       = cliparams['level']
+    )
 
     # remove target sub-directories
     if cliparams['keepSource'] is False:
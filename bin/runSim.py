@@ -30,13 +30,32 @@ import argparse
 import json
 import glob
 import shutil
+import traceback
 
 from SimEngine import SimConfig,   \
                       SimEngine,   \
                       SimLog, \
+                      SimLogFile, \
                       SimSettings, \
                       Connectivity
 
+# =========================== defines =========================================
+
+# sub-directories of a job queue; a job file moves from one to another with
+# an atomic rename
+QUEUE_PENDING = 'pending'
+QUEUE_RUNNING = 'running'
+QUEUE_DONE    = 'done'
+QUEUE_FAILED  = 'failed'
+
+QUEUE_INFO_FILE_NAME = 'queue.json'
+
+# a worker touches the file of the job it runs every QUEUE_HEARTBEAT_PERIOD
+# seconds; the coordinator fails a running job whose file is not touched for
+# QUEUE_HEARTBEAT_TIMEOUT seconds
+QUEUE_HEARTBEAT_PERIOD  = 10
+QUEUE_HEARTBEAT_TIMEOUT = 120
+
 # =========================== helpers =========================================
 
 def parseCliParams():
@@ -50,7 +69,60 @@ def parseCliParams():
         default    = 'config.json',
         help       = 'Location of the configuration file.',
     )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        '--coordinator',
+        dest       = 'coordinator',
+        action     = 'store_true',
+        default    = False,
+        help       = 'Put all the runs into a job queue, wait for workers to '
+                     'process them, then merge the results.',
+    )
+    mode.add_argument(
+        '--worker',
+        dest       = 'worker',
+        action     = 'store_true',
+        default    = False,
+        help       = 'Process runs from the job queue given by --queue until '
+                     'it is empty.',
+    )
+    parser.add_argument(
+        '--queue',
+        dest       = 'queue',
+        action     = 'store',
+        default    = None,
+        help       = 'Location of the job queue directory. The coordinator '
+                     'creates it under simData by default.',
+    )
+    parser.add_argument(
+        '--num-workers',
+        dest       = 'num_workers',
+        action     = 'store',
+        type       = int,
+        default    = 0,
+        help       = 'Number of local worker processes the coordinator '
+                     'starts.',
+    )
+    parser.add_argument(
+        '--merge-compression',
+        dest       = 'merge_compression',
+        action     = 'store',
+        choices    = [SimLogFile.COMPRESSION_GZIP, SimLogFile.COMPRESSION_ZSTD],
+        default    = None,
+        help       = 'Compress the merged log files. By default, they are '
+                     'compressed as the log files of the runs.',
+    )
+    parser.add_argument(
+        '--merge-level',
+        dest       = 'merge_level',
+        action     = 'store',
+        type       = int,
+        default    = None,
+        help       = 'Compression level of the merged log files.',
+    )
     cliparams      = parser.parse_args()
+    if cliparams.worker and cliparams.queue is None:
+        parser.error('--worker requires --queue')
     return cliparams.__dict__
 
 def getTemplogFileName(cpuID, pid):
@@ -66,6 +138,62 @@ def printOrLog(cpuID, pid, output, verbose):
     else:
         print(output)
 
+def getSimParams(simconfig):
+    """
+    Returns the combination keys and the settings of every combination.
+    """
+
+    combinationKeys     = list(simconfig.settings.combination.keys())
+    simParams           = []
+    for p in itertools.product(*[simconfig.settings.combination[k] for k in combinationKeys]):
+        simParam = {}
+        for (k, v) in zip(combinationKeys, p):
+            simParam[k] = v
+        for (k, v) in list(simconfig.settings.regular.items()):
+            if k not in simParam:
+                simParam[k] = v
+        simParams      += [simParam]
+    return combinationKeys, simParams
+
+def runSimulation(
+        simParam,
+        combinationKeys,
+        run_id,
+        cpuID,
+        log_directory_name,
+        logging,
+        verbose,
+        log_root_dir=SimSettings.SimSettings.DEFAULT_LOG_ROOT_DIR
+    ):
+    """
+    Runs a single simulation run.
+    """
+
+    # create singletons
+    settings         = SimSettings.SimSettings(
+        cpuID        = cpuID,
+        run_id       = run_id,
+        log_root_dir = log_root_dir,
+        **simParam
+    )
+    settings.setLogDirectory(log_directory_name)
+    settings.setCombinationKeys(combinationKeys)
+    simlog           = SimLog.SimLog()
+    simlog.set_log_filters(logging)
+    simengine        = SimEngine.SimEngine(run_id=run_id, verbose=verbose)
+
+    # start simulation run
+    simengine.start()
+
+    # wait for simulation run to end
+    simengine.join()
+
+    # destroy singletons
+    simlog.destroy()
+    simengine.destroy()
+    Connectivity.Connectivity().destroy()
+    settings.destroy() # destroy last, Connectivity needs it
+
 def runSimCombinations(params):
     """
     Runs simulations for all combinations of simulation settings.
@@ -85,16 +213,7 @@ def runSimCombinations(params):
     simStartTime        = time.time()
 
     # compute all the simulation parameter combinations
-    combinationKeys     = list(simconfig.settings.combination.keys())
-    simParams           = []
-    for p in itertools.product(*[simconfig.settings.combination[k] for k in combinationKeys]):
-        simParam = {}
-        for (k, v) in zip(combinationKeys, p):
-            simParam[k] = v
-        for (k, v) in list(simconfig.settings.regular.items()):
-            if k not in simParam:
-                simParam[k] = v
-        simParams      += [simParam]
+    combinationKeys, simParams = getSimParams(simconfig)
 
     # run a simulation for each set of simParams
     for (simParamNum, simParam) in enumerate(simParams):
@@ -111,26 +230,15 @@ def runSimCombinations(params):
             )
             printOrLog(cpuID, pid, output, verbose)
 
-            # create singletons
-            settings         = SimSettings.SimSettings(cpuID=cpuID, run_id=run_id, **simParam)
-            settings.setLogDirectory(simconfig.get_log_directory_name())
-            settings.setCombinationKeys(combinationKeys)
-            simlog           = SimLog.SimLog()
-            simlog.set_log_filters(simconfig.logging)
-            simengine        = SimEngine.SimEngine(run_id=run_id, verbose=verbose)
-
-
-            # start simulation run
-            simengine.start()
-
-            # wait for simulation run to end
-            simengine.join()
-
-            # destroy singletons
-            simlog.destroy()
-            simengine.destroy()
-            Connectivity.Connectivity().destroy()
-            settings.destroy() # destroy last, Connectivity needs it
+            runSimulation(
+                simParam           = simParam,
+                combinationKeys    = combinationKeys,
+                run_id             = run_id,
+                cpuID              = cpuID,
+                log_directory_name = simconfig.get_log_directory_name(),
+                logging            = simconfig.logging,
+                verbose            = verbose
+            )
 
         # printOrLog
         output  = 'simulation ended after {0:.0f}s ({1} runs).'.format(
@@ -161,33 +269,374 @@ def printProgressPerCpu(cpuIDs, pid, clear_console=True):
         if allDone:
             break
 
-def merge_output_files(folder_path):
+def merge_output_files(folder_path, compression=None, level=None, numCPUs=1):
     """
     Read the dataset folders and merge the datasets (usefull when using multiple CPUs).
+    The folders are merged in parallel on numCPUs processes.
     :param string folder_path:
     """
 
-    for subfolder in os.listdir(folder_path):
-        # subfolder could have '[' in its name, which is a special character
-        # for glob. This needs to be escaped.
-        file_path_list = sorted(
-            glob.glob(
+    params = [
+        {
+            'subfolder_path': os.path.join(folder_path, subfolder),
+            'compression':    compression,
+            'level':          level,
+        }
+        for subfolder in os.listdir(folder_path)
+        if os.path.isdir(os.path.join(folder_path, subfolder))
+    ]
+    if (numCPUs > 1) and (len(params) > 1):
+        pool = multiprocessing.Pool(min(numCPUs, len(params)))
+        try:
+            pool.map(merge_subfolder, params)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for param in params:
+            merge_subfolder(param)
+
+def merge_subfolder(params):
+    """
+    Concatenate the log files of a dataset folder into a single file, then
+    remove the folder. The files are copied by large chunks; an index of the
+    runs is written next to the merged file.
+    """
+
+    subfolder_path = params['subfolder_path']
+
+    # subfolder could have '[' in its name, which is a special character
+    # for glob. This needs to be escaped.
+    file_path_list = sorted(
+        [
+            file_path for file_path in glob.glob(
                 os.path.join(
-                    folder_path,
-                    subfolder.replace('[', '[[]'),
-                    'output_cpu*.dat'
+                    subfolder_path.replace('[', '[[]'),
+                    'output_cpu*.dat*'
+                )
+            )
+            if SimLogFile.is_log_file(file_path)
+        ]
+    )
+
+    # the merged file keeps the compression of the log files (see
+    # log_compression) unless another one is specified
+    compression = params['compression']
+    if (compression is None) and file_path_list:
+        compression = SimLogFile.get_compression(file_path_list[0])
+
+    # read files and concatenate results
+    writer = SimLogFile.LogFileWriter(
+        file_path   = SimLogFile.get_file_path(
+            subfolder_path + '.dat',
+            compression
+        ),
+        compression = compression,
+        level       = params['level']
+    )
+    try:
+        for file_path in file_path_list:
+            incomplete_line = SimLogFile.copy_log_file(file_path, writer)
+            if incomplete_line is not None:
+                print('{0} ends with an incomplete line, which is dropped'.format(
+                    file_path
+                ))
+    finally:
+        writer.close()
+    shutil.rmtree(subfolder_path)
+
+# === job queue
+#
+# A job queue is a directory holding one JSON file per simulation run
+# (a combination of settings and a run_id). The coordinator puts the job
+# files into "pending"; a worker claims a job by renaming its file into
+# "running", which succeeds for only one of the workers competing for it,
+# and renames it into "done" (or "failed") when the run is over. The queue
+# can live on a filesystem shared by several hosts.
+#
+# While a job runs, its worker keeps updating the modification time of the
+# job file. The coordinator moves a running job into "failed" once its
+# modification time is too old, so that a worker dying in the middle of a
+# job does not keep the coordinator waiting forever.
+
+def getQueueSubDir(queue_dir, name):
+    return os.path.join(queue_dir, name)
+
+def getQueueStatus(queue_dir):
+    # count the job files in each sub-directory
+    return dict(
+        [
+            (
+                name,
+                len(
+                    [
+                        file_name
+                        for file_name in os.listdir(getQueueSubDir(queue_dir, name))
+                        if file_name.endswith('.json')
+                    ]
                 )
             )
+            for name in [QUEUE_PENDING, QUEUE_RUNNING, QUEUE_DONE, QUEUE_FAILED]
+        ]
+    )
+
+def createJobQueue(queue_dir, simconfig, log_root_dir):
+    """
+    Creates a job queue with one job per combination and run_id. Returns
+    the number of jobs.
+    """
+
+    if os.path.exists(queue_dir):
+        raise ValueError('{0} exists already'.format(queue_dir))
+    for name in [QUEUE_PENDING, QUEUE_RUNNING, QUEUE_DONE, QUEUE_FAILED]:
+        os.makedirs(getQueueSubDir(queue_dir, name))
+
+    # jobs are prepared in a temporary directory, then moved into "pending"
+    # so that a worker never reads a partially written job file
+    tmp_dir = os.path.join(queue_dir, 'tmp')
+    os.mkdir(tmp_dir)
+
+    combinationKeys, simParams = getSimParams(simconfig)
+    job_id = 0
+    for (simParamNum, simParam) in enumerate(simParams):
+        for run_id in range(simconfig.execution.numRuns):
+            job = {
+                'job_id':          job_id,
+                'simParamNum':     simParamNum,
+                'numSimParams':    len(simParams),
+                'simParam':        simParam,
+                'combinationKeys': combinationKeys,
+                'run_id':          run_id,
+            }
+            job_file_name = 'job{0:06d}.json'.format(job_id)
+            with open(os.path.join(tmp_dir, job_file_name), 'w') as f:
+                json.dump(job, f)
+            os.rename(
+                os.path.join(tmp_dir, job_file_name),
+                os.path.join(getQueueSubDir(queue_dir, QUEUE_PENDING), job_file_name)
+            )
+            job_id += 1
+    os.rmdir(tmp_dir)
+
+    # workers need to know where to write their logs
+    with open(os.path.join(queue_dir, QUEUE_INFO_FILE_NAME), 'w') as f:
+        json.dump(
+            {
+                'log_root_dir':       log_root_dir,
+                'log_directory_name': simconfig.get_log_directory_name(),
+                'logging':            simconfig.logging,
+                'numJobs':            job_id,
+            },
+            f
         )
 
-        # read files and concatenate results
-        with open(os.path.join(folder_path, subfolder + ".dat"), 'w') as outputfile:
-            for file_path in file_path_list:
-                with open(file_path, 'r') as inputfile:
-                    config = json.loads(inputfile.readline())
-                    outputfile.write(json.dumps(config) + "\n")
-                    outputfile.write(inputfile.read())
-        shutil.rmtree(os.path.join(folder_path, subfolder))
+    return job_id
+
+def claimJob(queue_dir):
+    """
+    Moves a pending job into "running" and returns its file name, or None
+    when there is no pending job any more.
+    """
+
+    pending_dir = getQueueSubDir(queue_dir, QUEUE_PENDING)
+    running_dir = getQueueSubDir(queue_dir, QUEUE_RUNNING)
+    while True:
+        job_file_names = sorted(os.listdir(pending_dir))
+        if not job_file_names:
+            return None
+        for job_file_name in job_file_names:
+            try:
+                # the modification time of the job file is the heartbeat
+                # of the job once it is in "running"; rename() keeps it
+                os.utime(os.path.join(pending_dir, job_file_name), None)
+                os.rename(
+                    os.path.join(pending_dir, job_file_name),
+                    os.path.join(running_dir, job_file_name)
+                )
+            except OSError:
+                # another worker claimed this job first
+                continue
+            return job_file_name
+
+def runJob(queue_dir, queue_info, job, job_file_name, worker_name):
+    try:
+        # the job ID is unique in the queue; use it as cpuID so that
+        # every job writes its own output file
+        runSimulation(
+            simParam           = job['simParam'],
+            combinationKeys    = job['combinationKeys'],
+            run_id             = job['run_id'],
+            cpuID              = job['job_id'],
+            log_directory_name = queue_info['log_directory_name'],
+            logging            = queue_info['logging'],
+            verbose            = False,
+            log_root_dir       = queue_info['log_root_dir']
+        )
+    except Exception:
+        # keep the traceback next to the failed job
+        failed_dir = getQueueSubDir(queue_dir, QUEUE_FAILED)
+        with open(os.path.join(failed_dir, job_file_name + '.err'), 'w') as f:
+            f.write('[{0}]\n'.format(worker_name))
+            f.write(traceback.format_exc())
+        raise
+
+def runWorker(queue_dir):
+    """
+    Runs the jobs of a job queue until there is no pending job.
+    """
+
+    queue_info_path = os.path.join(queue_dir, QUEUE_INFO_FILE_NAME)
+    if not os.path.exists(queue_info_path):
+        raise ValueError('{0} is not a job queue'.format(queue_dir))
+    with open(queue_info_path, 'r') as f:
+        queue_info = json.load(f)
+
+    worker_name = '{0}-pid{1}'.format(platform.uname()[1], os.getpid())
+    num_jobs = 0
+    while True:
+        job_file_name = claimJob(queue_dir)
+        if job_file_name is None:
+            break
+
+        running_path = os.path.join(
+            getQueueSubDir(queue_dir, QUEUE_RUNNING),
+            job_file_name
+        )
+        with open(running_path, 'r') as f:
+            job = json.load(f)
+
+        print('[{0}] job {1}/{2}: parameters {3}/{4}, run {5}'.format(
+            worker_name,
+            job['job_id'] + 1,
+            queue_info['numJobs'],
+            job['simParamNum'] + 1,
+            job['numSimParams'],
+            job['run_id']
+        ))
+        sys.stdout.flush()
+
+        # run the job in a child process; a crashed run cannot leave
+        # singletons behind for the next job
+        job_process = multiprocessing.Process(
+            target = runJob,
+            args   = (queue_dir, queue_info, job, job_file_name, worker_name)
+        )
+        job_process.start()
+        while job_process.is_alive():
+            job_process.join(QUEUE_HEARTBEAT_PERIOD)
+            try:
+                os.utime(running_path, None)
+            except OSError:
+                # the coordinator gave up on the job; let it run to the end
+                # all the same
+                pass
+
+        if job_process.exitcode == 0:
+            dst_dir = getQueueSubDir(queue_dir, QUEUE_DONE)
+        else:
+            # go on with the next job
+            dst_dir = getQueueSubDir(queue_dir, QUEUE_FAILED)
+        try:
+            os.rename(running_path, os.path.join(dst_dir, job_file_name))
+        except OSError:
+            print('[{0}] job {1} was failed by the coordinator'.format(
+                worker_name,
+                job['job_id'] + 1
+            ))
+        num_jobs += 1
+
+    print('[{0}] no more jobs ({1} jobs processed)'.format(worker_name, num_jobs))
+
+def failStaleJobs(queue_dir, timeout=QUEUE_HEARTBEAT_TIMEOUT):
+    """
+    Moves the running jobs whose heartbeat is older than timeout seconds
+    into "failed". Returns the number of such jobs.
+    """
+
+    running_dir = getQueueSubDir(queue_dir, QUEUE_RUNNING)
+    failed_dir  = getQueueSubDir(queue_dir, QUEUE_FAILED)
+    num_stale_jobs = 0
+    for job_file_name in sorted(os.listdir(running_dir)):
+        if not job_file_name.endswith('.json'):
+            continue
+        running_path = os.path.join(running_dir, job_file_name)
+        try:
+            heartbeat = os.path.getmtime(running_path)
+        except OSError:
+            # the job is over
+            continue
+        if time.time() - heartbeat < timeout:
+            continue
+        try:
+            os.rename(running_path, os.path.join(failed_dir, job_file_name))
+        except OSError:
+            # the job is over
+            continue
+        with open(os.path.join(failed_dir, job_file_name + '.err'), 'w') as f:
+            f.write('[coordinator]\n')
+            f.write(
+                'no heartbeat for {0:.0f} seconds; '
+                'the worker running this job is gone\n'.format(
+                    time.time() - heartbeat
+                )
+            )
+        print('job {0} failed: its worker is gone'.format(job_file_name))
+        num_stale_jobs += 1
+    return num_stale_jobs
+
+def runCoordinator(simconfig, queue_dir, log_root_dir, num_workers):
+    """
+    Creates a job queue, starts local workers if requested, and waits until
+    all the jobs are processed by any worker. A running job whose worker
+    stops updating its heartbeat counts as failed. Raises SystemError if a
+    job failed.
+    """
+
+    num_jobs = createJobQueue(queue_dir, simconfig, log_root_dir)
+    print('{0} jobs in {1}'.format(num_jobs, queue_dir))
+    print('start workers with: python {0} --worker --queue {1}'.format(
+        os.path.abspath(__file__),
+        queue_dir
+    ))
+    sys.stdout.flush()
+
+    workers = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                '--worker',
+                '--queue', queue_dir
+            ]
+        )
+        for _ in range(num_workers)
+    ]
+
+    # wait until all the jobs are done
+    status = getQueueStatus(queue_dir)
+    while status[QUEUE_DONE] + status[QUEUE_FAILED] < num_jobs:
+        if workers and all([worker.poll() is not None for worker in workers]):
+            # our workers are gone; remaining jobs are left to workers
+            # started by hand
+            workers = []
+            print('local workers exited with {0} jobs left'.format(
+                num_jobs - status[QUEUE_DONE] - status[QUEUE_FAILED]
+            ))
+        failStaleJobs(queue_dir)
+        time.sleep(1)
+        status = getQueueStatus(queue_dir)
+    for worker in workers:
+        worker.wait()
+    print('all the {0} jobs are processed'.format(num_jobs))
+
+    if status[QUEUE_FAILED] > 0:
+        raise SystemError(
+            '{0} jobs failed; see {1}'.format(
+                status[QUEUE_FAILED],
+                getQueueSubDir(queue_dir, QUEUE_FAILED)
+            )
+        )
+    shutil.rmtree(queue_dir)
 
 # =========================== main ============================================
 
@@ -198,6 +647,11 @@ def main():
     # cli params
     cliparams = parseCliParams()
 
+    if cliparams['worker']:
+        # run jobs of a coordinator; it merges the results
+        runWorker(os.path.abspath(cliparams['queue']))
+        return
+
     # sim config
     simconfig = SimConfig.SimConfig(configfile=cliparams['config'])
     assert simconfig.version == 0
@@ -213,7 +667,26 @@ def main():
         numCPUs = simconfig.execution.numCPUs
     assert numCPUs <= max_numCPUs
 
-    if numCPUs == 1:
+    if cliparams['coordinator']:
+        # let workers run the simulations, possibly on other hosts
+        if cliparams['queue'] is None:
+            queue_dir = os.path.join(
+                SimSettings.SimSettings.DEFAULT_LOG_ROOT_DIR,
+                simconfig.get_log_directory_name() + '.queue'
+            )
+        else:
+            queue_dir = cliparams['queue']
+
+        runCoordinator(
+            simconfig    = simconfig,
+            queue_dir    = os.path.abspath(queue_dir),
+            log_root_dir = os.path.abspath(
+                SimSettings.SimSettings.DEFAULT_LOG_ROOT_DIR
+            ),
+            num_workers  = cliparams['num_workers']
+        )
+
+    elif numCPUs == 1:
         # run on single CPU
 
         runSimCombinations({
@@ -300,7 +773,12 @@ def main():
 
     # merge output files
     folder_path = os.path.join('simData', simconfig.get_log_directory_name())
-    merge_output_files(folder_path)
+    merge_output_files(
+        folder_path,
+        compression = cliparams['merge_compression'],
+        level       = cliparams['merge_level'],
+        numCPUs     = numCPUs
+    )
 
     # copy config file into output directory
     with open(os.path.join(folder_path, 'config.json'), 'w') as f:
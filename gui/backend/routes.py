@@ -1,10 +1,12 @@
 import os
+import shutil
 import tempfile
 import zipfile
 
 import bottle as btl
 
 import backend
+from SimEngine import SimLogFile
 
 @btl.get('/')
 def get_index():
@@ -36,14 +38,15 @@ def get_result_zip_file(result_zip_file_name):
             dir    = var_dir
         )
         try:
-            with zipfile.ZipFile(tmp_file_path, 'w') as zipf:
+            with zipfile.ZipFile(tmp_file_path, 'w', allowZip64=True) as zipf:
                 for root, dirs, files in os.walk(result_subdir_path):
                     for file in files:
                         arcname = os.path.join(
                             os.path.relpath(root, result_subdir_path),
                             os.path.basename(file)
                         )
-                        zipf.write(
+                        _write_to_zip_file(
+                            zipf,
                             filename = os.path.join(root, file),
                             arcname  = arcname
                         )
@@ -57,3 +60,41 @@ def get_result_zip_file(result_zip_file_name):
         return ret
     else:
         btl.abort(404, 'Not Found')
+
+
+def _write_to_zip_file(zipf, filename, arcname):
+    if filename.endswith(SimLogFile.INDEX_FILE_EXTENSION):
+        # this is the index of a log file
+        log_file_path = filename[:-len(SimLogFile.INDEX_FILE_EXTENSION)]
+    else:
+        log_file_path = filename
+
+    if (
+            (not SimLogFile.is_log_file(log_file_path))
+            or
+            (SimLogFile.get_compression(log_file_path) is None)
+        ):
+        zipf.write(filename=filename, arcname=arcname)
+    elif log_file_path != filename:
+        # the offsets in the index of a compressed log file are no longer
+        # valid once it is decompressed below; leave it out
+        pass
+    else:
+        # put a compressed log file decompressed into the zip file; it's
+        # decompressed into a temporary file first since ZipFile.open()
+        # cannot write on Python 2.7
+        fd, tmp_file_path = tempfile.mkstemp(prefix='tmp')
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                with SimLogFile.open_log_file_binary(filename) as src:
+                    shutil.copyfileobj(src, dst, SimLogFile.CHUNK_SIZE)
+            # keep the modification time of the log file
+            mtime = os.path.getmtime(filename)
+            os.utime(tmp_file_path, (mtime, mtime))
+            zipf.write(
+                filename      = tmp_file_path,
+                arcname       = SimLogFile.get_uncompressed_file_path(arcname),
+                compress_type = zipfile.ZIP_DEFLATED
+            )
+        finally:
+            os.remove(tmp_file_path)
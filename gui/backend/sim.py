@@ -24,7 +24,8 @@ import backend.utils
 from SimEngine import (
     SimEngine,
     SimSettings,
-    SimLog
+    SimLog,
+    SimLogFile
 )
 
 
@@ -291,7 +292,10 @@ def start(settings, log_notification_filter='all', stderr_redirect=True):
             # rename .dat file and remove the subdir
             dat_file_path = sim_settings.getOutputFile()
             subdir_path = os.path.dirname(dat_file_path)
-            new_file_name = subdir_path + '.dat'
+            new_file_name = SimLogFile.get_file_path(
+                subdir_path + '.dat',
+                SimLogFile.get_compression(dat_file_path)
+            )
             os.rename(dat_file_path, new_file_name)
             os.rmdir(subdir_path)
         else:
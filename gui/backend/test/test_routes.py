@@ -0,0 +1,40 @@
+import os
+import zipfile
+
+import backend.routes
+from SimEngine import SimLogFile
+
+
+def test_zip_compressed_log_file(tmpdir):
+    result_dir = tmpdir.mkdir('result')
+    log_data = b'{"_type": "config"}\n{"_type": "tsch.txdone"}\n'
+
+    # a compressed log file with its index, as merged by runSim.py
+    log_file_path = os.path.join(str(result_dir), 'exec_numMotes_2.dat.gz')
+    writer = SimLogFile.LogFileWriter(
+        log_file_path,
+        SimLogFile.COMPRESSION_GZIP
+    )
+    writer.start_run(run_id=0, cpu_id=0)
+    writer.write(log_data)
+    writer.close()
+    with open(os.path.join(str(result_dir), 'config.json'), 'w') as f:
+        f.write('{}')
+
+    zip_file_path = os.path.join(str(tmpdir), 'result.zip')
+    with zipfile.ZipFile(zip_file_path, 'w', allowZip64=True) as zipf:
+        for file_name in sorted(os.listdir(str(result_dir))):
+            backend.routes._write_to_zip_file(
+                zipf,
+                filename = os.path.join(str(result_dir), file_name),
+                arcname  = file_name
+            )
+
+    # the log file is decompressed; its index is left out
+    with zipfile.ZipFile(zip_file_path, 'r') as zipf:
+        assert sorted(zipf.namelist()) == [
+            'config.json',
+            'exec_numMotes_2.dat'
+        ]
+        assert zipf.read('exec_numMotes_2.dat') == log_data
+        assert zipf.read('config.json') == b'{}'
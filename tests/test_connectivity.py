@@ -10,9 +10,10 @@ import itertools
 import json
 import gzip
 import os
-import random
 import types
 
+import numpy
+
 import pytest
 
 from . import test_utils as u
@@ -63,6 +64,59 @@ def test_linear_matrix(sim_engine):
                     assert matrix.get_rssi(c, p, channel) == -1000
 
 
+def test_mean_link_quality(sim_engine):
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': 2,
+            'conn_class':    'Linear',
+        }
+    )
+    connectivity = engine.connectivity
+    channels = connectivity.channels
+
+    assert connectivity.get_mean_link_pdr(0, 1)  == 1.00
+    assert connectivity.get_mean_link_rssi(0, 1) == -10
+
+    # the cached values are kept as long as the matrix doesn't change
+    version = connectivity.version
+    assert connectivity.get_mean_link_pdr(0, 1) == 1.00
+    assert connectivity.version == version
+
+    # a change to the matrix bumps the version and invalidates the cache
+    connectivity.matrix.set_pdr(1, 0, channels[0], 0.50)
+    connectivity.matrix.set_rssi(0, 1, channels[0], -10 - len(channels))
+    assert connectivity.version > version
+    assert connectivity.get_mean_link_pdr(0, 1) == pytest.approx(
+        1 - 0.50 / (2 * len(channels))
+    )
+    assert connectivity.get_mean_link_pdr(1, 0) == pytest.approx(
+        connectivity.get_mean_link_pdr(0, 1)
+    )
+    assert connectivity.get_mean_link_rssi(0, 1) == pytest.approx(-11)
+    assert connectivity.get_mean_link_rssi(1, 0) == -10
+
+
+def test_neighbors_of(sim_engine):
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': 4,
+            'conn_class':    'Linear',
+        }
+    )
+    connectivity = engine.connectivity
+    channels = connectivity.channels
+
+    assert connectivity.neighbors_of(0) == (1, )
+    assert connectivity.neighbors_of(1) == (0, 2)
+    assert connectivity.neighbors_of(3) == (2, )
+
+    # a link on a single channel is enough
+    connectivity.matrix.set_pdr(3, 1, channels[-1], 0.30)
+    assert connectivity.neighbors_of(1) == (0, 2, 3)
+    assert connectivity.neighbors_of(1, min_pdr=0.50) == (0, 2)
+    assert connectivity.neighbors_of(3) == (2, )
+
+
 #=== verify propagate function doesn't raise exception
 
 def test_propagate(sim_engine):
@@ -73,12 +127,17 @@ def test_propagate(sim_engine):
 #=== test for ConnectivityRandom
 class TestRandom(object):
 
-    def test_free_run(self, sim_engine):
+    @pytest.fixture(params=[False, True])
+    def fixture_in_range_only(self, request):
+        return request.param
+
+    def test_free_run(self, sim_engine, fixture_in_range_only):
         # all the motes should be able to join the network
         sim_engine = sim_engine(
             diff_config = {
                 'exec_numSlotframesPerRun'      : 10000,
                 'conn_class'                    : 'Random',
+                'conn_propagate_in_range_only'  : fixture_in_range_only,
                 'secjoin_enabled'               : False,
                 "phy_numChans"                  : 1,
             }
@@ -159,6 +218,85 @@ class TestRandom(object):
                 assert sum([(i != j) for i, j in zip(pdr[:-1], pdr[1:])])   == 0
                 assert sum([(i != j) for i, j in zip(rssi[:-1], rssi[1:])]) == 0
 
+    def test_neighbors_of(self, sim_engine):
+        sim_engine = sim_engine(
+            diff_config = {
+                'conn_class'                    : 'Random',
+                'conn_random_square_side'       : 5.000,
+                'conn_random_init_min_pdr'      : 0.1,
+                'conn_random_init_min_neighbors': 1,
+                'exec_numMotes'                 : 30,
+                'exec_randomSeed'               : 5,
+            }
+        )
+        connectivity = sim_engine.connectivity
+        matrix = connectivity.matrix
+        channel = connectivity.channels[0]
+
+        # the grid should have more than one cell for this test
+        assert len(matrix.grid) > 1
+
+        # the neighbors found by the spatial index should be the same as the
+        # ones found by a full scan of the matrix
+        def _scan(mote_id):
+            return tuple(
+                neighbor_id for neighbor_id in matrix.mote_id_list
+                if (
+                    (neighbor_id != mote_id)
+                    and
+                    (connectivity.get_pdr(neighbor_id, mote_id, channel) > 0)
+                )
+            )
+        for mote_id in matrix.mote_id_list:
+            assert connectivity.neighbors_of(mote_id) == _scan(mote_id)
+
+        # once the matrix is modified, the index is no longer used
+        far_mote_id = [
+            mote_id for mote_id in matrix.mote_id_list[1:]
+            if mote_id not in matrix.get_neighbor_candidates(0)
+        ][0]
+        matrix.set_pdr(far_mote_id, 0, channel, 1.00)
+        assert far_mote_id in connectivity.neighbors_of(0)
+        assert connectivity.neighbors_of(0) == _scan(0)
+
+    def test_vectorized_pister_hack(self, sim_engine):
+        sim_engine = sim_engine(
+            diff_config = {
+                'conn_class'   : 'Random',
+                'exec_numMotes': 5,
+            }
+        )
+        matrix      = sim_engine.connectivity.matrix
+        pister_hack = matrix.pister_hack
+        src_mote    = sim_engine.motes[0]
+        src         = {u'mote': src_mote, u'coordinate': (0.1, 0.2)}
+        dsts = [
+            {u'mote': mote, u'coordinate': matrix.coordinates[mote.id]}
+            for mote in sim_engine.motes[1:]
+        ]
+
+        # the vectorized version should return exactly the same values as
+        # the scalar one for the same random stream
+        state = pister_hack.rng.getstate()
+        rssi = [pister_hack.compute_rssi(src, dst) for dst in dsts]
+        pdr  = [pister_hack.convert_rssi_to_pdr(r) for r in rssi]
+
+        pister_hack.rng.setstate(state)
+        rssi_array = pister_hack.compute_rssi_array(
+            src_mote,
+            src[u'coordinate'],
+            numpy.array([dst[u'coordinate'] for dst in dsts]),
+            numpy.array([dst[u'mote'].radio.antennaGain for dst in dsts])
+        )
+        pdr_array = pister_hack.convert_rssi_to_pdr_array(rssi_array)
+
+        assert rssi_array.tolist() == rssi
+        assert pdr_array.tolist()  == pdr
+
+        # out-of-range RSSI values
+        assert pister_hack.convert_rssi_to_pdr_array(
+            numpy.array([-1000.0, 0.0])
+        ).tolist() == [0.0, 1.0]
 
     def test_context_random_seed(self, sim_engine):
         diff_config = {
@@ -226,19 +364,16 @@ def test_lockon(sim_engine):
     # let hop_1 send an application packet
     hop_1.app._send_a_single_packet()
 
-    # force random.random() to return 1, which will cause any frame not to be
-    # received by anyone
-    _random = random.random
+    # force the random number generator of connectivity to return 1, which
+    # will cause any frame not to be received by anyone
+    rng = sim_engine.connectivity.rng
     def return_one(self):
         return float(1)
-    random.random = types.MethodType(return_one, random)
+    rng.random = types.MethodType(return_one, rng)
 
     # run the simulation
     u.run_until_end(sim_engine)
 
-    # put the original random() back to random
-    random.random = _random
-
     # root shouldn't lock on the frame hop_1 sent since root is not expected to
     # receive even the preamble of the packet.
     logs = u.read_log_file([SimLog.LOG_PROP_DROP_LOCKON['type']])
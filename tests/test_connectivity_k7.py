@@ -171,3 +171,42 @@ def test_check_channels_in_header(
         sim_engine(diff_config=diff_config)
 
     d.TSCH_HOPPING_SEQUENCE = tsch_hoppping_sequence_backup
+
+def test_update_granularity(sim_engine):
+    granularity = 101
+    deltas = {}
+    batches = {}
+    for _granularity in [1, granularity]:
+        engine = sim_engine(
+            diff_config = {
+                'exec_numMotes'                : get_num_motes(),
+                'conn_class'                   : 'K7',
+                'conn_trace'                   : TRACE_FILE_PATH,
+                'conn_trace_update_granularity': _granularity,
+                'phy_numChans'                 : len(get_channels())
+            }
+        )
+        matrix = engine.connectivity.matrix
+        deltas[_granularity] = matrix.deltas
+        batches[_granularity] = matrix.batches
+        engine.destroy()
+        engine.connectivity.destroy()
+        engine.settings.destroy()
+        SimLog.SimLog().destroy()
+
+    # the same changes are applied in the same order, in fewer batches
+    assert deltas[granularity] == deltas[1]
+    assert len(batches[granularity]) < len(batches[1])
+
+    # every update is delayed to the next multiple of the granularity
+    batch_asn_of_delta = {}
+    for asn, start_delta, end_delta, _ in batches[granularity]:
+        assert asn % granularity == 0
+        for delta_index in range(start_delta, end_delta):
+            batch_asn_of_delta[delta_index] = asn
+    for asn, start_delta, end_delta, _ in batches[1]:
+        for delta_index in range(start_delta, end_delta):
+            assert asn <= batch_asn_of_delta[delta_index] < asn + granularity
+
+    # the batches cover the whole trace
+    assert batches[granularity][-1][3] == batches[1][-1][3]
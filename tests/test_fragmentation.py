@@ -408,6 +408,55 @@ class TestFragmentationAndReassembly(object):
             math.ceil(float(app_pkLength) / self.TSCH_MAX_PAYLOAD)
         )
 
+    def test_fragment_headers(self, sim_engine):
+        """Test fragments keep their own per-frame headers
+        - objective   : test if dropping or transmitting a fragment doesn't
+                        affect the others
+        - action      : fragment a packet into three fragments
+        - action      : drop the first fragment and modify the MAC header
+                        of the second one
+        - expectation : the last fragment is intact
+        """
+        sim_engine = sim_engine(
+            diff_config = {
+                'exec_numMotes'       : 2,
+                'tsch_max_payload_len': self.TSCH_MAX_PAYLOAD,
+            }
+        )
+        leaf = sim_engine.motes[1]
+
+        packet = {
+            u'type': d.PKT_TYPE_DATA,
+            u'app': {u'appcounter': 0},
+            u'net': {
+                u'srcIp':         u'fd00::2',
+                u'dstIp':         u'fd00::1',
+                u'hop_limit':     d.IPV6_DEFAULT_HOP_LIMIT,
+                u'packet_length': self.TSCH_MAX_PAYLOAD * 3,
+                u'sourceRoute':   [u'fd00::3']
+            },
+            u'mac': {u'srcMac': leaf.get_mac_addr(), u'dstMac': None}
+        }
+        fragments = leaf.sixlowpan.fragmentation.fragmentPacket(packet)
+        assert len(fragments) == 3
+        assert fragments[0][u'net'][u'sourceRoute'] == [u'fd00::3']
+        assert fragments[2][u'app'] == {u'appcounter': 0}
+        assert fragments[2][u'net'][u'original_packet_type'] == d.PKT_TYPE_DATA
+
+        leaf.drop_packet(fragments[0], u'test')
+        fragments[1][u'mac'][u'retriesLeft'] = 0
+
+        assert fragments[0] == {}
+        assert fragments[2][u'mac'] == packet[u'mac']
+        assert fragments[2][u'app'] == {u'appcounter': 0}
+        assert fragments[2][u'net'] == {
+            u'datagram_size':        self.TSCH_MAX_PAYLOAD * 3,
+            u'datagram_tag':         fragments[1][u'net'][u'datagram_tag'],
+            u'datagram_offset':      self.TSCH_MAX_PAYLOAD * 2,
+            u'packet_length':        self.TSCH_MAX_PAYLOAD,
+            u'original_packet_type': d.PKT_TYPE_DATA
+        }
+
 class TestMemoryManagement(object):
     """Test memory management for reassembly buffer and VRB table
     """
@@ -568,6 +617,12 @@ class TestMemoryManagement(object):
 
         # the memory should have only one entry for fragment2_0 and fragment2_1
         assert get_memory_usage(hop1, fragmentation) == 1
+        if fragmentation == 'PerHopReassembly':
+            assert hop1.sixlowpan.fragmentation.reassembly_buffers_num == 1
+            assert len(hop1.sixlowpan.fragmentation.reassembly_buffer_expirations) == 1
+        elif fragmentation == 'FragmentForwarding':
+            assert hop1.sixlowpan.fragmentation.vrb_table_entry_num == 1
+            assert len(hop1.sixlowpan.fragmentation.vrb_table_entry_expirations) == 1
 
 class TestDatagramTagManagement(object):
     """Test datagram_tag management
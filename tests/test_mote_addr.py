@@ -142,3 +142,14 @@ def test_motes_eui64(sim_engine, fixture_motes_eui64, fixture_exec_num_motes):
                 base_eui64 = netaddr.EUI('02-00-00-00-00-00-00-00')
                 auto_eui64 = netaddr.EUI(base_eui64.value + mote.id)
                 assert mote.get_mac_addr() == str(auto_eui64)
+
+
+def test_get_mote_by_mac_addr(sim_engine):
+    sim_engine = sim_engine(diff_config={'exec_numMotes': 2})
+
+    mote = sim_engine.motes[1]
+
+    assert sim_engine.get_mote_by_mac_addr(mote.get_mac_addr()) == mote
+    assert sim_engine.get_mote_by_mac_addr(mote.eui64) == mote
+    assert sim_engine.get_mote_by_mac_addr(d.BROADCAST_ADDRESS) is None
+    assert sim_engine.get_mote_by_mac_addr(None) is None
@@ -111,3 +111,25 @@ def test_random_seed(sim_engine, fixture_random_seed):
         assert (
             sum([i != j for i, j in zip(hash_list[:-1], hash_list[1:])]) == 0
         )
+
+def test_random_streams(sim_engine):
+    diff_config = {'exec_randomSeed': 1}
+
+    # a stream is shared by a subsystem of a mote
+    engine = sim_engine(diff_config=diff_config)
+    assert engine.get_random(u'sf', 1) is engine.get_random(u'sf', 1)
+    assert engine.get_random(u'sf', 1) is not engine.get_random(u'sf', 2)
+
+    # the numbers drawn from a stream depend only on the random seed, not on
+    # how other subsystems consume random numbers
+    values = []
+    for num_draws in [0, 100]:
+        engine   = sim_engine(diff_config=diff_config)
+        for _ in range(num_draws):
+            engine.get_random(u'tsch', 1).random()
+        values.append([engine.get_random(u'sf', 1).random() for _ in range(5)])
+        engine.connectivity.destroy()
+        engine.destroy()
+        SimLog.SimLog().destroy()
+        SimSettings.SimSettings().destroy()
+    assert values[0] == values[1]
@@ -527,6 +527,38 @@ def test_handle_routing_loop_at_root(sim_engine):
 
     assert True
 
+    # the loop is broken by a DAO from addr_1
+    root_addr = root.get_ipv6_global_addr()
+    root.rpl.addParentChildfromDAOs(parent_addr=root_addr, child_addr=addr_1)
+    assert root.rpl.computeSourceRoute(addr_1) == [addr_1]
+    assert root.rpl.computeSourceRoute(addr_2) == [addr_1, addr_2]
+
+def test_source_route_cache(sim_engine):
+    sim_engine = sim_engine(diff_config={'exec_numMotes': 1})
+    root = sim_engine.motes[0]
+
+    root_addr = root.get_ipv6_global_addr()
+    addr = ['fd00::{0}'.format(i) for i in range(5)]
+
+    #   root <- 1 <- 2 <- 3
+    #        <- 4
+    root.rpl.addParentChildfromDAOs(parent_addr=root_addr, child_addr=addr[1])
+    root.rpl.addParentChildfromDAOs(parent_addr=addr[1], child_addr=addr[2])
+    root.rpl.addParentChildfromDAOs(parent_addr=addr[2], child_addr=addr[3])
+    root.rpl.addParentChildfromDAOs(parent_addr=root_addr, child_addr=addr[4])
+    assert root.rpl.computeSourceRoute(addr[3]) == [addr[1], addr[2], addr[3]]
+    assert root.rpl.computeSourceRoute(addr[4]) == [addr[4]]
+
+    # a returned route may be consumed by the caller
+    root.rpl.computeSourceRoute(addr[3]).pop(0)
+    assert root.rpl.computeSourceRoute(addr[3]) == [addr[1], addr[2], addr[3]]
+
+    # 2 switches to 4; its subtree follows
+    root.rpl.addParentChildfromDAOs(parent_addr=addr[4], child_addr=addr[2])
+    assert root.rpl.computeSourceRoute(addr[1]) == [addr[1]]
+    assert root.rpl.computeSourceRoute(addr[2]) == [addr[4], addr[2]]
+    assert root.rpl.computeSourceRoute(addr[3]) == [addr[4], addr[2], addr[3]]
+
 @pytest.fixture(params=['smaller', 'same', 'larger'])
 def fixture_rank_value(request):
     return request.param
@@ -215,3 +215,108 @@ def test_rejoin(sim_engine):
     assert mote_3.rpl.dodagId
     assert mote_3.rpl.trickle_timer.is_running
     assert not mote_3.rpl.dis_timer_is_running
+
+
+def test_parents_without_loop(sim_engine):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numMotes'  : 4,
+            'conn_class'     : 'FullyMeshed',
+            'rpl_of'         : 'OFBestLinkPDR',
+            'secjoin_enabled': False
+        }
+    )
+
+    # shorthands
+    motes = sim_engine.motes
+
+    # the OF is installed when RPL starts, i.e., at join
+    for mote in motes[1:]:
+        mote.rpl.of = RplOFBestLinkPDR(mote.rpl)
+
+    def make_neighbor(mote):
+        neighbor = copy.copy(RplOFBestLinkPDR.NONE_PREFERRED_PARENT)
+        neighbor[u'mac_addr'] = mote.get_mac_addr()
+        neighbor[u'mote_id'] = mote.id
+        neighbor[u'rank'] = d.RPL_MINHOPRANKINCREASE
+        neighbor[u'mean_link_pdr'] = 1.0
+        return neighbor
+
+    def set_preferred_parent(mote, parent):
+        mote.rpl.of.preferred_parent = make_neighbor(parent)
+        mote.rpl.of._invalidate_ancestors()
+
+    # the DODAG is a chain: mote_0 <- mote_1 <- mote_2 <- mote_3
+    set_preferred_parent(motes[1], motes[0])
+    set_preferred_parent(motes[2], motes[1])
+    set_preferred_parent(motes[3], motes[2])
+    assert motes[3].rpl.of._get_ancestors() == set([0, 1, 2])
+
+    # mote_2 and mote_3 have mote_1 on their paths to the root
+    motes[1].rpl.of.neighbors = [
+        make_neighbor(motes[3]),
+        make_neighbor(motes[2]),
+        make_neighbor(motes[0])
+    ]
+    parents = motes[1].rpl.of.parents
+    assert [parent[u'mote_id'] for parent in parents] == [0]
+
+    # mote_3 switches to mote_0
+    set_preferred_parent(motes[3], motes[0])
+    assert motes[3].rpl.of._get_ancestors() == set([0])
+    parents = motes[1].rpl.of.parents
+    assert [parent[u'mote_id'] for parent in parents] == [3, 0]
+
+    # a loop which doesn't go through the root gives no path to the root
+    set_preferred_parent(motes[2], motes[3])
+    set_preferred_parent(motes[3], motes[2])
+    assert motes[2].rpl.of._get_ancestors() is None
+    assert motes[3].rpl.of._get_ancestors() is None
+
+
+def test_ancestors_after_rejoin(sim_engine):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numMotes'  : 4,
+            'conn_class'     : 'FullyMeshed',
+            'rpl_of'         : 'OFBestLinkPDR',
+            'secjoin_enabled': False
+        }
+    )
+
+    # shorthands
+    motes = sim_engine.motes
+
+    # the OF is installed when RPL starts, i.e., at join
+    for mote in motes[1:]:
+        mote.rpl.of = RplOFBestLinkPDR(mote.rpl)
+
+    def make_neighbor(mote):
+        neighbor = copy.copy(RplOFBestLinkPDR.NONE_PREFERRED_PARENT)
+        neighbor[u'mac_addr'] = mote.get_mac_addr()
+        neighbor[u'mote_id'] = mote.id
+        neighbor[u'rank'] = d.RPL_MINHOPRANKINCREASE
+        neighbor[u'mean_link_pdr'] = 1.0
+        return neighbor
+
+    def set_preferred_parent(mote, parent):
+        mote.rpl.of.preferred_parent = make_neighbor(parent)
+        mote.rpl.of._invalidate_ancestors()
+
+    # the DODAG is a chain: mote_0 <- mote_1 <- mote_2
+    set_preferred_parent(motes[1], motes[0])
+    set_preferred_parent(motes[2], motes[1])
+    assert motes[2].rpl.of._get_ancestors() == set([0, 1])
+
+    # mote_1 desynchronizes, then joins again; RPL starts with a new OF
+    # having no preferred parent
+    motes[1].rpl.stop()
+    motes[1].rpl.dis_mode = u'disabled'
+    motes[1].rpl.start()
+    assert motes[1].rpl.getPreferredParent() is None
+
+    # mote_2 has no path to the root any more; it is not a parent for
+    # mote_3
+    assert motes[2].rpl.of._get_ancestors() is None
+    motes[3].rpl.of.neighbors = [make_neighbor(motes[2])]
+    assert motes[3].rpl.of.parents == []
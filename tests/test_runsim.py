@@ -1,8 +1,47 @@
+import glob
+import json
 import os
 import subprocess
+import sys
+import time
+
+import pytest
 
 #============================ helpers =========================================
 
+RUNSIM_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '../bin',
+    'runSim.py'
+)
+
+def write_config(directory, num_runs):
+    with open(os.path.join(os.path.dirname(RUNSIM_PATH), 'config.json')) as f:
+        config = json.load(f)
+    config['execution']['numRuns'] = num_runs
+    config['settings']['combination'] = {'exec_numMotes': [2, 3]}
+    config['settings']['regular']['exec_numSlotframesPerRun'] = 20
+    config['post'] = []
+    with open(os.path.join(directory, 'config.json'), 'w') as f:
+        json.dump(config, f)
+
+def check_merged_logs(directory, num_runs):
+    # one file per combination, with a run of each run_id
+    log_dirs = glob.glob(os.path.join(directory, 'simData', '*'))
+    assert len(log_dirs) == 1
+    for num_motes in [2, 3]:
+        file_path = os.path.join(
+            log_dirs[0],
+            'exec_numMotes_{0}.dat'.format(num_motes)
+        )
+        run_ids = []
+        with open(file_path) as f:
+            for line in f:
+                log = json.loads(line)
+                if log['_type'] == 'config':
+                    run_ids.append(log['_run_id'])
+        assert sorted(run_ids) == list(range(num_runs))
+
 #============================ tests ===========================================
 
 def test_runSim():
@@ -14,3 +53,89 @@ def test_runSim():
     )
     os.chdir(wd)
     assert rc==0
+
+@pytest.fixture(params=['local_workers', 'separate_workers'])
+def fixture_worker_type(request):
+    return request.param
+
+def test_runSim_job_queue(tmpdir, fixture_worker_type):
+    num_runs = 3
+    directory = str(tmpdir)
+    write_config(directory, num_runs)
+    queue_dir = os.path.join(directory, 'queue')
+
+    if fixture_worker_type == 'local_workers':
+        # the coordinator starts the workers by itself
+        rc = subprocess.call(
+            [
+                sys.executable, RUNSIM_PATH,
+                '--coordinator',
+                '--queue', queue_dir,
+                '--num-workers', '2'
+            ],
+            cwd = directory
+        )
+        assert rc == 0
+    elif fixture_worker_type == 'separate_workers':
+        coordinator = subprocess.Popen(
+            [sys.executable, RUNSIM_PATH, '--coordinator', '--queue', queue_dir],
+            cwd = directory
+        )
+        # wait for the coordinator to create the job queue
+        while not os.path.exists(os.path.join(queue_dir, 'queue.json')):
+            assert coordinator.poll() is None
+            time.sleep(0.1)
+        workers = [
+            subprocess.Popen(
+                [sys.executable, RUNSIM_PATH, '--worker', '--queue', queue_dir],
+                cwd = directory
+            )
+            for _ in range(3)
+        ]
+        for worker in workers:
+            assert worker.wait() == 0
+        assert coordinator.wait() == 0
+    else:
+        raise NotImplementedError()
+
+    # the job queue is removed once all the jobs are done
+    assert not os.path.exists(queue_dir)
+    check_merged_logs(directory, num_runs)
+
+def test_runSim_job_queue_dead_worker(tmpdir):
+    num_runs = 1
+    directory = str(tmpdir)
+    write_config(directory, num_runs)
+    queue_dir = os.path.join(directory, 'queue')
+
+    coordinator = subprocess.Popen(
+        [sys.executable, RUNSIM_PATH, '--coordinator', '--queue', queue_dir],
+        cwd = directory
+    )
+    while not os.path.exists(os.path.join(queue_dir, 'queue.json')):
+        assert coordinator.poll() is None
+        time.sleep(0.1)
+
+    # a worker claimed the first job and died without updating its
+    # heartbeat
+    os.rename(
+        os.path.join(queue_dir, 'pending', 'job000000.json'),
+        os.path.join(queue_dir, 'running', 'job000000.json')
+    )
+    os.utime(os.path.join(queue_dir, 'running', 'job000000.json'), (0, 0))
+
+    worker = subprocess.Popen(
+        [sys.executable, RUNSIM_PATH, '--worker', '--queue', queue_dir],
+        cwd = directory
+    )
+    assert worker.wait() == 0
+
+    # the coordinator gives up on the job instead of waiting forever
+    assert coordinator.wait() != 0
+    assert sorted(os.listdir(os.path.join(queue_dir, 'failed'))) == [
+        'job000000.json',
+        'job000000.json.err'
+    ]
+    assert sorted(os.listdir(os.path.join(queue_dir, 'done'))) == [
+        'job000001.json'
+    ]
@@ -20,6 +20,7 @@ import SimEngine.Mote.MoteDefines as d
 from SimEngine import SimLog
 from SimEngine import SimEngine
 from SimEngine.Mote.sf import SchedulingFunctionMSF
+from SimEngine.Mote.sf import SchedulingFunctionLLSF
 from SimEngine.Mote.sf import SchedulingFunctionSFNone
 
 # =========================== helpers =========================================
@@ -150,7 +151,7 @@ class TestMSF(object):
 
         sim_engine = sim_engine(
             diff_config = {
-                'exec_randomSeed': 3413860673863013345,
+                'exec_randomSeed': 1,
                 'app_pkPeriod'            : 0,
                 'app_pkPeriodVar'         : 0,
                 'exec_numMotes'           : 2,
@@ -544,6 +545,38 @@ class TestMSF(object):
         assert slot_offset == 1
         assert channel_offset == 0
 
+    def test_autonomous_cell_cache(self, sim_engine, monkeypatch):
+        sim_engine = sim_engine(
+            diff_config = {
+                'exec_numMotes': 2,
+                'sf_class'     : 'MSF'
+            }
+        )
+
+        mote = sim_engine.motes[0]
+        mac_addr = sim_engine.motes[1].get_mac_addr()
+        slotframe = mote.tsch.get_slotframe(
+            mote.sf.SLOTFRAME_HANDLE_AUTONOMOUS_CELLS
+        )
+        hash_value = mote.sf._sax(mac_addr)
+
+        # the cell is computed once for a MAC address...
+        cell = mote.sf._compute_autonomous_cell(mac_addr)
+        assert cell == (
+            1 + (hash_value % (slotframe.length - 1)),
+            hash_value % sim_engine.settings.phy_numChans
+        )
+        monkeypatch.setattr(mote.sf, '_sax', lambda mac_addr: 1 / 0)
+        assert mote.sf._compute_autonomous_cell(mac_addr) == cell
+
+        # ... and per slotframe length
+        monkeypatch.setattr(mote.sf, '_sax', lambda mac_addr: hash_value)
+        slotframe.set_length(slotframe.length - 1)
+        assert mote.sf._compute_autonomous_cell(mac_addr) == (
+            1 + (hash_value % (slotframe.length - 1)),
+            hash_value % sim_engine.settings.phy_numChans
+        )
+
     def test_clear(self, sim_engine):
         sim_engine = sim_engine(
             diff_config = {
@@ -674,6 +707,160 @@ class TestMSF(object):
         cells =  mote.sf._create_available_cell_list(2)
         assert len(cells) == 0
 
+    def test_collision_oracle(self, sim_engine):
+        sim_engine = sim_engine(
+            diff_config = {
+                'exec_numMotes'      : 3,
+                'sf_class'           : 'MSF',
+                'sf_collision_oracle': True,
+                'conn_class'         : 'FullyMeshed',
+                'phy_numChans'       : 2
+            }
+        )
+
+        # for quick access
+        root  = sim_engine.motes[0]
+        hop_1 = sim_engine.motes[1]
+        hop_2 = sim_engine.motes[2]
+
+        # hop_1 transmits to hop_2 on channel offset 0 at every slot but
+        # the minimal cell's
+        for slot_offset in range(1, sim_engine.settings.tsch_slotframeLength):
+            hop_1.tsch.addCell(
+                slotOffset       = slot_offset,
+                channelOffset    = 0,
+                neighbor         = hop_2.get_mac_addr(),
+                cellOptions      = [d.CELLOPTION_TX],
+                slotframe_handle = 0
+            )
+
+        # cells proposed by root to hop_2 avoid channel offset 0
+        cell_list = root.sf._create_available_cell_list(
+            root.sf.DEFAULT_CELL_LIST_LEN,
+            hop_2.get_mac_addr(),
+            root.sf.TX_CELL_OPT
+        )
+        assert len(cell_list) == root.sf.DEFAULT_CELL_LIST_LEN
+        for cell in cell_list:
+            assert cell['channelOffset'] == 1
+
+    def test_cell_utilization_window(self, sim_engine, monkeypatch):
+        sim_engine = sim_engine(
+            diff_config = {
+                'exec_numMotes': 2,
+                'app_pkPeriod' : 0,
+                'sf_class'     : 'MSF',
+                'conn_class'   : 'Linear'
+            }
+        )
+        monkeypatch.setattr(d, 'MSF_MAX_NUMCELLS', 4)
+
+        # for quick access
+        root  = sim_engine.motes[0]
+        hop_1 = sim_engine.motes[1]
+        u.run_until_mote_is_ready_for_app(sim_engine, hop_1)
+        u.run_until_asn(
+            sim_engine,
+            sim_engine.getAsn() + sim_engine.settings.tsch_slotframeLength * 10
+        )
+        tx_cell = hop_1.sf.get_tx_cells(root.get_mac_addr())[0]
+        assert tx_cell.options == hop_1.sf.TX_CELL_OPT
+
+        adaptations = []
+        monkeypatch.setattr(
+            hop_1.sf,
+            '_adapt_to_traffic',
+            lambda neighbor, cell_opt: adaptations.append((neighbor, cell_opt))
+        )
+        hop_1.sf._reset_cell_counters(hop_1.sf.TX_CELL_OPT)
+        hop_1.sf.tx_cell_utilization = 0
+
+        # notifications of other cells are ignored
+        minimal_cell = hop_1.tsch.get_cells(None, 0)[0]
+        packet = {u'type': d.PKT_TYPE_DATA}
+        hop_1.sf.indication_tx_cell_elapsed(minimal_cell, packet)
+        assert hop_1.sf.num_tx_cells_elapsed == 0
+
+        # the utilization is computed at the end of a window
+        for sent_packet in [packet, None, packet]:
+            hop_1.sf.indication_tx_cell_elapsed(tx_cell, sent_packet)
+        assert hop_1.sf.num_tx_cells_elapsed == 3
+        assert hop_1.sf.num_tx_cells_used == 2
+        assert hop_1.sf.tx_cell_utilization == 0
+        assert adaptations == []
+
+        hop_1.sf.indication_tx_cell_elapsed(tx_cell, packet)
+        assert hop_1.sf.tx_cell_utilization == 0.75
+        assert adaptations == [(root.get_mac_addr(), hop_1.sf.TX_CELL_OPT)]
+        assert hop_1.sf.num_tx_cells_elapsed == 0
+        assert hop_1.sf.num_tx_cells_used == 0
+
+    @pytest.mark.parametrize('max_num_cells_per_add, num_queued_packets, expected_num_cells', [
+        (1, 5, 1),
+        (10, 0, 1),
+        (10, 5, 7),
+        (4, 5, 4),
+    ])
+    def test_batched_adaptation(
+            self,
+            sim_engine,
+            monkeypatch,
+            max_num_cells_per_add,
+            num_queued_packets,
+            expected_num_cells
+        ):
+        sim_engine = sim_engine(
+            diff_config = {
+                'exec_numMotes': 2,
+                'app_pkPeriod' : 0,
+                'sf_class'     : 'MSF',
+                'conn_class'   : 'Linear',
+                'sf_max_numcells_per_add': max_num_cells_per_add
+            }
+        )
+
+        # for quick access
+        root  = sim_engine.motes[0]
+        hop_1 = sim_engine.motes[1]
+        root_mac_addr = root.get_mac_addr()
+
+        # hop_1 has one negotiated TX cell to root
+        u.run_until_mote_is_ready_for_app(sim_engine, hop_1)
+        u.run_until_asn(
+            sim_engine,
+            sim_engine.getAsn() + sim_engine.settings.tsch_slotframeLength * 10
+        )
+        tx_cells = hop_1.sf.get_tx_cells(root_mac_addr)
+        assert len(tx_cells) == 1
+        assert tx_cells[0].options == hop_1.sf.TX_CELL_OPT
+
+        # capture the ADD request
+        requests = []
+        monkeypatch.setattr(
+            hop_1.sixp,
+            'send_request',
+            lambda **kwargs: requests.append(kwargs)
+        )
+
+        # the TX cell is fully used and packets are queued
+        hop_1.tsch.txQueue = [
+            {u'mac': {u'dstMac': root_mac_addr}}
+            for _ in range(num_queued_packets)
+        ]
+        hop_1.sf.retry_count[root_mac_addr] = -1
+        hop_1.sf.tx_cell_utilization = 1
+        hop_1.sf._adapt_to_traffic(root_mac_addr, hop_1.sf.TX_CELL_OPT)
+
+        # all the cells are requested in one transaction
+        assert len(requests) == 1
+        assert requests[0]['command'] == d.SIXP_CMD_ADD
+        assert requests[0]['cellOptions'] == hop_1.sf.TX_CELL_OPT
+        assert requests[0]['numCells'] == expected_num_cells
+        assert (
+            len(requests[0]['cellList']) ==
+            max(hop_1.sf.DEFAULT_CELL_LIST_LEN, expected_num_cells)
+        )
+
     def test_locked_slot_in_relocation_request(self, sim_engine):
         # MSF shouldn't select a slot offset out of the candidate cell
         # list which is in locked_slots
@@ -823,3 +1010,153 @@ class TestMSF(object):
 
         # in the end, the mote should remove all the negotiated RX cells
         _test_rx_negotiated_cells(0)
+
+
+class TestLLSF(object):
+    def test_llsf_parameters(self, sim_engine):
+        sim_engine = sim_engine(
+            diff_config = {
+                'exec_numMotes': 2,
+                'sf_class'     : 'LLSF',
+                'conn_class'   : 'Linear'
+            }
+        )
+        mote = sim_engine.motes[1]
+
+        # LLSF runs the MSF engine with its own parameters and log types
+        assert isinstance(mote.sf, SchedulingFunctionLLSF)
+        assert isinstance(mote.sf, SchedulingFunctionMSF)
+        assert (
+            mote.sf._get_parameter('MAX_NUMCELLS') == d.LLSF_MAX_NUMCELLS
+        )
+        assert (
+            mote.sf._get_log_type('ERROR_SCHEDULE_FULL') ==
+            SimLog.LOG_LLSF_ERROR_SCHEDULE_FULL
+        )
+
+    def test_llsf_schedule_full(self, sim_engine):
+        sim_engine = sim_engine(
+            diff_config = {
+                'exec_numSlotframesPerRun': 1000,
+                'exec_numMotes'           : 2,
+                'app_pkPeriod'            : 0,
+                'sf_class'                : 'LLSF',
+                'conn_class'              : 'Linear'
+            }
+        )
+
+        # for quick access
+        root  = sim_engine.motes[0]
+        hop_1 = sim_engine.motes[1]
+
+        # wait for hop_1 to get ready.
+        u.run_until_mote_is_ready_for_app(sim_engine, hop_1)
+
+        # fill up the hop_1's schedule
+        used_slots = hop_1.tsch.get_busy_slots(
+            hop_1.sf.SLOTFRAME_HANDLE_NEGOTIATED_CELLS
+        )
+        for _slot in range(sim_engine.settings.tsch_slotframeLength):
+            if _slot not in used_slots:
+                hop_1.tsch.addCell(
+                    slotOffset       = _slot,
+                    channelOffset    = 0,
+                    neighbor         = root.get_mac_addr(),
+                    cellOptions      = [d.CELLOPTION_TX],
+                    slotframe_handle = hop_1.sf.SLOTFRAME_HANDLE_NEGOTIATED_CELLS
+                )
+
+        # trigger scheduling adaptation
+        root_mac_addr = root.get_mac_addr()
+        hop_1.sf.retry_count[root_mac_addr] = -1
+        hop_1.sf.tx_cell_utilization = 100
+        hop_1.sf._adapt_to_traffic(root_mac_addr, hop_1.sf.TX_CELL_OPT)
+
+        # make sure the log is written into the file
+        SimEngine.SimLog.SimLog().flush()
+
+        # the error is logged with the LLSF log type
+        logs = u.read_log_file(
+            filter    = [
+                SimLog.LOG_LLSF_ERROR_SCHEDULE_FULL['type'],
+                SimLog.LOG_MSF_ERROR_SCHEDULE_FULL['type']
+            ],
+            after_asn = sim_engine.getAsn() - 1
+        )
+        assert len(logs) == 1
+        assert logs[0]['_type'] == SimLog.LOG_LLSF_ERROR_SCHEDULE_FULL['type']
+
+    def test_llsf_cell_placement(self, sim_engine, monkeypatch):
+        sim_engine = sim_engine(
+            diff_config = {
+                'exec_numMotes': 3,
+                'sf_class'     : 'LLSF',
+                'conn_class'   : 'Linear'
+            }
+        )
+
+        # for quick access
+        root  = sim_engine.motes[0]
+        hop_1 = sim_engine.motes[1]
+        hop_2 = sim_engine.motes[2]
+        slotframe_length = sim_engine.settings.tsch_slotframeLength
+
+        # hop_1 receives from hop_2 at slot 10 and transmits to root at
+        # slot 50
+        hop_1.tsch.add_slotframe(
+            slotframe_handle = hop_1.sf.SLOTFRAME_HANDLE_NEGOTIATED_CELLS,
+            length           = slotframe_length
+        )
+        monkeypatch.setattr(
+            hop_1.rpl,
+            'getPreferredParent',
+            lambda: root.get_mac_addr()
+        )
+        hop_1.tsch.addCell(
+            slotOffset       = 10,
+            channelOffset    = 0,
+            neighbor         = hop_2.get_mac_addr(),
+            cellOptions      = [d.CELLOPTION_RX],
+            slotframe_handle = hop_1.sf.SLOTFRAME_HANDLE_NEGOTIATED_CELLS
+        )
+        hop_1.tsch.addCell(
+            slotOffset       = 50,
+            channelOffset    = 0,
+            neighbor         = root.get_mac_addr(),
+            cellOptions      = [d.CELLOPTION_TX],
+            slotframe_handle = hop_1.sf.SLOTFRAME_HANDLE_NEGOTIATED_CELLS
+        )
+
+        # TX cells to the parent are placed just after the RX cells from
+        # the child
+        assert hop_1.sf._select_slots(
+            [5, 20, 11, slotframe_length - 1],
+            2,
+            root.get_mac_addr(),
+            hop_1.sf.TX_CELL_OPT
+        ) == [11, 20]
+
+        # RX cells from the child are placed just before the TX cells to
+        # the parent
+        candidate_cells = [
+            {u'slotOffset': slot_offset, u'channelOffset': 0}
+            for slot_offset in [51, 45, 49, 5]
+        ]
+        selected_cells = hop_1.sf._select_cells(
+            candidate_cells,
+            2,
+            hop_2.get_mac_addr(),
+            hop_1.sf.RX_CELL_OPT
+        )
+        assert [c[u'slotOffset'] for c in selected_cells] == [49, 45]
+
+        # without reference cells (no RX cell from the parent), placement
+        # is random
+        selected_slots = hop_1.sf._select_slots(
+            [5, 20, 11, 60],
+            2,
+            hop_2.get_mac_addr(),
+            hop_1.sf.TX_CELL_OPT
+        )
+        assert len(selected_slots) == 2
+        assert set(selected_slots).issubset(set([5, 20, 11, 60]))
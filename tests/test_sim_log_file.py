@@ -0,0 +1,216 @@
+from __future__ import absolute_import
+import gzip
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from . import test_utils as u
+from SimEngine import SimLogFile
+from SimEngine import SimLog
+
+#============================ helpers =========================================
+
+MERGE_LOGS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '../bin',
+    'mergeLogs.py'
+)
+
+def make_log_lines(cpu_id, run_ids, num_logs=3):
+    lines = []
+    for run_id in run_ids:
+        lines.append(
+            json.dumps(
+                {
+                    '_type':   'config',
+                    '_run_id': run_id,
+                    'cpuID':   cpu_id,
+                }
+            )
+        )
+        for asn in range(num_logs):
+            lines.append(
+                json.dumps(
+                    {
+                        '_type':   'tsch.txdone',
+                        '_run_id': run_id,
+                        '_asn':    asn,
+                    },
+                    sort_keys = True
+                )
+            )
+    return [line + '\n' for line in lines]
+
+def write_log_file(file_path, lines):
+    if file_path.endswith('.gz'):
+        f = gzip.open(file_path, 'wb')
+    else:
+        f = open(file_path, 'wb')
+    with f:
+        f.write(''.join(lines).encode('utf-8'))
+
+#============================ fixtures ========================================
+
+@pytest.fixture(params=[None, SimLogFile.COMPRESSION_GZIP])
+def fixture_compression(request):
+    return request.param
+
+#============================ tests ===========================================
+
+def test_open_log_file(tmpdir, fixture_compression):
+    # this runs on Python 2.7 as well, where the file objects of open() and
+    # gzip cannot be wrapped by io.TextIOWrapper as they are
+    lines = make_log_lines(cpu_id=0, run_ids=[0])
+    lines.append(u'{"_type": "app.rx", "name": "caf\u00e9"}\n')
+    file_path = SimLogFile.get_file_path(
+        os.path.join(str(tmpdir), 'input.dat'),
+        fixture_compression
+    )
+    write_log_file(file_path, lines)
+
+    with SimLogFile.open_log_file(file_path) as f:
+        read_lines = list(f)
+    assert read_lines == lines
+    assert all([isinstance(line, type(u'')) for line in read_lines])
+
+def test_copy_log_file(tmpdir, fixture_compression):
+    lines = make_log_lines(cpu_id=0, run_ids=[0, 1, 2])
+
+    # the input file is interrupted in the middle of a line
+    input_path = os.path.join(str(tmpdir), 'input.dat')
+    write_log_file(input_path, lines + ['{"_type": "tsch'])
+
+    output_path = SimLogFile.get_file_path(
+        os.path.join(str(tmpdir), 'output.dat'),
+        fixture_compression
+    )
+    writer = SimLogFile.LogFileWriter(output_path, fixture_compression)
+    incomplete_line = SimLogFile.copy_log_file(input_path, writer)
+    writer.close()
+    assert incomplete_line == b'{"_type": "tsch'
+
+    # all the complete lines are copied
+    with SimLogFile.open_log_file(output_path) as f:
+        assert f.readlines() == lines
+
+    # the index tells where each run starts
+    assert SimLogFile.has_index(output_path)
+    index = SimLogFile.read_index(output_path)
+    assert index['compression'] == fixture_compression
+    assert [run['_run_id'] for run in index['runs']] == [0, 1, 2]
+    for run_id in [0, 1, 2]:
+        assert (
+            list(SimLogFile.open_log_run(output_path, run_id))
+            ==
+            lines[run_id * 4:(run_id + 1) * 4]
+        )
+    with pytest.raises(ValueError):
+        list(SimLogFile.open_log_run(output_path, 3))
+
+    assert list(SimLogFile.read_config_lines(output_path)) == [
+        json.loads(lines[run_id * 4]) for run_id in [0, 1, 2]
+    ]
+
+
+def test_compressed_output_file(tmpdir):
+    lines = make_log_lines(cpu_id=0, run_ids=[0, 1])
+    file_path = os.path.join(str(tmpdir), 'output_cpu0.dat.gz')
+
+    # the file is readable after flush(), before it is closed
+    output_file = SimLogFile.open_output_file(file_path, level=1)
+    for line in lines[:4]:
+        output_file.write(line)
+    output_file.flush()
+    with SimLogFile.open_log_file(file_path) as f:
+        assert f.readlines() == lines[:4]
+
+    for line in lines[4:]:
+        output_file.write(line)
+    output_file.close()
+    assert output_file.closed
+    with SimLogFile.open_log_file(file_path) as f:
+        assert f.readlines() == lines
+
+    # a new run on the same CPU is appended
+    output_file = SimLogFile.open_output_file(file_path)
+    output_file.write(lines[0])
+    output_file.close()
+    with SimLogFile.open_log_file(file_path) as f:
+        assert f.readlines() == lines + lines[:1]
+
+
+def test_sim_log_compression(sim_engine, fixture_compression):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numSlotframesPerRun': 10,
+            'log_compression':          fixture_compression,
+        }
+    )
+    u.run_until_end(sim_engine)
+
+    file_path = SimLog.SimLog().log_output_file.name
+    assert SimLogFile.get_compression(file_path) == fixture_compression
+
+    logs = u.read_log_file(filter=[SimLog.LOG_SIMULATOR_RANDOM_SEED['type']])
+    assert len(logs) == 1
+    assert logs[0]['value'] == sim_engine.random_seed
+
+
+def test_merge_logs(tmpdir, fixture_compression):
+    # two hostname-based directories having the same file and config.json
+    log_root_dir = str(tmpdir.mkdir('simData'))
+    host_lines   = {
+        'host_a': make_log_lines(cpu_id=0, run_ids=[0, 1]),
+        'host_b': make_log_lines(cpu_id=0, run_ids=[0, 1]),
+    }
+    for host, lines in host_lines.items():
+        host_dir = os.path.join(log_root_dir, host)
+        os.mkdir(host_dir)
+        with open(os.path.join(host_dir, 'config.json'), 'w') as f:
+            f.write('{}')
+        write_log_file(os.path.join(host_dir, 'exec_numMotes_2.dat'), lines)
+
+    output_dir = os.path.join(str(tmpdir), 'merged')
+    command = [
+        sys.executable,
+        MERGE_LOGS_PATH,
+        '-l', log_root_dir,
+        '-o', output_dir,
+        '-y',
+        '-j', '2',
+    ]
+    if fixture_compression is not None:
+        command += ['-c', fixture_compression]
+    subprocess.check_call(command)
+
+    # _run_ids of the second directory follow the ones of the first
+    output_path = SimLogFile.get_file_path(
+        os.path.join(output_dir, 'exec_numMotes_2.dat'),
+        fixture_compression
+    )
+    with SimLogFile.open_log_file(output_path) as f:
+        logs = [json.loads(line) for line in f]
+    assert len(logs) == 16
+    assert (
+        [log['_run_id'] for log in logs if log['_type'] == 'config']
+        ==
+        [0, 1, 2, 3]
+    )
+    assert (
+        [log['cpuID'] for log in logs if log['_type'] == 'config']
+        ==
+        [0, 0, 1, 1]
+    )
+    assert (
+        [
+            json.loads(line)['_run_id']
+            for line in SimLogFile.open_log_run(output_path, 3)
+        ]
+        ==
+        [3] * 4
+    )
+    assert not os.path.exists(os.path.join(log_root_dir, 'host_a'))
+    assert not os.path.exists(os.path.join(log_root_dir, 'host_b'))
@@ -598,6 +598,32 @@ class TestTransaction(object):
         assert len(mote.sixp.transaction_table) == 0
         assert len(mote.tsch.txQueue) == 0
 
+    def test_transaction_request_copy(self, sim_engine):
+        sim_engine = sim_engine(**COMMON_SIM_ENGINE_ARGS)
+
+        install_sf(sim_engine.motes, SchedulingFunctionTwoStep)
+        root = sim_engine.motes[0]
+        mote = sim_engine.motes[1]
+
+        root.sf.issue_add_request(mote.get_mac_addr())
+
+        # the transaction is indexed by (initiator, responder)
+        key = (root.get_mac_addr(), mote.get_mac_addr())
+        assert list(root.sixp.transaction_table.keys()) == [key]
+        transaction = root.sixp.transaction_table[key]
+
+        # the transaction keeps its request even when TSCH modifies or
+        # drops the queued packet
+        assert len(root.tsch.txQueue) == 1
+        packet = root.tsch.txQueue[0]
+        assert transaction.request == packet
+        packet[u'mac'][u'retriesLeft'] -= 1
+        root.drop_packet(packet, u'test')
+        assert transaction.request[u'app'][u'msgType'] == (
+            d.SIXP_MSG_TYPE_REQUEST
+        )
+        assert transaction.request[u'mac'][u'dstMac'] == mote.get_mac_addr()
+
 class TestSeqNum(object):
 
     @pytest.fixture(params=[0, 1, 2, 100, 200, 254, 255])
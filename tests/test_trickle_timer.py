@@ -3,6 +3,8 @@ from builtins import range
 import pytest
 
 from . import test_utils as u
+from SimEngine import SimLog
+from SimEngine import SimSettings
 from SimEngine.Mote.trickle_timer import TrickleTimer
 
 # use the default values defined in RFC 6550
@@ -33,7 +35,12 @@ def num_consistency(request):
     return request.param
 
 
-def test_redundancy_constant(sim_engine, num_consistency):
+@pytest.fixture(params=[False, True])
+def aggregated(request):
+    return request.param
+
+
+def test_redundancy_constant(sim_engine, num_consistency, aggregated):
     sim_engine = sim_engine(
         diff_config = {
             'exec_numMotes': 1
@@ -45,7 +52,7 @@ def test_redundancy_constant(sim_engine, num_consistency):
     def _callback():
         result['is_callback_called'] = True
 
-    trickle_timer = TrickleTimer(Imin, Imax, K, _callback)
+    trickle_timer = TrickleTimer(Imin, Imax, K, _callback, aggregated=aggregated)
     # set one slotframe long to the interval (for test purpose)
     INITIAL_INTERVAL = 1010 # ms
     trickle_timer.start()
@@ -64,7 +71,7 @@ def test_redundancy_constant(sim_engine, num_consistency):
     assert trickle_timer.interval == INITIAL_INTERVAL * 2
 
 
-def test_interval_doubling(sim_engine):
+def test_interval_doubling(sim_engine, aggregated):
     sim_engine = sim_engine(
         diff_config = {
             'exec_numMotes': 1
@@ -78,7 +85,7 @@ def test_interval_doubling(sim_engine):
     i_min = 1000
     i_max = 2
 
-    trickle_timer = TrickleTimer(i_min, i_max, K, _callback)
+    trickle_timer = TrickleTimer(i_min, i_max, K, _callback, aggregated=aggregated)
     # set one slotframe long to the interval manually (for test purpose)
     INITIAL_INTERVAL = 1010 # ms
     trickle_timer.start()
@@ -111,8 +118,8 @@ def test_reset(sim_engine):
     trickle_timer.start()
 
     # get ASN of 't' and one of the end of the interval
-    original_event_at_t = sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_base + '_at_t']
-    original_event_at_end_of_interval = sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_base + '_at_i']
+    original_event_at_t = sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_at_t]
+    original_event_at_end_of_interval = sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_at_i]
 
     u.run_until_asn(sim_engine, sim_engine.getAsn() + 1)
 
@@ -123,8 +130,8 @@ def test_reset(sim_engine):
     assert trickle_timer.interval == Imin
     # events should be re-scheduled accordingly
 
-    assert original_event_at_t is not sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_base + '_at_t']
-    assert original_event_at_end_of_interval is not sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_base + '_at_i']
+    assert original_event_at_t is not sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_at_t]
+    assert original_event_at_end_of_interval is not sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_at_i]
 
 
 def test_stop(sim_engine):
@@ -144,3 +151,67 @@ def test_stop(sim_engine):
     assert len(list(sim_engine.events.keys())) == 2
     trickle_timer.stop()
     assert len(list(sim_engine.events.keys())) == 0
+
+
+def test_stop_aggregated(sim_engine):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': 1
+        }
+    )
+
+    result = {'num_callbacks': 0}
+
+    def _callback():
+        result['num_callbacks'] += 1
+
+    # two timers share a single engine event
+    trickle_timers = [
+        TrickleTimer(Imin, Imax, 0, _callback, aggregated=True),
+        TrickleTimer(Imin, Imax, K, _callback, aggregated=True)
+    ]
+    for trickle_timer in trickle_timers:
+        trickle_timer.start()
+        trickle_timer.interval = 1010 # ms
+        trickle_timer._start_next_interval()
+    assert sim_engine.is_scheduled(sim_engine.UNIQUE_TAG_TRICKLE_TIMERS)
+    assert len(sim_engine.trickle_timer_events) == 8
+
+    # a stopped timer doesn't call back any more
+    trickle_timers[1].stop()
+    u.run_until_asn(sim_engine, sim_engine.settings.tsch_slotframeLength * 4)
+    assert result['num_callbacks'] == 0
+    assert trickle_timers[0].interval == 1010 * 4
+    assert trickle_timers[1].interval == 1010
+
+
+def test_aggregated_logs(sim_engine):
+    # with this seed, a mote restarts its trickle timer on a DIO received in
+    # the slot where the timer fires; the event due in that slot fires all
+    # the same with or without rpl_trickle_timer_aggregated
+    runs = []
+    for aggregated in [False, True]:
+        engine = sim_engine(
+            diff_config = {
+                'exec_numMotes'               : 12,
+                'exec_randomSeed'             : 1,
+                'exec_numSlotframesPerRun'    : 400,
+                'conn_class'                  : 'FullyMeshed',
+                'rpl_trickle_timer_aggregated': aggregated
+            }
+        )
+        u.run_until_end(engine)
+        runs.append(
+            [
+                log for log in u.read_log_file()
+                if log['_type'] != SimLog.LOG_SIMULATOR_STATE['type']
+            ]
+        )
+
+        # destroy singletons for the next run
+        engine.connectivity.destroy()
+        engine.destroy()
+        SimLog.SimLog().destroy()
+        SimSettings.SimSettings().destroy()
+
+    assert runs[0] == runs[1]
@@ -499,6 +499,36 @@ def test_eb_by_root(sim_engine):
     #   having the root use Join Metric = 0.
     assert eb['mac']['join_metric'] == 0
 
+def test_listening_for_eb(sim_engine):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': 5
+        }
+    )
+
+    root = sim_engine.motes[0]
+    non_root_motes = sim_engine.motes[1:]
+
+    # all the non-root motes are listening for EBs, served by a single event
+    assert list(sim_engine.scanning_motes.keys()) == [1, 2, 3, 4]
+    assert sim_engine.is_scheduled(sim_engine.UNIQUE_TAG_LISTENING_FOR_EBS)
+    events = sim_engine.events[sim_engine.getAsn() + 1]
+    assert len(events[d.INTRASLOTORDER_STARTSLOT]) == 1
+
+    # every non-root mote listens during the next slot
+    u.run_until_asn(sim_engine, sim_engine.getAsn() + 1)
+    for mote in non_root_motes:
+        assert mote.radio.stats['idle_listen'] + mote.radio.stats['rx_data'] == 1
+
+    # a synchronized mote doesn't listen for EBs any more
+    eb = root.tsch._create_EB()
+    for mote in non_root_motes:
+        mote.tsch._action_receiveEB(eb)
+        mote.engine.removeFutureEvent((mote.id, 'tsch', 'wait_eb'))
+        mote.tsch._perform_synchronization()
+        assert mote.id not in sim_engine.scanning_motes
+    assert not sim_engine.is_scheduled(sim_engine.UNIQUE_TAG_LISTENING_FOR_EBS)
+
 def test_select_active_tx_cell(sim_engine):
     # this test is for a particular case; it's not a general test for
     # Tsch._select_active_cell()
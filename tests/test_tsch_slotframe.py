@@ -339,6 +339,24 @@ def test_slotframe_get_available_slots(sim_engine):
     # check if all slot offsets are returned except the one reserved
     assert slotframe.get_available_slots() == [i for i in range(2, 101)]
 
+    # a slot offset becomes available again when its last cell is deleted
+    cell_rx_2 = Cell(1, 1, [d.CELLOPTION_RX], neighbor_mac_addr_1)
+    slotframe.add(cell_rx_2)
+    slotframe.delete(cell_rx_1)
+    assert slotframe.get_available_slots() == [i for i in range(2, 101)]
+    slotframe.delete(cell_rx_2)
+    assert slotframe.get_available_slots() == [i for i in range(1, 101)]
+
+    # the returned list is a copy
+    slotframe.get_available_slots().remove(1)
+    assert slotframe.get_available_slots() == [i for i in range(1, 101)]
+
+    # the available slots follow the length of the slotframe
+    slotframe.set_length(51)
+    assert slotframe.get_available_slots() == [i for i in range(1, 51)]
+    slotframe.set_length(201)
+    assert slotframe.get_available_slots() == [i for i in range(1, 201)]
+
 def test_slotframe_set_length_without_cells(sim_engine):
     """
     Test if we can change the slotframe length when no cells are allocated
@@ -392,3 +410,158 @@ def test_slotframe_set_length_with_cells(sim_engine):
     slotframe.set_length(new_length)
     assert slotframe.length == new_length
     assert len(slotframe.get_busy_slots()) == len(cells) - 1  # make sure we have the right amount of cells
+
+def test_schedule_table(sim_engine):
+    sim_engine = sim_engine(diff_config={'exec_numMotes': 1})
+    tsch = sim_engine.motes[0].tsch
+
+    # add a slotframe of a different length to the ones of the root
+    tsch.add_slotframe(slotframe_handle=3, length=7)
+    tsch.addCell(3, 1, None, [d.CELLOPTION_RX], slotframe_handle=3)
+    tsch.addCell(0, 1, None, [d.CELLOPTION_RX], slotframe_handle=3)
+    cell = tsch.get_cell(0, 1, None, slotframe_handle=3)
+
+    schedule_table = tsch._get_schedule_table()
+    assert schedule_table['length'] == 101 * 7
+    for asn in range(schedule_table['length']):
+        # same candidate cells as the slotframes give
+        expected_cells = []
+        for slotframe in tsch.slotframes.values():
+            expected_cells = slotframe.get_cells_at_asn(asn)
+            if expected_cells:
+                break
+        slot_offset = asn % schedule_table['length']
+        assert schedule_table['candidate_cells'][slot_offset] == expected_cells
+
+        # same number of slots to the next active slot
+        assert schedule_table['num_slots_to_next_active_slot'][slot_offset] == min(
+            [
+                slotframe.get_num_slots_to_next_active_cell(asn)
+                for slotframe in tsch.slotframes.values()
+                if slotframe.get_busy_slots()
+            ]
+        )
+
+    # the table is compiled again after a change of the schedule
+    tsch.deleteCell(0, 1, None, [d.CELLOPTION_RX], slotframe_handle=3)
+    schedule_table = tsch._get_schedule_table()
+    for candidate_cells in schedule_table['candidate_cells']:
+        assert cell not in candidate_cells
+
+def test_schedule_collision(sim_engine):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numMotes'                  : 4,
+            'conn_class'                     : 'FullyMeshed',
+            'tsch_detect_schedule_collisions': True
+        }
+    )
+    motes = sim_engine.motes
+    slotframe_length = motes[0].tsch.get_slotframe(0).length
+
+    def add_tx_cell(tx_mote, rx_mote, channel_offset):
+        tx_mote.tsch.addCell(
+            slotOffset       = 5,
+            channelOffset    = channel_offset,
+            neighbor         = rx_mote.get_mac_addr(),
+            cellOptions      = [d.CELLOPTION_TX],
+            slotframe_handle = 0
+        )
+        return tx_mote.tsch.get_cell(5, channel_offset, rx_mote.get_mac_addr(), 0)
+
+    def get_colliding_motes():
+        SimLog.SimLog().flush()
+        logs = u.read_log_file(
+            filter = [SimLog.LOG_TSCH_SCHEDULE_COLLISION['type']]
+        )
+        return [log['colliding_motes'] for log in logs]
+
+    # dedicated TX cells are indexed by (slot offset, channel offset)
+    cell_1 = add_tx_cell(motes[1], motes[0], 1)
+    assert sim_engine.tx_cells[(slotframe_length, 5, 1)] == [cell_1]
+    assert get_colliding_motes() == []
+
+    # another link in interference range on the same cell collides
+    cell_3 = add_tx_cell(motes[3], motes[2], 1)
+    assert get_colliding_motes() == [[1]]
+    assert sim_engine.get_colliding_tx_cells(
+        tx_mote_id       = 3,
+        rx_mote_id       = 2,
+        slotframe_length = slotframe_length,
+        slot_offset      = 5,
+        channel_offset   = 1
+    ) == [cell_1]
+
+    # the same link on another channel offset doesn't
+    add_tx_cell(motes[2], motes[3], 2)
+    assert get_colliding_motes() == [[1]]
+
+    # deleted cells are removed from the index
+    motes[1].tsch.deleteCell(
+        slotOffset       = 5,
+        channelOffset    = 1,
+        neighbor         = motes[0].get_mac_addr(),
+        cellOptions      = [d.CELLOPTION_TX],
+        slotframe_handle = 0
+    )
+    assert sim_engine.tx_cells[(slotframe_length, 5, 1)] == [cell_3]
+    motes[3].tsch.delete_slotframe(0)
+    assert (slotframe_length, 5, 1) not in sim_engine.tx_cells
+
+def test_schedule_collision_sibling_cells(sim_engine):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numMotes'                  : 3,
+            'conn_class'                     : 'FullyMeshed',
+            'tsch_detect_schedule_collisions': True
+        }
+    )
+    root = sim_engine.motes[0]
+    motes = sim_engine.motes[1:]
+    slotframe_length = root.tsch.get_slotframe(0).length
+
+    # two siblings have a TX cell to the root at the same slot and channel
+    # offset; their cells compare equal
+    cells = {}
+    for mote in reversed(motes):
+        mote.tsch.addCell(
+            slotOffset       = 10,
+            channelOffset    = 1,
+            neighbor         = root.get_mac_addr(),
+            cellOptions      = [d.CELLOPTION_TX],
+            slotframe_handle = 0
+        )
+        cells[mote.id] = mote.tsch.get_cell(10, 1, root.get_mac_addr(), 0)
+    assert cells[1] == cells[2]
+
+    # deleting the cell of one of them keeps the cell of the other
+    motes[0].tsch.deleteCell(
+        slotOffset       = 10,
+        channelOffset    = 1,
+        neighbor         = root.get_mac_addr(),
+        cellOptions      = [d.CELLOPTION_TX],
+        slotframe_handle = 0
+    )
+    indexed_cells = sim_engine.tx_cells[(slotframe_length, 10, 1)]
+    assert len(indexed_cells) == 1
+    assert indexed_cells[0] is cells[2]
+
+def test_schedule_collision_disabled(sim_engine):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': 2,
+            'conn_class'   : 'FullyMeshed'
+        }
+    )
+    motes = sim_engine.motes
+
+    # dedicated TX cells are not indexed by default
+    motes[1].tsch.addCell(
+        slotOffset       = 5,
+        channelOffset    = 1,
+        neighbor         = motes[0].get_mac_addr(),
+        cellOptions      = [d.CELLOPTION_TX],
+        slotframe_handle = 0
+    )
+    assert sim_engine.tx_cells == {}
+    motes[1].tsch.delete_slotframe(0)
@@ -7,6 +7,7 @@ import types
 
 import SimEngine
 import SimEngine.Mote.MoteDefines as d
+from SimEngine import SimLogFile
 
 POLLING_INTERVAL = 0.100
 
@@ -116,7 +117,7 @@ def read_log_file(filter=[], after_asn=0):
 
     sim_settings = SimEngine.SimSettings.SimSettings()
     logs = []
-    with open(sim_settings.getOutputFile(), 'r') as f:
+    with SimLogFile.open_log_file(sim_settings.getOutputFile()) as f:
         # discard the first line, that contains configuration
         f.readline()
         for line in f: